@@ -0,0 +1,212 @@
+import asyncio
+import itertools
+import random
+import time
+import zlib
+from collections import Counter
+from typing import Any, AsyncIterator, Optional
+
+from kebabmeister.utils.reddit_id import to_base36
+
+
+class FakeBackend:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        """
+        Shared state of the fake Reddit API: counts outbound calls and records when actions on each item finished.
+
+        @param latency: Seconds every outbound (write) call takes
+        @param jitter: Maximum random extra latency, in seconds
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter[str] = Counter()
+        # Item ID -> perf_counter() when the stream yielded it
+        self.yielded_at: dict[str, float] = {}
+        # perf_counter() deltas from yielding an item to finishing an action on it
+        self.action_latencies: list[float] = []
+        self._ids = itertools.count(36 ** 6)
+
+    def next_id(self) -> str:
+        return to_base36(next(self._ids))
+
+    async def call(self, endpoint: str, item_id: Optional[str] = None):
+        self.calls[endpoint] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if item_id is not None and item_id in self.yielded_at:
+            self.action_latencies.append(time.perf_counter() - self.yielded_at[item_id])
+
+
+class FakeRedditor:
+    def __init__(self, backend: FakeBackend, name: str, source_item: Optional[str] = None):
+        self._backend = backend
+        self.name = name
+        # ID of the item this author object came from, to attribute message latency to it
+        self._source_item = source_item
+
+    async def message(self, subject: str, message: str):
+        await self._backend.call("message", self._source_item)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeModeration:
+    def __init__(self, item: "FakeItem"):
+        self._item = item
+
+    async def remove(self, mod_note: str = ""):
+        await self._item._backend.call("remove", self._item.id)
+
+    async def distinguish(self, how: str = "yes", sticky: bool = False):
+        await self._item._backend.call("distinguish", self._item.id)
+
+
+class FakeItem:
+    def __init__(self, backend: FakeBackend, data: dict[str, Any], subreddit: "FakeSubreddit"):
+        self._backend = backend
+        self.id: str = data.get("id") or backend.next_id()
+        self.created_utc: float = data.get("created_utc", time.time())
+        self.author_flair_text: Optional[str] = data.get("author_flair_text")
+        self.author = FakeRedditor(backend, data.get("author", "user"), self.id)
+        self.subreddit_id = f"t5_{subreddit.id}"
+        self.permalink = f"/r/{subreddit.display_name}/comments/{self.id}/"
+        self.mod = FakeModeration(self)
+
+    async def reply(self, message: str) -> "FakeComment":
+        await self._backend.call("reply", self.id)
+        return FakeComment(self._backend, {"author": "bot"}, self._reply_subreddit)
+
+    @property
+    def fullname(self) -> str:
+        return f"{self.PREFIX}_{self.id}"
+
+
+class FakeComment(FakeItem):
+    PREFIX = "t1"
+
+    def __init__(self, backend: FakeBackend, data: dict[str, Any], subreddit: "FakeSubreddit"):
+        super().__init__(backend, data, subreddit)
+        self.body: str = data.get("body", "")
+        self._reply_subreddit = subreddit
+
+
+class FakeSubmission(FakeItem):
+    PREFIX = "t3"
+
+    def __init__(self, backend: FakeBackend, data: dict[str, Any], subreddit: "FakeSubreddit"):
+        super().__init__(backend, data, subreddit)
+        self.title: str = data.get("title", "")
+        self._reply_subreddit = subreddit
+
+
+class FakeWikiPage:
+    def __init__(self, subreddit: "FakeSubreddit", name: str):
+        self.subreddit = subreddit
+        self.name = name
+
+    async def load(self):
+        await self.subreddit._backend.call("wiki_page")
+        self.content_md = self.subreddit.wiki_content
+        self.revision_id = self.subreddit.wiki_revision
+
+    async def revisions(self, limit: int = 1) -> AsyncIterator[dict[str, Any]]:
+        await self.subreddit._backend.call("wiki_revisions")
+        yield {"id": self.subreddit.wiki_revision}
+
+
+class FakeWiki:
+    def __init__(self, subreddit: "FakeSubreddit"):
+        self._subreddit = subreddit
+
+    async def get_page(self, page_name: str, fetch: bool = True) -> FakeWikiPage:
+        page = FakeWikiPage(self._subreddit, page_name)
+        if fetch:
+            await page.load()
+        return page
+
+
+class FakeStream:
+    def __init__(self, subreddits: list["FakeSubreddit"]):
+        self._subreddits = subreddits
+
+    async def _stream(self, kind: str) -> AsyncIterator[FakeItem]:
+        backend = self._subreddits[0]._backend
+        await backend.call(f"listing_{kind}")
+        for subreddit in self._subreddits:
+            # Hand the event loop to other streams between items, like a real stream between requests would
+            for item in subreddit.traffic[kind]:
+                backend.yielded_at[item.id] = time.perf_counter()
+                yield item
+                await asyncio.sleep(0)
+
+    def comments(self, **kwargs) -> AsyncIterator[FakeComment]:
+        return self._stream("comment")
+
+    def submissions(self, **kwargs) -> AsyncIterator[FakeSubmission]:
+        return self._stream("submission")
+
+
+class FakeSubreddit:
+    def __init__(self, backend: FakeBackend, display_name: str, wiki_content: str = ""):
+        self._backend = backend
+        self.display_name = display_name
+        self.id = to_base36(zlib.crc32(display_name.lower().encode()))
+        self.wiki_content = wiki_content
+        self.wiki_revision = "rev-1"
+        self.traffic: dict[str, list[FakeItem]] = {"comment": [], "submission": []}
+        self.wiki = FakeWiki(self)
+        self.stream = FakeStream([self])
+
+    async def load(self):
+        await self._backend.call("subreddit")
+
+    async def _listing(self, kind: str, limit: Optional[int]) -> AsyncIterator[FakeItem]:
+        await self._backend.call(f"listing_{kind}")
+        for item in list(reversed(self.traffic[kind]))[:limit]:
+            self._backend.yielded_at[item.id] = time.perf_counter()
+            yield item
+
+    def new(self, limit: Optional[int] = 100, **kwargs) -> AsyncIterator[FakeSubmission]:
+        return self._listing("submission", limit)
+
+    def comments(self, limit: Optional[int] = 100, **kwargs) -> AsyncIterator[FakeComment]:
+        return self._listing("comment", limit)
+
+    def add_item(self, kind: str, data: dict[str, Any]):
+        item_class = FakeComment if kind == "comment" else FakeSubmission
+        self.traffic[kind].append(item_class(self._backend, data, self))
+
+
+class FakeReddit:
+    def __init__(self, backend: FakeBackend):
+        """
+        In-process stand-in for the parts of `asyncpraw.Reddit` the bot uses.
+
+        @param backend: Shared fake API state
+        """
+        self.backend = backend
+        self.subreddits: dict[str, FakeSubreddit] = {}
+
+    def add_subreddit(self, display_name: str, wiki_content: str) -> FakeSubreddit:
+        subreddit = FakeSubreddit(self.backend, display_name, wiki_content)
+        self.subreddits[display_name.lower()] = subreddit
+        return subreddit
+
+    async def subreddit(self, display_name: str) -> FakeSubreddit:
+        names = display_name.lower().split("+")
+        if len(names) == 1:
+            return self.subreddits[names[0]]
+        combined = FakeSubreddit(self.backend, display_name)
+        combined.stream = FakeStream([self.subreddits[name] for name in names])
+        return combined
+
+    async def close(self):
+        pass
@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import event
+
+from benchmarks.fake_reddit import FakeBackend, FakeReddit, FakeRedditor
+from benchmarks.traffic import generate
+from kebabmeister import state
+from kebabmeister.actions.cooldown import CooldownStore
+from kebabmeister.actions.pool import ActionPool
+from kebabmeister.configuration import (
+    ActionsConfiguration,
+    Configuration,
+    DatabaseConfiguration,
+    MonitoringConfiguration,
+    RedditConfiguration,
+    SubredditConfigConfiguration,
+)
+from kebabmeister.database import initialize_db
+from kebabmeister.database.checkpoints import CheckpointStore
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.database.outbox import Outbox
+from kebabmeister.database.seen import SeenRecorder
+from kebabmeister.tasks.submission_monitoring import SubmissionMonitoringTask
+from kebabmeister.utils.task_manager import StreamHealth
+
+MODES = ("reply", "message", "remove", "ignore")
+BOT_NAME = "bench_bot"
+WIKI_CONFIG = """
+reply_on_posts: false
+reply_message: "Welcome, {{author}}! {{unflaired_message}}"
+reply_is_pinned: false
+unflaired_post_action: {action}
+unflaired_post_subject: Flair up
+unflaired_post_message: ["You need to flair up, {{author}}!"]
+unflaired_comment_action: {action}
+unflaired_comment_subject: Flair up
+unflaired_comment_message: ["You need to flair up, {{author}}!"]
+whitelist: []
+"""
+
+
+class TimedMonitoringTask(SubmissionMonitoringTask):
+    def __init__(self, config: Configuration, backend: FakeBackend):
+        """
+        Monitoring task that records how long it takes from a stream yielding an item until it has been decided on.
+
+        @param config: Configuration object
+        @param backend: Fake API state holding the yield times
+        """
+        super().__init__(config)
+        self.backend = backend
+        self.decision_latencies: list[float] = []
+        # Start from a clean slate, the class-level registries are shared between instances
+        self.PER_SUBREDDIT_CONFIG = {}
+        self.PER_SUBREDDIT_CONFIG_RAW = {}
+        self.PER_SUBREDDIT_CONFIG_REVISION = {}
+        self.barriers = {}
+        self.subreddits = {}
+
+    async def _process_comment(self, subreddit, comment):
+        await super()._process_comment(subreddit, comment)
+        self.decision_latencies.append(time.perf_counter() - self.backend.yielded_at[comment.id])
+
+    async def _process_submission(self, subreddit, submission):
+        await super()._process_submission(subreddit, submission)
+        self.decision_latencies.append(time.perf_counter() - self.backend.yielded_at[submission.id])
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def run_mode(mode: str, records: list[dict], args: argparse.Namespace, workdir: Path) -> dict:
+    """
+    Replays the traffic through the monitoring hot path with every subreddit set to one unflaired action.
+
+    @param mode: Unflaired action (reply, message, remove or ignore)
+    @param records: Traffic records
+    @param args: Command line arguments
+    @param workdir: Directory for the benchmark database
+    @return: Measurements
+    """
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter)
+    reddit = FakeReddit(backend)
+    for name in sorted({record["subreddit"] for record in records}):
+        reddit.add_subreddit(name, WIKI_CONFIG.format(action=mode))
+    for record in records:
+        reddit.subreddits[record["subreddit"].lower()].add_item(record["kind"], record)
+
+    config = Configuration(
+        reddit=RedditConfiguration(client_id="", client_secret="", user_agent="", username=BOT_NAME, password=""),
+        database=DatabaseConfiguration(url=f"sqlite+aiosqlite:///{workdir / f'{mode}.db'}"),
+        monitored_subreddits=[subreddit.display_name for subreddit in reddit.subreddits.values()],
+        subreddit_config=SubredditConfigConfiguration(page_name="kebabmeister", update_interval=3600),
+        monitoring=MonitoringConfiguration(combined_streams=args.combined),
+        actions=ActionsConfiguration(workers=args.workers, coalesce_window=args.coalesce_window),
+    )
+
+    state.db_engine, state.db_session = await initialize_db(config.database)
+    commits = 0
+
+    def count_commit(_):
+        nonlocal commits
+        commits += 1
+
+    event.listen(state.db_engine.sync_engine, "commit", count_commit)
+
+    state.reddit = reddit
+    state.me = FakeRedditor(backend, BOT_NAME)
+    state.outbox = Outbox(state.db_session, state.db_engine.dialect.name)
+    state.actions = ActionPool(config.actions, reddit, state.outbox)
+    state.seen_submissions = SeenRecorder(state.db_session, SeenSubmission, state.db_engine.dialect.name,
+                                          config.database.flush_size, config.database.flush_interval,
+                                          config.database.index_size, state.outbox, state.actions)
+    state.seen_comments = SeenRecorder(state.db_session, SeenComment, state.db_engine.dialect.name,
+                                       config.database.flush_size, config.database.flush_interval,
+                                       config.database.index_size, state.outbox, state.actions)
+    await state.seen_submissions.load()
+    await state.seen_comments.load()
+    state.seen_submissions.start()
+    state.seen_comments.start()
+    state.checkpoints = CheckpointStore(state.db_session, state.db_engine.dialect.name,
+                                        config.monitoring.checkpoint_interval,
+                                        (state.seen_submissions, state.seen_comments))
+    state.cooldowns = CooldownStore(config.notifications)
+    state.actions.start()
+
+    task = TimedMonitoringTask(config, backend)
+    for name in config.monitored_subreddits:
+        subreddit = await reddit.subreddit(name)
+        task.subreddits[subreddit.id] = subreddit
+        task.barriers[subreddit.id] = asyncio.Event()
+        await task._refresh_config(subreddit)
+
+    if args.combined:
+        combined = await reddit.subreddit("+".join(config.monitored_subreddits))
+        streams = [task._monitor_combined_submissions(combined, StreamHealth("submissions")),
+                   task._monitor_combined_comments(combined, StreamHealth("comments"))]
+    else:
+        streams = [monitor(subreddit, StreamHealth(subreddit.display_name)) for subreddit in task.subreddits.values()
+                   for monitor in (task._monitor_subreddit_submissions, task._monitor_subreddit_comments)]
+
+    # Only count what the hot path does, not the startup
+    backend.calls.clear()
+    commits = 0
+    start = time.perf_counter()
+    await asyncio.gather(*streams)
+    decided = time.perf_counter() - start
+    await state.seen_submissions.flush()
+    await state.seen_comments.flush()
+    await state.actions.join()
+    finished = time.perf_counter() - start
+
+    await state.actions.close()
+    await state.seen_submissions.close()
+    await state.seen_comments.close()
+    await state.cooldowns.close()
+    await state.checkpoints.close()
+    await state.db_engine.dispose()
+
+    items = len(records)
+    calls = sum(count for endpoint, count in backend.calls.items() if not endpoint.startswith("listing_"))
+    return {
+        "mode": mode,
+        "items": items,
+        "items_per_second": items / decided if decided else 0.0,
+        "total_seconds": finished,
+        "decision_p50_ms": percentile(task.decision_latencies, 0.50) * 1000,
+        "decision_p95_ms": percentile(task.decision_latencies, 0.95) * 1000,
+        "decision_p99_ms": percentile(task.decision_latencies, 0.99) * 1000,
+        "action_p50_ms": percentile(backend.action_latencies, 0.50) * 1000,
+        "action_p95_ms": percentile(backend.action_latencies, 0.95) * 1000,
+        "db_commits_per_item": commits / items if items else 0.0,
+        "calls_per_item": calls / items if items else 0.0,
+        "calls": dict(backend.calls),
+    }
+
+
+def print_table(results: list[dict]):
+    columns = [
+        ("mode", "mode", "{}"),
+        ("items", "items", "{}"),
+        ("items/s", "items_per_second", "{:.0f}"),
+        ("decide p50", "decision_p50_ms", "{:.2f}ms"),
+        ("decide p95", "decision_p95_ms", "{:.2f}ms"),
+        ("decide p99", "decision_p99_ms", "{:.2f}ms"),
+        ("action p50", "action_p50_ms", "{:.1f}ms"),
+        ("action p95", "action_p95_ms", "{:.1f}ms"),
+        ("commits/item", "db_commits_per_item", "{:.3f}"),
+        ("calls/item", "calls_per_item", "{:.3f}"),
+    ]
+    rows = [[title for title, _, _ in columns]]
+    rows += [[fmt.format(result[key]) for _, key, fmt in columns] for result in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    if args.traffic:
+        records = [json.loads(line) for line in args.traffic if line.strip()]
+    else:
+        records = list(generate(args.items, args.subreddits, args.unflaired_ratio, 0.1, args.authors))
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes:
+            results.append(await run_mode(mode, records, args, Path(workdir)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stream traffic through the bot against a fake Reddit API")
+    parser.add_argument("traffic", nargs="?", type=argparse.FileType("r"),
+                        help="JSONL traffic file (default: generate synthetic traffic)")
+    parser.add_argument("-n", "--items", type=int, default=5000, help="Synthetic traffic: number of items")
+    parser.add_argument("-s", "--subreddits", type=int, default=5, help="Synthetic traffic: number of subreddits")
+    parser.add_argument("-u", "--unflaired-ratio", type=float, default=0.3,
+                        help="Synthetic traffic: share of authors without a flair")
+    parser.add_argument("-a", "--authors", type=int, default=1000, help="Synthetic traffic: number of authors")
+    parser.add_argument("-m", "--modes", nargs="+", choices=MODES, default=list(MODES),
+                        help="Unflaired actions to benchmark (default: all)")
+    parser.add_argument("-l", "--latency", type=float, default=0.0, help="Latency of every API call, in seconds")
+    parser.add_argument("-j", "--jitter", type=float, default=0.0, help="Random extra API latency, in seconds")
+    parser.add_argument("-w", "--workers", type=int, default=ActionsConfiguration.workers,
+                        help="Number of action workers")
+    parser.add_argument("--combined", action="store_true", help="Use combined multireddit streams")
+    parser.add_argument("--coalesce-window", type=float, default=0.0,
+                        help="Merge messages to the same user within this many seconds")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the bot (default: WARNING)")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
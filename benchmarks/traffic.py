@@ -0,0 +1,60 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from kebabmeister.utils.reddit_id import to_base36
+
+
+def generate(items: int, subreddits: int, unflaired_ratio: float, submission_ratio: float, authors: int,
+             seed: int = 0):
+    """
+    Generates synthetic stream traffic.
+
+    @param items: Number of items
+    @param subreddits: Number of subreddits the items are spread across
+    @param unflaired_ratio: Share of items made by users without a flair
+    @param submission_ratio: Share of items that are submissions (the rest are comments)
+    @param authors: Number of distinct authors
+    @param seed: Random seed
+    @return: Iterator of traffic records
+    """
+    rng = random.Random(seed)
+    start = time.time() - items
+    for i in range(items):
+        author = rng.randrange(authors)
+        yield {
+            "kind": "submission" if rng.random() < submission_ratio else "comment",
+            "id": to_base36(36 ** 6 + i),
+            "subreddit": f"bench_{rng.randrange(subreddits)}",
+            "author": f"user_{author}",
+            # Whether a user is flaired is a property of the user, not of the item
+            "author_flair_text": None if random.Random(author).random() < unflaired_ratio else "Flair",
+            "created_utc": start + i,
+            "title": f"Submission {i}",
+            "body": f"Comment {i}",
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic JSONL traffic for the replay benchmark")
+    parser.add_argument("-n", "--items", type=int, default=10000, help="Number of items (default: 10000)")
+    parser.add_argument("-s", "--subreddits", type=int, default=5, help="Number of subreddits (default: 5)")
+    parser.add_argument("-u", "--unflaired-ratio", type=float, default=0.3,
+                        help="Share of authors without a flair (default: 0.3)")
+    parser.add_argument("--submission-ratio", type=float, default=0.1,
+                        help="Share of items that are submissions (default: 0.1)")
+    parser.add_argument("-a", "--authors", type=int, default=1000, help="Number of distinct authors (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout,
+                        help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    for record in generate(args.items, args.subreddits, args.unflaired_ratio, args.submission_ratio, args.authors,
+                           args.seed):
+        args.output.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,21 @@
+import time
+
+# Taken first, so the startup timing includes the imports
+STARTED = time.perf_counter()
+
 import argparse
 import asyncio
-import atexit
+import os
+import signal
+import socket
 
-import asyncpraw
 from loguru import logger
 
 from kebabmeister import constants, state
+from kebabmeister.actions.decision_log import print_summary, summarize
 from kebabmeister.configuration import Configuration
-from kebabmeister.database import initialize_db
-from kebabmeister.tasks.submission_monitoring import SubmissionMonitoringTask
-from kebabmeister.utils.task_manager import TaskManager
+from kebabmeister.utils.sharding import run_workers
+from kebabmeister.utils.timing import StartupTimer
 
 
 async def main(config: Configuration) -> int:
@@ -19,7 +25,35 @@ async def main(config: Configuration) -> int:
     @param config: Configuration object
     @return: Exit code
     """
+    # Imported here, so --help, --summarize-decisions and the worker supervisor do not load Reddit & database clients
+    import asyncpraw
+
+    from kebabmeister.actions.cooldown import CooldownStore
+    from kebabmeister.actions.decision_log import DecisionLog
+    from kebabmeister.actions.pool import ActionPool
+    from kebabmeister.database import initialize_db
+    from kebabmeister.database.checkpoints import CheckpointStore
+    from kebabmeister.database.leases import LeaseAssignment
+    from kebabmeister.database.outbox import Outbox
+    from kebabmeister.database.schemas.comment import SeenComment
+    from kebabmeister.database.schemas.submission import SeenSubmission
+    from kebabmeister.database.seen import SeenRecorder
+    from kebabmeister.tasks.seen_pruning import SeenPruningTask
+    from kebabmeister.tasks.submission_monitoring import SubmissionMonitoringTask
+    from kebabmeister.utils.metrics import MetricsServer
+    from kebabmeister.utils.sharding import StaticAssignment
+    from kebabmeister.utils.task_manager import TaskManager
+
+    # Stop gracefully instead of abandoning the actions in progress
+    stopping = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        state.loop.add_signal_handler(signum, stopping.set)
+
+    state.startup = StartupTimer(STARTED)
+    state.startup.mark("imports")
+
     state.db_engine, state.db_session = await initialize_db(config.database)
+    state.startup.mark("database")
 
     state.reddit = asyncpraw.Reddit(
         client_id=config.reddit.client_id,
@@ -29,36 +63,120 @@ async def main(config: Configuration) -> int:
         password=config.reddit.password,
     )
 
-    state.me = await state.reddit.user.me()
+    # Planned actions are committed together with the seen IDs of their items, and only taken after that
+    state.outbox = Outbox(state.db_session, state.db_engine.dialect.name) if config.actions.outbox else None
+    state.actions = ActionPool(config.actions, state.reddit, state.outbox)
+    state.seen_submissions = SeenRecorder(state.db_session, SeenSubmission, state.db_engine.dialect.name,
+                                          config.database.flush_size, config.database.flush_interval,
+                                          config.database.index_size, state.outbox, state.actions)
+    state.seen_comments = SeenRecorder(state.db_session, SeenComment, state.db_engine.dialect.name,
+                                       config.database.flush_size, config.database.flush_interval,
+                                       config.database.index_size, state.outbox, state.actions)
+    state.checkpoints = CheckpointStore(state.db_session, state.db_engine.dialect.name,
+                                        config.monitoring.checkpoint_interval,
+                                        (state.seen_submissions, state.seen_comments))
+    if config.notifications.persist:
+        state.cooldowns = CooldownStore(config.notifications, state.db_session, state.db_engine.dialect.name)
+    else:
+        state.cooldowns = CooldownStore(config.notifications)
+
+    # Warm up the in-memory state while logging in
+    _, _, _, _, state.me = await asyncio.gather(
+        state.startup.measure("seen submissions", state.seen_submissions.load()),
+        state.startup.measure("seen comments", state.seen_comments.load()),
+        state.startup.measure("checkpoints", state.checkpoints.load()),
+        state.startup.measure("cooldowns", state.cooldowns.load()),
+        state.startup.measure("login", state.reddit.user.me()),
+    )
     logger.info(f"Logged in as {state.me.name} ({state.me.id})")
-
-    task_mgr = TaskManager()
-    task_mgr.schedule(SubmissionMonitoringTask(config=config))
-    await task_mgr.run()
+    state.seen_submissions.start()
+    state.seen_comments.start()
+    state.checkpoints.start()
+    state.cooldowns.start()
+
+    state.decisions = DecisionLog(config.dry_run.log_path)
+    state.decisions.start()
+    if config.dry_run.enabled:
+        logger.warning(f"Dry run: no actions are taken, decisions are logged to {config.dry_run.log_path}")
+
+    if config.sharding.leases:
+        worker_id = config.sharding.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        if config.sharding.worker_id and config.sharding.workers > 1:
+            worker_id = f"{worker_id}-{config.sharding.worker_index}"
+        state.shards = LeaseAssignment(state.db_session, state.db_engine.dialect.name, worker_id,
+                                       config.sharding.lease_ttl)
+        logger.info(f"Running as worker {worker_id} (lease-based assignment)")
+    else:
+        state.shards = StaticAssignment(config.sharding.workers, config.sharding.worker_index)
+        if config.sharding.workers > 1:
+            logger.info(f"Running as worker {config.sharding.worker_index} of {config.sharding.workers}")
+
+    state.actions.start()
+
+    if config.metrics.enabled:
+        state.metrics = MetricsServer(config.metrics.host, config.metrics.port)
+        await state.metrics.start()
+
+    state.task_manager = TaskManager(backoff=config.monitoring.restart_backoff,
+                                     backoff_max=config.monitoring.restart_backoff_max,
+                                     health_interval=config.monitoring.health_interval)
+    state.task_manager.schedule(SubmissionMonitoringTask(config=config))
+    if config.database.retention_days > 0:
+        state.task_manager.schedule(SeenPruningTask(config=config))
+    runner = asyncio.create_task(state.task_manager.run(), name="tasks")
+    stopped = asyncio.create_task(stopping.wait(), name="wait-for-signal")
+    await asyncio.wait([runner, stopped], return_when=asyncio.FIRST_COMPLETED)
+    stopped.cancel()
+    await shutdown(config)
 
     return 0
 
 
-@atexit.register
-def exit_handler():
+async def shutdown(config: Configuration):
     """
-    Exit handler. Handles sync cleanup.
+    Stops consuming the streams, and gives the queued actions until the drain deadline to finish. Unfinished
+    actions stay in the outbox and are replayed on the next start.
 
+    @param config: Configuration object
     @return: None
     """
-    logger.info("Exiting")
-    state.loop.run_until_complete(exit_task())
+    # A second signal terminates right away
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        state.loop.remove_signal_handler(signum)
+    logger.info("Shutting down")
+    await state.task_manager.stop()
+    # Hands the held actions to the pool
+    await state.seen_submissions.flush()
+    await state.seen_comments.flush()
+
+    try:
+        await asyncio.wait_for(state.actions.join(), config.actions.drain_timeout)
+        logger.debug("Queued actions drained")
+    except asyncio.TimeoutError:
+        logger.warning(f"Queued actions did not finish within {config.actions.drain_timeout:.1f}s")
 
 
 async def exit_task():
     """
-    Exit task. Handles async cleanup.
+    Exit task. Handles async cleanup of everything that was started.
 
     @return: None
     """
-    await state.reddit.close()
-    await state.db_engine.dispose()
-    logger.debug("Database engine disposed")
+    logger.info("Exiting")
+    # Actions are stopped first, so the outbox is flushed with the final state of the actions. Leases are released
+    # last, so no other worker takes over a subreddit before its state is flushed.
+    for name in ("metrics", "actions", "reddit", "seen_submissions", "seen_comments", "cooldowns", "decisions",
+                 "checkpoints", "shards"):
+        if not hasattr(state, name):
+            continue
+        try:
+            await getattr(state, name).close()
+        except Exception as e:
+            logger.error(f"Could not close {name}: {e}")
+    logger.debug("Seen IDs, outbox, notification cooldowns and stream checkpoints flushed")
+    if hasattr(state, "db_engine"):
+        await state.db_engine.dispose()
+        logger.debug("Database engine disposed")
 
 
 @logger.catch
@@ -76,8 +194,31 @@ def init():
         required=False,
         type=argparse.FileType("r"),
     )
+    parser.add_argument(
+        "--workers",
+        help="Number of worker processes to split the monitored subreddits across (overrides the config)",
+        required=False,
+        type=int,
+    )
+    parser.add_argument(
+        "--worker-index",
+        help="Index of this worker, from 0 to the number of workers - 1 (overrides the config)",
+        required=False,
+        type=int,
+    )
+    parser.add_argument(
+        "--summarize-decisions",
+        help="Print the volume of actions and API calls in a dry-run decision log, then exit",
+        metavar="LOG",
+        required=False,
+        type=argparse.FileType("r", encoding="utf-8"),
+    )
     args = parser.parse_args()
 
+    if args.summarize_decisions:
+        print_summary(summarize(args.summarize_decisions))
+        exit(0)
+
     try:
         if args.config:
             config = Configuration.schema().loads(args.config.read())
@@ -91,8 +232,21 @@ def init():
         logger.error(f"Missing key in config: {e}")
         exit(1)
 
+    if args.workers is not None:
+        config.sharding.workers = args.workers
+        if args.worker_index is None and args.workers > 1:
+            # Migrated once up front, then run every worker in its own process
+            from kebabmeister.database import prepare_db
+            asyncio.run(prepare_db(config.database))
+            exit(run_workers(args.workers, config.actions.drain_timeout))
+    if args.worker_index is not None:
+        config.sharding.worker_index = args.worker_index
+
     state.loop = asyncio.get_event_loop()
-    exit(state.loop.run_until_complete(main(config=config)))
+    try:
+        exit(state.loop.run_until_complete(main(config=config)))
+    finally:
+        state.loop.run_until_complete(exit_task())
 
 
 init()
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from asyncpraw.models.reddit.comment import Comment
+    from asyncpraw.models.reddit.redditor import Redditor
+    from asyncpraw.models.reddit.submission import Submission
+    from asyncpraw.models.reddit.subreddit import Subreddit
+
+
+class ActionKind(str, Enum):
+    REMOVE = "remove"
+    MESSAGE = "message"
+    REPLY = "reply"
+    DISTINGUISH = "distinguish"
+
+
+# Lower values are executed first
+PRIORITIES: dict[ActionKind, int] = {
+    ActionKind.REMOVE: 0,
+    ActionKind.MESSAGE: 1,
+    ActionKind.REPLY: 2,
+    ActionKind.DISTINGUISH: 2,
+}
+
+
+@dataclass
+class Action:
+    kind: ActionKind
+    # Item to remove, reply to or distinguish, or the recipient of a message
+    target: Comment | Submission | Redditor
+    subreddit: Subreddit
+
+    subject: str = ""
+    message: str = ""
+    mod_note: str = ""
+    distinguish: bool = True
+    sticky: bool = False
+    # Nice-to-have actions (such as welcome replies) that are dropped when the rate limit budget runs low
+    sheddable: bool = False
+    # Item a message is about, linked when messages are merged into a digest
+    about: Optional[Comment | Submission] = None
+    # Outbox entries (item fullname, kind) that are finished with this action
+    outbox_keys: tuple[tuple[str, str], ...] = ()
+
+    attempts: int = 0
+
+    @property
+    def priority(self) -> int:
+        return PRIORITIES[self.kind] + (1 if self.sheddable else 0)
+
+    def describe(self) -> str:
+        return f"{self.kind.value} {type(self.target).__name__} in subreddit {self.subreddit.display_name}"
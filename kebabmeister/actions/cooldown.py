@@ -0,0 +1,143 @@
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from kebabmeister.configuration import NotificationsConfiguration
+from kebabmeister.database.dialects import upsert
+from kebabmeister.database.schemas.notification import NotificationCooldown
+
+
+def _to_datetime(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CooldownStore:
+    def __init__(self,
+                 config: NotificationsConfiguration,
+                 session: Optional[async_sessionmaker[AsyncSession]] = None,
+                 dialect: str = ""):
+        """
+        Remembers when each user was last notified in each subreddit, so repeated notifications within the
+        cooldown window can be suppressed.
+
+        Entries expire after the cooldown window, and the least recently notified users are evicted once the
+        store is full. If a session factory is given, entries are also written to the database (in batches) and
+        loaded back on startup.
+
+        @param config: Notifications configuration
+        @param session: Session factory, or None to keep the store in memory only
+        @param dialect: Name of the database dialect
+        """
+        self.config = config
+        self.session = session
+        self.dialect = dialect
+        self._notified: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._dirty: dict[tuple[str, str], float] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.cooldown > 0
+
+    async def load(self, subreddit_id: Optional[str] = None):
+        """
+        Loads entries that are still within the cooldown window from the database.
+
+        @param subreddit_id: Only load the entries of this subreddit (for example after taking it over from
+        another worker)
+        """
+        if self.session is None or not self.enabled:
+            return
+        cutoff = _to_datetime(time.time() - self.config.cooldown)
+        statement = select(NotificationCooldown).where(NotificationCooldown.notified_date >= cutoff)
+        if subreddit_id is not None:
+            statement = statement.where(NotificationCooldown.subreddit_id == subreddit_id)
+        async with self.session() as session:
+            rows = (await session.execute(statement
+                                          .order_by(NotificationCooldown.notified_date.desc())
+                                          .limit(self.config.max_entries))).scalars().all()
+        for row in reversed(rows):
+            key = (row.subreddit_id, row.username)
+            notified = row.notified_date.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if notified > self._notified.get(key, 0):
+                self._notified[key] = notified
+        while len(self._notified) > self.config.max_entries:
+            self._notified.popitem(last=False)
+        logger.debug(f"Loaded {len(rows)} notification cooldowns")
+
+    def start(self):
+        """
+        Starts the periodic database writer, which also drops expired entries.
+        """
+        if self.enabled:
+            self._flusher = asyncio.create_task(self._flush_periodically(), name="flush-notification-cooldowns")
+
+    async def close(self):
+        """
+        Stops the periodic database writer and writes out all pending entries.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def try_acquire(self, subreddit_id: str, username: str) -> bool:
+        """
+        Checks whether a user may be notified, and if so, starts a new cooldown window for them.
+
+        @param subreddit_id: ID of the subreddit
+        @param username: Name of the user
+        @return: True if the user was not notified in this subreddit within the cooldown window
+        """
+        if not self.enabled:
+            return True
+
+        key = (subreddit_id, username.lower())
+        now = time.time()
+        last = self._notified.get(key)
+        if last is not None and now - last < self.config.cooldown:
+            return False
+
+        self._notified[key] = now
+        self._notified.move_to_end(key)
+        while len(self._notified) > self.config.max_entries:
+            self._notified.popitem(last=False)
+        if self.session is not None:
+            self._dirty[key] = now
+        return True
+
+    async def flush(self):
+        """
+        Drops expired entries, and writes pending entries to the database.
+        """
+        cutoff = time.time() - self.config.cooldown
+        for key in [key for key, notified in self._notified.items() if notified < cutoff]:
+            del self._notified[key]
+        if self.session is None or not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        rows = [{"subreddit_id": subreddit_id, "username": username, "notified_date": _to_datetime(notified)}
+                for (subreddit_id, username), notified in batch.items()]
+        try:
+            async with self.session() as session:
+                async with session.begin():
+                    await session.execute(upsert(self.dialect, NotificationCooldown,
+                                                 [NotificationCooldown.subreddit_id, NotificationCooldown.username],
+                                                 ["notified_date"]).values(rows))
+                    await session.execute(delete(NotificationCooldown).where(
+                        NotificationCooldown.notified_date < _to_datetime(time.time() - self.config.cooldown)))
+        except Exception as e:
+            # Newer entries for the same user win
+            self._dirty = {**batch, **self._dirty}
+            logger.error(f"Could not flush {len(batch)} notification cooldowns: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.config.flush_interval)
+            await self.flush()
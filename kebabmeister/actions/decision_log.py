@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Iterable, Optional
+
+from loguru import logger
+
+from kebabmeister.actions import Action, ActionKind
+
+if TYPE_CHECKING:
+    from asyncpraw.models.reddit.comment import Comment
+    from asyncpraw.models.reddit.submission import Submission
+
+
+def api_calls(action: Action) -> int:
+    """
+    @param action: Action
+    @return: Number of Reddit API calls the action takes, including follow-ups
+    """
+    if action.kind == ActionKind.REPLY and (action.distinguish or action.sticky):
+        return 2
+    return 1
+
+
+class DecisionLog:
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        """
+        Append-only JSONL log of the actions the bot would have taken in dry-run mode. The file is opened on the
+        first decision.
+
+        @param path: Path of the log file
+        @param flush_interval: Seconds between writes to disk
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._file: Optional[IO[str]] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    def start(self):
+        """
+        Starts the periodic writer.
+        """
+        self._flusher = asyncio.create_task(self._flush_periodically(), name="flush-decision-log")
+
+    async def close(self):
+        """
+        Stops the periodic writer and closes the file.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def record(self, action: Action, item: Comment | Submission):
+        """
+        Logs an action instead of executing it.
+
+        @param action: Action the bot would have taken
+        @param item: Comment or submission the action was decided on
+        """
+        entry = {
+            "time": round(time.time(), 3),
+            "subreddit": action.subreddit.display_name,
+            "item": item.id,
+            "type": "comment" if item.fullname.startswith("t1_") else "submission",
+            "author": item.author.name if item.author is not None else None,
+            "action": action.kind.value,
+            "calls": api_calls(action),
+        }
+        if action.subject:
+            entry["subject"] = action.subject
+        if action.message:
+            entry["message"] = action.message
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        logger.debug(f"Dry run: would {action.describe()}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._file is not None:
+                self._file.flush()
+
+
+def summarize(lines: Iterable[str]) -> list[dict]:
+    """
+    Aggregates a decision log into volumes per subreddit and action.
+
+    @param lines: Lines of the decision log
+    @return: One row per subreddit and action, with the number of decisions and API calls, in total and per hour.
+    API calls are counted as if messages were never merged into digests.
+    """
+    totals: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0])
+    first = last = None
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        row = totals[(entry["subreddit"], entry["action"])]
+        row[0] += 1
+        row[1] += entry.get("calls", 1)
+        first = entry["time"] if first is None else min(first, entry["time"])
+        last = entry["time"] if last is None else max(last, entry["time"])
+
+    # Rates over less than a minute of data are meaningless
+    hours = max(last - first, 60) / 3600 if first is not None else 1
+    return [{"subreddit": subreddit, "action": action, "decisions": decisions, "calls": calls,
+             "decisions_per_hour": decisions / hours, "calls_per_hour": calls / hours}
+            for (subreddit, action), (decisions, calls) in sorted(totals.items())]
+
+
+def print_summary(rows: list[dict]):
+    columns = [
+        ("subreddit", "subreddit", "{}"),
+        ("action", "action", "{}"),
+        ("decisions", "decisions", "{}"),
+        ("decisions/h", "decisions_per_hour", "{:.1f}"),
+        ("API calls", "calls", "{}"),
+        ("API calls/h", "calls_per_hour", "{:.1f}"),
+    ]
+    if rows:
+        rows = rows + [{
+            "subreddit": "total", "action": "",
+            **{key: sum(row[key] for row in rows)
+               for key in ("decisions", "calls", "decisions_per_hour", "calls_per_hour")},
+        }]
+    table = [[title for title, _, _ in columns]]
+    table += [[fmt.format(row[key]) for _, key, fmt in columns] for row in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(columns))]
+    for row in table:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,49 @@
+from kebabmeister.actions import Action, ActionKind
+
+# Longest private message body Reddit accepts
+MAX_MESSAGE_LENGTH = 10000
+# Links listed per subreddit in a digest
+MAX_LINKS = 10
+
+
+def _link(action: Action) -> str | None:
+    permalink = getattr(action.about, "permalink", None)
+    return f"https://www.reddit.com{permalink}" if permalink else None
+
+
+def merge_messages(actions: list[Action], subject: str) -> Action:
+    """
+    Merges messages to the same recipient into one digest, with one section per subreddit listing the items
+    involved. Identical messages within a subreddit are only included once.
+
+    @param actions: Message actions, all to the same recipient
+    @param subject: Subject of the digest, used unless all messages share the same subject
+    @return: Message action
+    """
+    by_subreddit: dict[str, list[Action]] = {}
+    for action in actions:
+        by_subreddit.setdefault(action.subreddit.display_name, []).append(action)
+
+    sections = []
+    for name, group in by_subreddit.items():
+        section = f"**r/{name}**\n\n" + "\n\n".join(dict.fromkeys(action.message for action in group))
+        links = [link for link in map(_link, group) if link is not None]
+        if links:
+            section += "\n\n" + "\n".join(f"- {link}" for link in links[:MAX_LINKS])
+            if len(links) > MAX_LINKS:
+                section += f"\n- ...and {len(links) - MAX_LINKS} more"
+        sections.append(section)
+
+    message = ""
+    for i, section in enumerate(sections):
+        separated = f"\n\n---\n\n{section}" if message else section
+        if len(message) + len(separated) > MAX_MESSAGE_LENGTH - 100:
+            message += f"\n\n---\n\n...and {len(sections) - i} more subreddits"
+            break
+        message += separated
+
+    subjects = {action.subject for action in actions}
+    return Action(kind=ActionKind.MESSAGE, target=actions[0].target, subreddit=actions[0].subreddit,
+                  subject=subjects.pop() if len(subjects) == 1 else subject, message=message,
+                  sheddable=all(action.sheddable for action in actions),
+                  outbox_keys=tuple(key for action in actions for key in action.outbox_keys))
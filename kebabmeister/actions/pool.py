@@ -0,0 +1,309 @@
+import asyncio
+import itertools
+import time
+from typing import Optional
+
+import asyncprawcore.exceptions
+from asyncpraw import Reddit
+from asyncpraw.models.reddit.comment import Comment
+from loguru import logger
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.actions.digest import merge_messages
+from kebabmeister.actions.rate_limit import RateBudget
+from kebabmeister.configuration import ActionsConfiguration
+from kebabmeister.database.outbox import Outbox
+from kebabmeister.utils.metrics import ACTION_LATENCY, ACTIONS
+
+# Errors after which the same call may succeed if it is retried later
+TRANSIENT_ERRORS = (
+    asyncprawcore.exceptions.RequestException,
+    asyncprawcore.exceptions.ServerError,
+    asyncprawcore.exceptions.TooManyRequests,
+)
+# Transient errors after which the call may still have gone through
+AMBIGUOUS_ERRORS = (
+    asyncprawcore.exceptions.RequestException,
+    asyncprawcore.exceptions.ServerError,
+)
+# Actions that post something new each time, so they are only retried if they certainly failed
+NON_IDEMPOTENT = (ActionKind.REPLY, ActionKind.MESSAGE)
+
+
+class ActionPool:
+    def __init__(self, config: ActionsConfiguration, reddit: Reddit, outbox: Optional[Outbox] = None):
+        """
+        Bounded priority queue of outbound moderation actions, executed by a pool of workers.
+
+        Removals run before messages, and messages before replies. When the Reddit rate limit budget runs low,
+        sheddable actions are dropped and everything except removals waits for the rate limit window to reset.
+        Submitting to a full queue waits until a worker frees up a slot, which slows the streams down instead of
+        letting the backlog grow without bounds. Messages to the same user within the coalescing window are merged
+        into one digest message. Finished actions are marked as done in the outbox.
+
+        @param config: Actions configuration
+        @param reddit: Reddit client the actions are made with
+        @param outbox: Outbox the actions were planned in
+        """
+        self.config = config
+        self.outbox = outbox
+        self.budget = RateBudget(reddit)
+        self._queue: asyncio.PriorityQueue[tuple[int, int, Action]] = asyncio.PriorityQueue(maxsize=config.queue_size)
+        # Keeps actions with the same priority in submission order
+        self._sequence = itertools.count()
+        self._workers: list[asyncio.Task] = []
+        # Retries, follow-up actions and digests waiting to be put on the queue, with the action they hold (if any)
+        self._deferred: dict[asyncio.Task, Optional[Action]] = {}
+        # Actions being executed, by worker
+        self._executing: dict[int, Action] = {}
+        # Messages waiting to be merged, by lowercase recipient name (oldest first)
+        self._digests: dict[str, list[Action]] = {}
+        self._held = 0
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of actions waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    def start(self):
+        """
+        Starts the workers.
+        """
+        for i in range(self.config.workers):
+            self._workers.append(asyncio.create_task(self._work(i), name=f"action-worker-{i}"))
+
+    async def close(self):
+        """
+        Stops the workers. Actions still in the queue, or submitted afterwards, are dropped (and replayed from the
+        outbox on the next start).
+        """
+        self._closed = True
+        for task in [*self._workers, *self._deferred]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._deferred, return_exceptions=True)
+        self._workers.clear()
+        if self.depth:
+            logger.warning(f"Dropped {self.depth} queued actions")
+        # Wakes up submitters waiting for a free slot
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+
+    async def join(self):
+        """
+        Waits until all queued actions, including pending retries and follow-ups, have been executed.
+        """
+        while True:
+            await self._queue.join()
+            if not self._deferred:
+                return
+            await asyncio.gather(*self._deferred, return_exceptions=True)
+
+    async def release(self, subreddit_ids: set[str], timeout: float):
+        """
+        Drops the queued and deferred actions in subreddits that are handed over to another worker, and waits for
+        the ones being executed. The dropped actions stay unfinished in the outbox, so the next owner replays them.
+
+        @param subreddit_ids: IDs of the subreddits
+        @param timeout: Maximum number of seconds to wait for the actions being executed
+        """
+        def released(action: Action) -> bool:
+            # Follow-ups (such as distinguishing a posted reply) are not in the outbox, so they are finished here
+            return bool(action.outbox_keys) and action.subreddit.id in subreddit_ids
+
+        dropped = 0
+        kept = []
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            self._queue.task_done()
+            if released(entry[2]):
+                dropped += 1
+            else:
+                kept.append(entry)
+        for entry in kept:
+            self._queue.put_nowait(entry)
+        for task, action in list(self._deferred.items()):
+            if action is not None and released(action):
+                task.cancel()
+                dropped += 1
+        for actions in self._digests.values():
+            remaining = [action for action in actions if not released(action)]
+            dropped += len(actions) - len(remaining)
+            self._held -= len(actions) - len(remaining)
+            actions[:] = remaining
+        if dropped:
+            logger.info(f"Handed over {dropped} unfinished actions")
+
+        deadline = time.monotonic() + timeout
+        while any(released(action) for action in self._executing.values()) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+    async def submit(self, action: Action):
+        """
+        Queues an action, waiting for a free slot if the queue is full.
+
+        @param action: Action to execute
+        """
+        if action.kind == ActionKind.MESSAGE and self.config.coalesce_window > 0:
+            # Held messages count against the queue size, so the oldest digests are sent early if too many are held
+            while self._held >= self.config.queue_size and self._digests:
+                await self._send_digest(next(iter(self._digests)))
+            self._coalesce(action)
+            return
+        await self._put(action)
+
+    async def _put(self, action: Action):
+        if self._closed:
+            return
+        if self._queue.full():
+            logger.debug(f"Action queue is full ({self.depth} actions), waiting for a free slot")
+        await self._queue.put((action.priority, next(self._sequence), action))
+
+    def _submit_later(self, action: Action, delay: float = 0):
+        """
+        Queues an action from a worker without blocking it.
+
+        @param action: Action to execute
+        @param delay: Seconds to wait before queueing
+        """
+        async def submit():
+            await asyncio.sleep(delay)
+            await self._put(action)
+
+        self._defer(submit(), action)
+
+    def _coalesce(self, action: Action):
+        """
+        Holds a message back for the coalescing window, and queues it merged with any other messages to the same
+        user submitted in the meantime.
+
+        @param action: Message action
+        """
+        recipient = action.target.name.lower()
+        self._held += 1
+        pending = self._digests.get(recipient)
+        if pending is not None:
+            pending.append(action)
+            return
+        pending = self._digests[recipient] = [action]
+
+        async def submit():
+            await asyncio.sleep(self.config.coalesce_window)
+            # Unless it has been sent early
+            if self._digests.get(recipient) is pending:
+                await self._send_digest(recipient)
+
+        self._defer(submit())
+
+    async def _send_digest(self, recipient: str):
+        """
+        Queues the messages held for a user, merged into one digest if there are several.
+
+        @param recipient: Lowercase name of the recipient
+        """
+        actions = self._digests.pop(recipient)
+        self._held -= len(actions)
+        if not actions:
+            # All of them were handed over to another worker
+            return
+        if len(actions) == 1:
+            await self._put(actions[0])
+            return
+        ACTIONS.labels(ActionKind.MESSAGE.value, "coalesced").inc(len(actions) - 1)
+        logger.debug(f"Merging {len(actions)} messages to {actions[0].target.name} into one")
+        await self._put(merge_messages(actions, self.config.coalesce_subject))
+
+    def _defer(self, coroutine, action: Optional[Action] = None):
+        task = asyncio.create_task(coroutine)
+        self._deferred[task] = action
+        task.add_done_callback(lambda done: self._deferred.pop(done, None))
+
+    async def _work(self, index: int):
+        while True:
+            _, _, action = await self._queue.get()
+            self._executing[index] = action
+            try:
+                if self._throttle(action):
+                    continue
+                started = time.perf_counter()
+                await self._execute(action)
+                ACTION_LATENCY.labels(action.kind.value).observe(time.perf_counter() - started)
+                ACTIONS.labels(action.kind.value, "done").inc()
+                self._finish(action)
+            except TRANSIENT_ERRORS as e:
+                action.attempts += 1
+                if action.kind in NON_IDEMPOTENT and isinstance(e, AMBIGUOUS_ERRORS):
+                    # Retrying could post the reply or message twice
+                    ACTIONS.labels(action.kind.value, "failed").inc()
+                    logger.error(f"Could not {action.describe()}, not retrying as it may have been sent: {e}")
+                    self._finish(action)
+                elif action.attempts > self.config.retries:
+                    ACTIONS.labels(action.kind.value, "failed").inc()
+                    logger.error(f"Could not {action.describe()} after {action.attempts} attempts: {e}")
+                    self._finish(action)
+                else:
+                    ACTIONS.labels(action.kind.value, "retried").inc()
+                    delay = self.config.retry_delay * 2 ** (action.attempts - 1)
+                    logger.warning(f"Could not {action.describe()}, retrying in {delay:.1f}s: {e}")
+                    self._submit_later(action, delay)
+            except Exception as e:
+                ACTIONS.labels(action.kind.value, "failed").inc()
+                logger.error(f"Could not {action.describe()}: {e}")
+                self._finish(action)
+            finally:
+                self._executing.pop(index, None)
+                self._queue.task_done()
+
+    def _throttle(self, action: Action) -> bool:
+        """
+        Sheds or defers an action if the rate limit budget is too low for it.
+
+        @param action: Action about to be executed
+        @return: True if the action must not be executed now
+        """
+        remaining = self.budget.remaining()
+        if remaining is None or action.kind == ActionKind.REMOVE:
+            return False
+        if action.sheddable and remaining < self.config.shed_below:
+            ACTIONS.labels(action.kind.value, "shed").inc()
+            logger.info(f"Rate limit budget is low ({remaining:.0f} requests left), skipping {action.describe()}")
+            self._finish(action)
+            return True
+        if remaining < self.config.defer_below:
+            delay = self.budget.seconds_to_reset()
+            logger.debug(f"Rate limit budget is low ({remaining:.0f} requests left), deferring {action.describe()} "
+                         f"by {delay:.1f}s")
+            ACTIONS.labels(action.kind.value, "deferred").inc()
+            self._submit_later(action, delay)
+            return True
+        return False
+
+    def _finish(self, action: Action):
+        """
+        Marks an action as finished in the outbox, so it is not replayed.
+
+        @param action: Action that was executed, failed for good or was shed
+        """
+        if self.outbox is not None:
+            for key in action.outbox_keys:
+                self.outbox.complete(key)
+
+    async def _execute(self, action: Action):
+        if action.kind == ActionKind.REMOVE:
+            await action.target.mod.remove(mod_note=action.mod_note)
+            logger.debug(f"Removed unflaired {type(action.target).__name__} in subreddit "
+                         f"{action.subreddit.display_name}")
+        elif action.kind == ActionKind.MESSAGE:
+            await action.target.message(subject=action.subject, message=action.message)
+        elif action.kind == ActionKind.REPLY:
+            reply: Optional[Comment] = await action.target.reply(action.message)
+            logger.debug(f"Replied to {type(action.target).__name__} with specified message text")
+            if reply is not None and (action.distinguish or action.sticky):
+                # Distinguishing is a separate call, retried on its own so the reply is never posted twice
+                self._submit_later(Action(kind=ActionKind.DISTINGUISH, target=reply, subreddit=action.subreddit,
+                                          distinguish=action.distinguish, sticky=action.sticky))
+        elif action.kind == ActionKind.DISTINGUISH:
+            await action.target.mod.distinguish(how="yes" if action.distinguish else "no", sticky=action.sticky)
@@ -0,0 +1,41 @@
+import time
+from typing import Optional
+
+from asyncpraw import Reddit
+
+
+class RateBudget:
+    def __init__(self, reddit: Reddit):
+        """
+        Read-only view of the Reddit rate limit, as last reported in the `x-ratelimit-*` response headers of any
+        request made through the client.
+
+        @param reddit: Reddit client
+        """
+        self.reddit = reddit
+
+    def _limiter(self):
+        # asyncprawcore keeps the header values on the session's rate limiter
+        core = getattr(self.reddit, "_core", None)
+        return getattr(core, "_rate_limiter", None)
+
+    def remaining(self) -> Optional[float]:
+        """
+        @return: Number of requests left in the current window, or None if no request has been made yet
+        """
+        limiter = self._limiter()
+        if limiter is None or limiter.remaining is None:
+            return None
+        if limiter.reset_timestamp is not None and limiter.reset_timestamp <= time.time():
+            # The window has been reset since the last response
+            return None
+        return limiter.remaining
+
+    def seconds_to_reset(self) -> float:
+        """
+        @return: Seconds until the current rate limit window resets
+        """
+        limiter = self._limiter()
+        if limiter is None or limiter.reset_timestamp is None:
+            return 0
+        return max(limiter.reset_timestamp - time.time(), 0)
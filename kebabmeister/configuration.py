@@ -7,6 +7,19 @@ from dataclasses_json import dataclass_json
 @dataclass
 class DatabaseConfiguration:
     url: str
+    flush_size: int = 100
+    flush_interval: float = 1.0
+    index_size: int = 10000
+    retention_days: int = 30
+    prune_interval: int = 3600
+    profile: str = "tuned"
+    pool_size: int = 5
+    max_overflow: int = 10
+    statement_cache_size: int = 500
+    sqlite_journal_mode: str = "wal"
+    sqlite_synchronous: str = "normal"
+    sqlite_busy_timeout: int = 5000
+    sqlite_cache_size: int = 20000
 
 
 @dataclass_json
@@ -16,6 +29,77 @@ class SubredditConfigConfiguration:
     update_interval: int
 
 
+@dataclass_json
+@dataclass
+class MonitoringConfiguration:
+    combined_streams: bool = False
+    combined_chunk_size: int = 50
+    checkpoint_interval: float = 10.0
+    catch_up: bool = False
+    catch_up_limit: int = 1000
+    restart_backoff: float = 1.0
+    restart_backoff_max: float = 300.0
+    health_interval: float = 300.0
+    startup_concurrency: int = 8
+    flair_cache_ttl: float = 600.0
+    flair_cache_size: int = 50000
+    flair_log_interval: float = 60.0
+    adaptive_polling: bool = False
+    poll_min_interval: float = 2.0
+    poll_max_interval: float = 120.0
+    poll_requests_per_minute: float = 60.0
+
+
+@dataclass_json
+@dataclass
+class ShardingConfiguration:
+    workers: int = 1
+    worker_index: int = 0
+    leases: bool = False
+    worker_id: str = ""
+    lease_ttl: float = 60.0
+    renew_interval: float = 15.0
+
+
+@dataclass_json
+@dataclass
+class ActionsConfiguration:
+    workers: int = 4
+    queue_size: int = 1000
+    retries: int = 3
+    retry_delay: float = 5.0
+    shed_below: int = 100
+    defer_below: int = 20
+    coalesce_window: float = 0.0
+    coalesce_subject: str = "Please flair up"
+    outbox: bool = True
+    drain_timeout: float = 8.0
+
+
+@dataclass_json
+@dataclass
+class NotificationsConfiguration:
+    cooldown: int = 0
+    max_entries: int = 10000
+    persist: bool = True
+    flush_interval: float = 10.0
+
+
+@dataclass_json
+@dataclass
+class DryRunConfiguration:
+    enabled: bool = False
+    log_path: str = "data/decisions.jsonl"
+
+
+@dataclass_json
+@dataclass
+class MetricsConfiguration:
+    enabled: bool = False
+    host: str = "127.0.0.1"
+    port: int = 9464
+
+
 @dataclass_json
 @dataclass
 class RedditConfiguration:
@@ -33,3 +117,9 @@ class Configuration:
     database: DatabaseConfiguration
     monitored_subreddits: list[str]
     subreddit_config: SubredditConfigConfiguration
+    monitoring: MonitoringConfiguration = field(default_factory=MonitoringConfiguration)
+    actions: ActionsConfiguration = field(default_factory=ActionsConfiguration)
+    notifications: NotificationsConfiguration = field(default_factory=NotificationsConfiguration)
+    sharding: ShardingConfiguration = field(default_factory=ShardingConfiguration)
+    metrics: MetricsConfiguration = field(default_factory=MetricsConfiguration)
+    dry_run: DryRunConfiguration = field(default_factory=DryRunConfiguration)
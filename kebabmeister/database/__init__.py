@@ -5,10 +5,11 @@ from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
-    create_async_engine,
 )
 
 from kebabmeister.configuration import DatabaseConfiguration
+from kebabmeister.database.engine import check_engine, create_engine
+from kebabmeister.database.migrations import migrate
 from kebabmeister.database.schemas import Base
 
 
@@ -16,11 +17,31 @@ from kebabmeister.database.schemas import Base
 async def initialize_db(
     config: DatabaseConfiguration,
 ) -> Tuple[AsyncEngine, async_sessionmaker[AsyncSession]]:
-    engine = create_async_engine(config.url)
+    engine = create_engine(config)
     session = async_sessionmaker(engine, expire_on_commit=True)
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await _create_schema(engine)
 
+    await check_engine(engine, config)
     logger.debug("Database initialized")
     return engine, session
+
+
+async def prepare_db(config: DatabaseConfiguration):
+    """
+    Migrates the database and creates the missing tables, so the worker processes started afterwards do not all
+    migrate the same database at once.
+
+    @param config: Database configuration
+    """
+    engine = create_engine(config)
+    try:
+        await _create_schema(engine)
+    finally:
+        await engine.dispose()
+
+
+async def _create_schema(engine: AsyncEngine):
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate)
+        await conn.run_sync(Base.metadata.create_all)
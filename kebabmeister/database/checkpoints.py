@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from kebabmeister.database.dialects import upsert
+from kebabmeister.database.schemas.checkpoint import StreamCheckpoint
+from kebabmeister.utils.reddit_id import to_int
+
+if TYPE_CHECKING:
+    from kebabmeister.database.seen import SeenRecorder
+
+COMMENTS = "comments"
+SUBMISSIONS = "submissions"
+
+
+class CheckpointStore:
+    def __init__(self, session: async_sessionmaker[AsyncSession], dialect: str, flush_interval: float,
+                 recorders: Iterable[SeenRecorder] = ()):
+        """
+        Per-subreddit, per-stream high-water marks (the newest processed item).
+
+        The marks loaded at startup are the resume marks: stream items at or below them were handled before the
+        restart, and are skipped without any dedup work. The live marks are written to the database every
+        `flush_interval` seconds, but only once the seen IDs of the items up to them are committed, so an item is
+        never skipped after a crash without a record of it and its actions.
+
+        @param session: Session factory
+        @param dialect: Name of the database dialect
+        @param flush_interval: Seconds between database writes
+        @param recorders: Seen recorders of the items that advance the marks
+        """
+        self.session = session
+        self.dialect = dialect
+        self.flush_interval = flush_interval
+        self.recorders = tuple(recorders)
+        self._resume: dict[tuple[str, str], int] = {}
+        self._marks: dict[tuple[str, str], tuple[int, float]] = {}
+        self._dirty: set[tuple[str, str]] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def load(self, subreddit_id: Optional[str] = None):
+        """
+        Loads the checkpoints from the database.
+
+        @param subreddit_id: Only load the checkpoints of this subreddit (for example after taking it over from
+        another worker)
+        """
+        statement = select(StreamCheckpoint)
+        if subreddit_id is not None:
+            statement = statement.where(StreamCheckpoint.subreddit_id == subreddit_id)
+        async with self.session() as session:
+            rows = (await session.execute(statement)).scalars().all()
+        for row in rows:
+            key = (row.subreddit_id, row.stream)
+            if key not in self._marks or row.last_id > self._marks[key][0]:
+                self._marks[key] = (row.last_id, row.last_created_utc)
+            self._resume[key] = max(self._resume.get(key, 0), row.last_id)
+        logger.debug(f"Loaded {len(rows)} stream checkpoints")
+
+    def start(self):
+        """
+        Starts the periodic database writer.
+        """
+        self._flusher = asyncio.create_task(self._flush_periodically(), name="flush-checkpoints")
+
+    async def close(self):
+        """
+        Stops the periodic database writer and writes out the current marks.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def resume_mark(self, subreddit_id: str, stream: str) -> Optional[int]:
+        """
+        @param subreddit_id: ID of the subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @return: Integer ID of the newest item handled before startup (or during catch-up), or None if unknown
+        """
+        return self._resume.get((subreddit_id, stream))
+
+    def is_handled(self, subreddit_id: str, stream: str, reddit_id: str) -> bool:
+        """
+        Checks whether a stream item was already handled before startup.
+
+        @param subreddit_id: ID of the subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @param reddit_id: Reddit ID of the item
+        @return: True if the item is at or below the resume mark
+        """
+        mark = self._resume.get((subreddit_id, stream))
+        return mark is not None and to_int(reddit_id) <= mark
+
+    def skip_through(self, subreddit_id: str, stream: str, reddit_id: str):
+        """
+        Moves the resume mark forward, for example after items have been processed by a catch-up.
+
+        @param subreddit_id: ID of the subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @param reddit_id: Reddit ID of the newest handled item
+        """
+        key = (subreddit_id, stream)
+        self._resume[key] = max(self._resume.get(key, 0), to_int(reddit_id))
+
+    def advance(self, subreddit_id: str, stream: str, reddit_id: str, created_utc: float):
+        """
+        Records that an item has been processed.
+
+        @param subreddit_id: ID of the subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @param reddit_id: Reddit ID of the item
+        @param created_utc: Creation time of the item (UNIX timestamp)
+        """
+        key = (subreddit_id, stream)
+        item_id = to_int(reddit_id)
+        mark = self._marks.get(key)
+        if mark is None or item_id > mark[0]:
+            self._marks[key] = (item_id, created_utc)
+            self._dirty.add(key)
+
+    async def flush(self):
+        """
+        Flushes the seen recorders, then writes the changed marks to the database.
+        """
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, set()
+        # Taken first: every item up to these marks has been claimed, so the recorder flushes below commit it
+        rows = [{"subreddit_id": subreddit_id, "stream": stream,
+                 "last_id": self._marks[(subreddit_id, stream)][0],
+                 "last_created_utc": self._marks[(subreddit_id, stream)][1]}
+                for subreddit_id, stream in batch]
+        for recorder in self.recorders:
+            if not await recorder.flush():
+                self._dirty |= batch
+                logger.warning(f"Not writing {len(batch)} stream checkpoints before the seen IDs are written")
+                return
+        try:
+            async with self.session() as session:
+                async with session.begin():
+                    await session.execute(upsert(self.dialect, StreamCheckpoint,
+                                                 [StreamCheckpoint.subreddit_id, StreamCheckpoint.stream],
+                                                 ["last_id", "last_created_utc", "updated_date"]).values(rows))
+        except Exception as e:
+            self._dirty |= batch
+            logger.error(f"Could not write {len(batch)} stream checkpoints: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
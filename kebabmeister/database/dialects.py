@@ -0,0 +1,42 @@
+from typing import Iterable, Type
+
+from sqlalchemy import Table, insert
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from kebabmeister.database.schemas import Base
+
+
+def insert_ignore(dialect: str, model: Type[Base] | Table):
+    """
+    Builds an INSERT statement that silently skips rows violating a unique constraint.
+
+    @param dialect: Name of the database dialect
+    @param model: Mapped class or table to insert into
+    @return: Insert statement
+    """
+    if dialect == "sqlite":
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        return postgresql.insert(model).on_conflict_do_nothing()
+    return insert(model).prefix_with("IGNORE")
+
+
+def upsert(dialect: str, model: Type[Base] | Table, index_elements: Iterable, update_columns: Iterable[str]):
+    """
+    Builds an INSERT statement that updates the given columns of the existing row on a conflict.
+
+    @param dialect: Name of the database dialect (sqlite, postgresql, mysql or mariadb)
+    @param model: Mapped class or table to insert into
+    @param index_elements: Columns of the conflicting unique constraint (MySQL uses any unique key instead)
+    @param update_columns: Names of the columns to update on a conflict
+    @return: Insert statement
+    @raise ValueError: If the dialect is not supported
+    """
+    if dialect in ("sqlite", "postgresql"):
+        statement = (postgresql if dialect == "postgresql" else sqlite).insert(model)
+        return statement.on_conflict_do_update(index_elements=list(index_elements),
+                                               set_={column: statement.excluded[column] for column in update_columns})
+    if dialect in ("mysql", "mariadb"):
+        statement = mysql.insert(model)
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in update_columns})
+    raise ValueError(f"Upserts are not supported on {dialect} databases")
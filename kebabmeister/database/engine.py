@@ -0,0 +1,89 @@
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from kebabmeister.configuration import DatabaseConfiguration
+
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size")
+
+
+def _is_sqlite_file(database: str | None) -> bool:
+    return bool(database) and database != ":memory:" and not database.startswith("file::memory:")
+
+
+def create_engine(config: DatabaseConfiguration) -> AsyncEngine:
+    """
+    Creates the database engine with the configured profile.
+
+    With the "tuned" profile, SQLite databases run in WAL mode with relaxed syncing, and all access from this process
+    goes through a single connection, so concurrent writers queue up in the process instead of failing with
+    "database is locked". PostgreSQL connections are pooled and checked before use, and asyncpg caches prepared
+    statements per connection.
+
+    @param config: Database configuration
+    @return: Engine
+    """
+    url = make_url(config.url)
+    if config.profile == "default":
+        return create_async_engine(url)
+    if config.profile != "tuned":
+        raise ValueError(f"Unknown database profile {config.profile}")
+
+    if url.get_backend_name() == "sqlite":
+        options = {}
+        if _is_sqlite_file(url.database):
+            # One writer at a time, without retrying on lock errors
+            options = {"pool_size": 1, "max_overflow": 0, "pool_timeout": 60}
+        engine = create_async_engine(url, **options)
+        event.listen(engine.sync_engine, "connect", _sqlite_pragmas(config))
+        return engine
+
+    options = {"pool_size": config.pool_size, "max_overflow": config.max_overflow, "pool_pre_ping": True}
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": config.statement_cache_size}
+    return create_async_engine(url, **options)
+
+
+def _sqlite_pragmas(config: DatabaseConfiguration):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={config.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={config.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.sqlite_busy_timeout)}")
+        # Negative sizes are in KiB
+        cursor.execute(f"PRAGMA cache_size={-int(config.sqlite_cache_size)}")
+        cursor.close()
+
+    return set_pragmas
+
+
+async def check_engine(engine: AsyncEngine, config: DatabaseConfiguration):
+    """
+    Logs the effective database settings, and warns about settings that did not take effect.
+
+    @param engine: Engine
+    @param config: Database configuration
+    """
+    dialect = engine.dialect.name
+    settings = {}
+    async with engine.connect() as conn:
+        if dialect == "sqlite":
+            for pragma in SQLITE_PRAGMAS:
+                settings[pragma] = (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+        elif dialect == "postgresql":
+            settings["server_version"] = (await conn.exec_driver_sql("SHOW server_version")).scalar()
+            settings["max_connections"] = (await conn.exec_driver_sql("SHOW max_connections")).scalar()
+
+    described = ", ".join(f"{name}={value}" for name, value in settings.items())
+    logger.info(f"Database: {dialect}+{engine.dialect.driver} ({config.profile} profile), {described}, "
+                f"pool: {engine.pool.status()}")
+
+    if config.profile != "tuned":
+        return
+    if (dialect == "sqlite" and _is_sqlite_file(engine.url.database)
+            and str(settings["journal_mode"]).lower() != config.sqlite_journal_mode.lower()):
+        logger.warning(f"SQLite journal mode is {settings['journal_mode']} instead of {config.sqlite_journal_mode}")
+    if dialect == "postgresql" and config.pool_size + config.max_overflow > int(settings["max_connections"]):
+        logger.warning(f"The connection pool ({config.pool_size} + {config.max_overflow} overflow) is larger than "
+                       f"the server allows ({settings['max_connections']} connections)")
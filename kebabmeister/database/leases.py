@@ -0,0 +1,102 @@
+import datetime
+import time
+from typing import Iterable
+
+from loguru import logger
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from kebabmeister.database.dialects import insert_ignore, upsert
+from kebabmeister.database.schemas.lease import SubredditLease, WorkerHeartbeat
+from kebabmeister.utils.sharding import rendezvous_owner
+
+
+def _to_datetime(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+
+
+class LeaseAssignment:
+    # Subreddits move between workers as workers join and leave
+    dynamic = True
+
+    def __init__(self, session: async_sessionmaker[AsyncSession], dialect: str, worker_id: str, lease_ttl: float):
+        """
+        Lease-based assignment of the monitored subreddits to the workers sharing one database.
+
+        Every call to `owned` is a heartbeat. The subreddits are spread over the workers with a recent heartbeat
+        (rendezvous hashing), and a worker only monitors a subreddit while it holds its lease. Leases are renewed by
+        every heartbeat, so the subreddits of a worker that stops heartbeating are taken over once its leases expire.
+
+        @param session: Session factory
+        @param dialect: Name of the database dialect
+        @param worker_id: Unique ID of this worker
+        @param lease_ttl: Seconds after which the heartbeat and leases of a worker expire
+        """
+        self.session = session
+        self.dialect = dialect
+        self.worker_id = worker_id
+        self.lease_ttl = lease_ttl
+
+    async def owned(self, subreddits: list[str]) -> set[str]:
+        """
+        Records a heartbeat, renews the leases this worker should hold and acquires the free ones.
+
+        @param subreddits: Names of all monitored subreddits
+        @return: Lowercase names of the subreddits this worker holds a lease on and should monitor
+        """
+        now = time.time()
+        expires = _to_datetime(now + self.lease_ttl)
+        names = {name.lower() for name in subreddits}
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(upsert(self.dialect, WorkerHeartbeat, [WorkerHeartbeat.worker_id],
+                                             ["last_seen"]).values(worker_id=self.worker_id,
+                                                                   last_seen=_to_datetime(now)))
+                # Forget workers that have been gone for a long time
+                await session.execute(delete(WorkerHeartbeat).where(
+                    WorkerHeartbeat.last_seen < _to_datetime(now - 10 * self.lease_ttl)))
+                live = (await session.execute(select(WorkerHeartbeat.worker_id).where(
+                    WorkerHeartbeat.last_seen >= _to_datetime(now - self.lease_ttl)))).scalars().all()
+
+                wanted = [name for name in names if rendezvous_owner(name, live) == self.worker_id]
+                if wanted:
+                    # Take free leases, then renew our own and take over expired ones
+                    await session.execute(insert_ignore(self.dialect, SubredditLease).values(
+                        [{"subreddit": name, "owner": self.worker_id, "expires": expires} for name in wanted]))
+                    await session.execute(update(SubredditLease).where(
+                        SubredditLease.subreddit.in_(wanted),
+                        or_(SubredditLease.owner == self.worker_id, SubredditLease.expires < _to_datetime(now)),
+                    ).values(owner=self.worker_id, expires=expires))
+                held = (await session.execute(select(SubredditLease.subreddit).where(
+                    SubredditLease.owner == self.worker_id,
+                    SubredditLease.expires >= _to_datetime(now)))).scalars().all()
+
+        owned = set(held) & set(wanted)
+        logger.trace(f"Worker {self.worker_id}: {len(live)} live workers, {len(owned)}/{len(wanted)} leases held")
+        return owned
+
+    async def release(self, subreddits: Iterable[str]):
+        """
+        Gives up leases, so other workers can take the subreddits over. Their streams must be stopped first.
+
+        @param subreddits: Lowercase names of the subreddits
+        """
+        subreddits = list(subreddits)
+        if not subreddits:
+            return
+        async with self.session() as session:
+            async with session.begin():
+                await session.execute(delete(SubredditLease).where(SubredditLease.owner == self.worker_id,
+                                                                   SubredditLease.subreddit.in_(subreddits)))
+
+    async def close(self):
+        """
+        Gives up all leases and removes the heartbeat, so the other workers take over right away.
+        """
+        try:
+            async with self.session() as session:
+                async with session.begin():
+                    await session.execute(delete(SubredditLease).where(SubredditLease.owner == self.worker_id))
+                    await session.execute(delete(WorkerHeartbeat).where(WorkerHeartbeat.worker_id == self.worker_id))
+        except Exception as e:
+            logger.error(f"Could not release the leases of worker {self.worker_id}: {e}")
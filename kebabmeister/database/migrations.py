@@ -0,0 +1,86 @@
+from loguru import logger
+from sqlalchemy import Connection, MetaData, Table, inspect, select, text
+
+from kebabmeister.database.dialects import insert_ignore
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.utils.reddit_id import to_int
+
+# Tables that used to store the Reddit ID as text next to a surrogate key
+SEEN_TABLES: tuple[Table, ...] = (SeenSubmission.__table__, SeenComment.__table__)
+COPY_BATCH_SIZE = 5000
+# Arbitrary key of the PostgreSQL advisory lock that serializes migrations of one database
+MIGRATION_LOCK_KEY = 0x6B6562
+
+
+def migrate(conn: Connection):
+    """
+    Brings existing databases up to date with the current schema. Runs before `create_all`.
+
+    @param conn: Connection with an open transaction
+    @return: None
+    """
+    if conn.dialect.name == "postgresql":
+        # Held until the transaction ends, so workers starting at the same time migrate one after the other
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    for table in SEEN_TABLES:
+        legacy_name = f"{table.name}_legacy"
+        inspector = inspect(conn)
+        if (inspector.has_table(table.name)
+                and "reddit_id" in {column["name"] for column in inspector.get_columns(table.name)}):
+            logger.info(f"Migrating {table.name} to integer Reddit IDs")
+            conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {legacy_name}"))
+        # Not every database can roll back DDL, so an interrupted migration is resumed from the legacy table
+        if inspect(conn).has_table(legacy_name):
+            _copy_legacy_table(conn, table, legacy_name)
+
+
+def _copy_legacy_table(conn: Connection, table: Table, legacy_name: str):
+    """
+    Copies rows from a legacy seen_* table (text Reddit IDs) into its current definition and drops it.
+
+    @param conn: Connection with an open transaction
+    @param table: Current definition of the table
+    @param legacy_name: Name of the legacy table
+    @return: None
+    """
+    if not inspect(conn).has_table(table.name):
+        _free_index_names(conn, table, legacy_name)
+        table.create(conn)
+    legacy = Table(legacy_name, MetaData(), autoload_with=conn)
+
+    rows = conn.execute(select(legacy.c.reddit_id, legacy.c.seen_date))
+    migrated = 0
+    while batch := rows.fetchmany(COPY_BATCH_SIZE):
+        conn.execute(insert_ignore(conn.dialect.name, table), [{"id": to_int(reddit_id), "seen_date": seen_date}
+                                                               for reddit_id, seen_date in batch])
+        migrated += len(batch)
+
+    legacy.drop(conn)
+    logger.info(f"Migrated {migrated} rows in {table.name}")
+
+
+def _free_index_names(conn: Connection, table: Table, legacy_name: str):
+    """
+    Gets the indexes of a legacy table out of the way of the current definition. Renaming a table keeps the names of
+    its indexes (including the ones behind its primary key and unique constraints), which PostgreSQL and SQLite
+    require to be unique per schema.
+
+    @param conn: Connection with an open transaction
+    @param table: Current definition of the table
+    @param legacy_name: Name of the legacy table
+    @return: None
+    """
+    if conn.dialect.name == "postgresql":
+        names = conn.execute(text("SELECT indexname FROM pg_indexes "
+                                  "WHERE schemaname = current_schema() AND tablename = :table"),
+                             {"table": legacy_name}).scalars().all()
+        for name in names:
+            if table.name in name and legacy_name not in name:
+                conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{name.replace(table.name, legacy_name, 1)}"'))
+    elif conn.dialect.name == "sqlite":
+        # Indexes backing constraints are named after the table automatically, so only explicit ones can collide
+        wanted = {index.name for index in table.indexes}
+        for index in inspect(conn).get_indexes(legacy_name):
+            if index["name"] in wanted:
+                conn.execute(text(f'DROP INDEX "{index["name"]}"'))
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.database.dialects import insert_ignore
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.outbox import OutboxEntry
+from kebabmeister.database.schemas.submission import SeenSubmission
+
+if TYPE_CHECKING:
+    from asyncpraw import Reddit
+    from asyncpraw.models.reddit.comment import Comment
+    from asyncpraw.models.reddit.submission import Submission
+    from asyncpraw.models.reddit.subreddit import Subreddit
+
+# Fullname prefix of the items whose seen IDs are stored in each seen_* table
+ITEM_PREFIXES = {
+    SeenComment.__tablename__: "t1_",
+    SeenSubmission.__tablename__: "t3_",
+}
+
+OutboxKey = tuple[str, str]
+
+
+class Outbox:
+    def __init__(self, session: async_sessionmaker[AsyncSession], dialect: str):
+        """
+        Durable record of the actions planned for new items.
+
+        Planned actions are written in the same transaction as the seen IDs of their items (see `SeenRecorder`),
+        and deleted once they have been executed, so an item is never marked as seen without a record of what is
+        still to be done about it. Actions are only taken once that transaction is committed. Actions left over by
+        a shutdown or crash are replayed on the next start.
+
+        @param session: Session factory
+        @param dialect: Name of the database dialect
+        """
+        self.session = session
+        self.dialect = dialect
+        # Planned actions that are not in the database yet
+        self._unwritten: dict[OutboxKey, dict] = {}
+        # Executed actions that are still in the database
+        self._done: set[OutboxKey] = set()
+
+    def record(self, item: Comment | Submission, action: Action):
+        """
+        Plans an action. The item's seen ID must have been claimed.
+
+        @param item: Comment or submission the action was decided on
+        @param action: Action to take
+        """
+        key = (item.fullname, action.kind.value)
+        action.outbox_keys = (key,)
+        self._unwritten[key] = {
+            "item": item.fullname,
+            "kind": action.kind.value,
+            "subreddit": action.subreddit.display_name.lower(),
+            "recipient": action.target.name if action.kind == ActionKind.MESSAGE else None,
+            "subject": action.subject,
+            "message": action.message,
+            "mod_note": action.mod_note,
+            "distinguish": action.distinguish,
+            "sticky": action.sticky,
+            "sheddable": action.sheddable,
+        }
+
+    def complete(self, key: OutboxKey):
+        """
+        Marks a planned action as finished (executed, failed for good or shed).
+
+        @param key: Key of the action, from `Action.outbox_keys`
+        """
+        if self._unwritten.pop(key, None) is None:
+            self._done.add(key)
+
+    def has_work(self, table: str) -> bool:
+        """
+        @param table: Name of the seen_* table being flushed
+        @return: True if `take` would return anything to write
+        """
+        prefix = ITEM_PREFIXES[table]
+        return bool(self._done) or any(item.startswith(prefix) for item, _ in self._unwritten)
+
+    def take(self, table: str) -> tuple[dict[OutboxKey, dict], set[OutboxKey]]:
+        """
+        Takes the planned actions on the items of a seen_* table, and all finished actions, for writing.
+
+        @param table: Name of the seen_* table being flushed
+        @return: Rows to insert and keys to delete, to be passed to `write` (and `restore` if writing fails)
+        """
+        prefix = ITEM_PREFIXES[table]
+        rows = {key: row for key, row in self._unwritten.items() if key[0].startswith(prefix)}
+        for key in rows:
+            del self._unwritten[key]
+        done, self._done = self._done, set()
+        return rows, done
+
+    async def write(self, session: AsyncSession, rows: dict[OutboxKey, dict], done: set[OutboxKey]):
+        """
+        Inserts planned actions and deletes finished ones.
+
+        @param session: Session with an open transaction
+        @param rows: Rows to insert
+        @param done: Keys to delete
+        """
+        if rows:
+            await session.execute(insert_ignore(self.dialect, OutboxEntry).values(list(rows.values())))
+        if done:
+            await session.execute(delete(OutboxEntry).where(tuple_(OutboxEntry.item, OutboxEntry.kind).in_(done)))
+
+    def restore(self, rows: dict[OutboxKey, dict], done: set[OutboxKey]):
+        """
+        Puts back what `take` returned after writing it failed, so it is written with the next flush.
+
+        @param rows: Rows that were not inserted
+        @param done: Keys that were not deleted
+        """
+        for key, row in rows.items():
+            if key in self._done:
+                # Finished while it was being written, so it never has to be
+                self._done.discard(key)
+            else:
+                self._unwritten[key] = row
+        self._done |= done
+
+    async def unfinished(self, subreddits: Iterable[str]) -> list[OutboxEntry]:
+        """
+        Loads the planned actions that were never finished.
+
+        @param subreddits: Lowercase names of the subreddits to load the actions of
+        @return: Outbox entries, oldest first
+        """
+        subreddits = list(subreddits)
+        if not subreddits:
+            return []
+        async with self.session() as session:
+            return list((await session.execute(select(OutboxEntry)
+                                               .where(OutboxEntry.subreddit.in_(subreddits))
+                                               .order_by(OutboxEntry.created_date))).scalars().all())
+
+    @staticmethod
+    async def to_action(entry: OutboxEntry, reddit: Reddit, subreddit: Subreddit) -> Action:
+        """
+        Rebuilds the action of an outbox entry.
+
+        @param entry: Outbox entry
+        @param reddit: Reddit client
+        @param subreddit: Subreddit of the item
+        @return: Action
+        """
+        if entry.item.startswith(ITEM_PREFIXES[SeenComment.__tablename__]):
+            item = await reddit.comment(entry.item[3:], fetch=False)
+        else:
+            item = await reddit.submission(entry.item[3:], fetch=False)
+        kind = ActionKind(entry.kind)
+        if kind == ActionKind.MESSAGE:
+            target = await reddit.redditor(entry.recipient)
+        else:
+            target = item
+        return Action(kind=kind, target=target, subreddit=subreddit, subject=entry.subject, message=entry.message,
+                      mod_note=entry.mod_note, distinguish=entry.distinguish, sticky=entry.sticky,
+                      sheddable=entry.sheddable, about=item if kind == ActionKind.MESSAGE else None,
+                      outbox_keys=((entry.item, entry.kind),))
@@ -0,0 +1,17 @@
+import datetime
+from sqlalchemy import BigInteger, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from kebabmeister.database.schemas import Base
+
+
+class StreamCheckpoint(Base):
+    __tablename__ = "stream_checkpoints"
+
+    subreddit_id: Mapped[str] = mapped_column(primary_key=True)
+    # "comments" or "submissions"
+    stream: Mapped[str] = mapped_column(primary_key=True)
+    # Newest processed Reddit ID, stored as an integer
+    last_id: Mapped[int] = mapped_column(BigInteger)
+    last_created_utc: Mapped[float]
+    updated_date: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
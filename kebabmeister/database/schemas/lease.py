@@ -0,0 +1,20 @@
+import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from kebabmeister.database.schemas import Base
+
+
+class WorkerHeartbeat(Base):
+    __tablename__ = "worker_heartbeats"
+
+    worker_id: Mapped[str] = mapped_column(primary_key=True)
+    last_seen: Mapped[datetime.datetime] = mapped_column(index=True)
+
+
+class SubredditLease(Base):
+    __tablename__ = "subreddit_leases"
+
+    # Lowercase subreddit name
+    subreddit: Mapped[str] = mapped_column(primary_key=True)
+    owner: Mapped[str] = mapped_column(index=True)
+    expires: Mapped[datetime.datetime]
@@ -0,0 +1,13 @@
+import datetime
+from sqlalchemy.orm import Mapped, mapped_column
+
+from kebabmeister.database.schemas import Base
+
+
+class NotificationCooldown(Base):
+    __tablename__ = "notification_cooldowns"
+
+    subreddit_id: Mapped[str] = mapped_column(primary_key=True)
+    # Lowercase username
+    username: Mapped[str] = mapped_column(primary_key=True)
+    notified_date: Mapped[datetime.datetime] = mapped_column(index=True)
@@ -0,0 +1,27 @@
+import datetime
+from typing import Optional
+
+from sqlalchemy import Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from kebabmeister.database.schemas import Base
+
+
+class OutboxEntry(Base):
+    __tablename__ = "outbox"
+
+    # Fullname of the item the action was decided on (t1_... or t3_...)
+    item: Mapped[str] = mapped_column(primary_key=True)
+    # Action kind ("remove", "message" or "reply")
+    kind: Mapped[str] = mapped_column(primary_key=True)
+    # Lowercase subreddit name
+    subreddit: Mapped[str] = mapped_column(index=True)
+    # Recipient of a message
+    recipient: Mapped[Optional[str]]
+    subject: Mapped[str] = mapped_column(Text, default="")
+    message: Mapped[str] = mapped_column(Text, default="")
+    mod_note: Mapped[str] = mapped_column(default="")
+    distinguish: Mapped[bool] = mapped_column(default=True)
+    sticky: Mapped[bool] = mapped_column(default=False)
+    sheddable: Mapped[bool] = mapped_column(default=False)
+    created_date: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
@@ -1,5 +1,5 @@
 import datetime
-from sqlalchemy import func
+from sqlalchemy import BigInteger, Integer, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from kebabmeister.database.schemas import Base
@@ -8,6 +8,7 @@ from kebabmeister.database.schemas import Base
 class SeenSubmission(Base):
     __tablename__ = "seen_submissions"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    seen_date: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
-    reddit_id: Mapped[str] = mapped_column(unique=True)
+    # Base36 Reddit ID stored as an integer (INTEGER PRIMARY KEY is the rowid on SQLite, so no extra index is needed)
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True,
+                                    autoincrement=False)
+    seen_date: Mapped[datetime.datetime] = mapped_column(server_default=func.now(), index=True)
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import time
+from typing import TYPE_CHECKING, Optional, Type
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from kebabmeister.actions import Action
+from kebabmeister.database.dialects import insert_ignore
+from kebabmeister.database.outbox import Outbox
+from kebabmeister.database.schemas import Base
+from kebabmeister.utils.metrics import SEEN_FLUSH, SEEN_LOOKUP
+from kebabmeister.utils.reddit_id import to_int
+
+if TYPE_CHECKING:
+    from kebabmeister.actions.pool import ActionPool
+
+
+class SeenIndex:
+    # Allowed clock difference between Reddit's `created_utc` and our `seen_date`, in seconds
+    CLOCK_SKEW = 60
+
+    def __init__(self, max_size: int):
+        """
+        Bounded index of recently seen Reddit IDs.
+
+        The index always holds every ID seen at or after its horizon. An item created after the horizon that is not
+        in the index has therefore never been seen, and the database does not need to be asked about it. Subreddits
+        taken over from another worker have their own, later horizon, as the other worker's claims are not indexed.
+
+        @param max_size: Maximum number of IDs kept in memory
+        """
+        self.max_size = max_size
+        self.horizon: float = time.time()
+        self.subreddit_horizons: dict[str, float] = {}
+        self._seen: dict[int, float] = {}
+
+    def __contains__(self, reddit_id: int) -> bool:
+        return reddit_id in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def covers(self, created_utc: Optional[float], subreddit_id: Optional[str] = None) -> bool:
+        """
+        Checks whether the index is authoritative for an item.
+
+        @param created_utc: Creation time of the item (UNIX timestamp)
+        @param subreddit_id: ID of the subreddit of the item
+        @return: True if a miss in the index means the item has never been seen
+        """
+        horizon = max(self.horizon, self.subreddit_horizons.get(subreddit_id, 0))
+        return created_utc is not None and created_utc > horizon + self.CLOCK_SKEW
+
+    def add(self, reddit_id: int, seen_at: Optional[float] = None):
+        """
+        Adds an ID to the index, evicting the oldest IDs if the index is full.
+
+        @param reddit_id: Reddit ID of the item (as an integer)
+        @param seen_at: Time the item was seen (UNIX timestamp, default: now)
+        """
+        if reddit_id in self._seen:
+            return
+        self._seen[reddit_id] = time.time() if seen_at is None else seen_at
+        while len(self._seen) > self.max_size:
+            # Dicts keep insertion order, which is also the order in which the IDs were seen
+            evicted = next(iter(self._seen))
+            self.horizon = max(self.horizon, self._seen.pop(evicted))
+
+    async def load(self, session: async_sessionmaker[AsyncSession], model: Type[Base]):
+        """
+        Warm-loads the index with the newest IDs from the database.
+
+        @param session: Session factory
+        @param model: Mapped class with integer `id` and `seen_date` columns
+        """
+        async with session() as s:
+            rows = (await s.execute(select(model.id, model.seen_date)
+                                    .order_by(model.seen_date.desc())
+                                    .limit(self.max_size))).all()
+
+        self._seen.clear()
+        for reddit_id, seen_date in reversed(rows):
+            self._seen[reddit_id] = seen_date.replace(tzinfo=datetime.timezone.utc).timestamp()
+        if len(rows) < self.max_size:
+            # The whole table fits into the index
+            self.horizon = 0
+        else:
+            self.horizon = next(iter(self._seen.values()))
+
+
+class SeenRecorder:
+    def __init__(self,
+                 session: async_sessionmaker[AsyncSession],
+                 model: Type[Base],
+                 dialect: str,
+                 flush_size: int,
+                 flush_interval: float,
+                 index_size: int,
+                 outbox: Optional[Outbox] = None,
+                 actions: Optional[ActionPool] = None):
+        """
+        Write-behind recorder for seen Reddit IDs.
+
+        IDs are claimed in memory immediately and written to the database in batches, either once `flush_size`
+        IDs are pending or every `flush_interval` seconds, whichever comes first. Recently seen IDs are answered from
+        an in-memory index, so only old items that fall outside of it are looked up in the database.
+
+        Actions on claimed items are held back until the batch with their item's ID is committed, and only then
+        handed to the action pool. An item whose claim is lost in a crash is therefore claimed again after the
+        restart, but it has not been acted on yet.
+
+        @param session: Session factory
+        @param model: Mapped class with an integer `id` column holding the Reddit ID
+        @param dialect: Name of the database dialect
+        @param flush_size: Number of pending IDs that triggers a flush
+        @param flush_interval: Maximum number of seconds an ID stays pending
+        @param index_size: Maximum number of IDs kept in the in-memory index
+        @param outbox: Outbox whose planned actions are written in the same transaction as the IDs
+        @param actions: Action pool the held actions are handed to once committed
+        """
+        self.session = session
+        self.model = model
+        self.dialect = dialect
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.index = SeenIndex(index_size)
+        self.outbox = outbox
+        self.actions = actions
+
+        # IDs that were claimed in this process, but are not yet committed to the database
+        self._claimed: set[int] = set()
+        self._pending: list[int] = []
+        # Actions on claimed items, held back until the IDs of their items are committed
+        self._held: list[Action] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_tasks: set[asyncio.Task] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def load(self):
+        """
+        Warm-loads the in-memory index from the database.
+        """
+        await self.index.load(self.session, self.model)
+        logger.debug(f"Loaded {len(self.index)} IDs from {self.model.__tablename__}")
+
+    def start(self):
+        """
+        Starts the periodic flusher.
+        """
+        self._flusher = asyncio.create_task(self._flush_periodically(),
+                                            name=f"flush-{self.model.__tablename__}")
+
+    async def close(self):
+        """
+        Stops the periodic flusher and writes out all pending IDs. The action pool must be closed first: actions
+        still held are not taken any more, but stay in the outbox and are replayed on the next start.
+        """
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self.actions = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+
+    def take_over(self, subreddit_id: str):
+        """
+        Stops trusting the in-memory index for the items of a subreddit created before now, as they may have been
+        claimed by the worker that monitored the subreddit before.
+
+        @param subreddit_id: ID of the subreddit
+        """
+        self.index.subreddit_horizons[subreddit_id] = time.time()
+
+    async def claim(self, reddit_id: str, created_utc: Optional[float] = None,
+                    subreddit_id: Optional[str] = None) -> bool:
+        """
+        Claims an ID. Only the first claim of a given ID succeeds, including claims made before a restart.
+
+        @param reddit_id: Reddit ID of the item
+        @param created_utc: Creation time of the item (UNIX timestamp), lets recent items skip the database lookup
+        @param subreddit_id: ID of the subreddit of the item
+        @return: True if the ID has not been seen before, False otherwise
+        """
+        reddit_id = to_int(reddit_id)
+        if reddit_id in self._claimed or reddit_id in self.index:
+            return False
+        # Reserve the ID before yielding to the event loop, so concurrent claims of the same ID fail
+        self._claimed.add(reddit_id)
+        if self.index.covers(created_utc, subreddit_id):
+            self._accept(reddit_id)
+            return True
+
+        started = time.perf_counter()
+        try:
+            async with self.session() as session:
+                known = await session.scalar(select(self.model.id).where(self.model.id == reddit_id))
+        except Exception:
+            self._claimed.discard(reddit_id)
+            raise
+        SEEN_LOOKUP.labels(self.model.__tablename__).observe(time.perf_counter() - started)
+
+        if known is not None:
+            self._claimed.discard(reddit_id)
+            self.index.add(reddit_id)
+            return False
+
+        self._accept(reddit_id)
+        return True
+
+    async def hold(self, action: Action):
+        """
+        Holds an action on a claimed item until the item's ID is committed. Flushes right away if `flush_size`
+        actions are held, which also waits for the action pool to accept them.
+
+        @param action: Action to take
+        """
+        self._held.append(action)
+        if len(self._held) >= self.flush_size:
+            await self.flush()
+
+    def _accept(self, reddit_id: int):
+        self.index.add(reddit_id)
+        self._pending.append(reddit_id)
+        if len(self._pending) >= self.flush_size:
+            task = asyncio.create_task(self.flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self) -> bool:
+        """
+        Writes all pending IDs to the database in a single multi-row insert, together with the outbox entries of
+        their items, and then hands the held actions to the action pool.
+
+        @return: True if every ID claimed before the call is committed
+        """
+        table = self.model.__tablename__
+        async with self._flush_lock:
+            if not self._pending and not self._held and not (self.outbox is not None and self.outbox.has_work(table)):
+                return True
+            batch, self._pending = self._pending, []
+            # Every held action is on an item of this batch or an earlier one
+            held, self._held = self._held, []
+            # Taken after the IDs, so every action planned so far is on an item of this batch or an earlier one
+            outbox = self.outbox.take(table) if self.outbox is not None else None
+            started = time.perf_counter()
+            try:
+                async with self.session() as session:
+                    async with session.begin():
+                        if batch:
+                            await session.execute(insert_ignore(self.dialect, self.model)
+                                                  .values([{"id": reddit_id} for reddit_id in batch]))
+                        if outbox is not None:
+                            await self.outbox.write(session, *outbox)
+            except Exception as e:
+                # Keep the IDs claimed and retry on the next flush
+                self._pending = batch + self._pending
+                self._held = held + self._held
+                if outbox is not None:
+                    self.outbox.restore(*outbox)
+                logger.error(f"Could not flush {len(batch)} IDs to {table}: {e}")
+                return False
+            SEEN_FLUSH.labels(table).observe(time.perf_counter() - started)
+            # Committed IDs are now answered by the database
+            self._claimed.difference_update(batch)
+            logger.trace(f"Flushed {len(batch)} IDs to {table}")
+
+            if self.actions is None:
+                if held:
+                    logger.warning(f"Not taking {len(held)} actions, the action pool is closed")
+                return True
+            # Submitted under the lock, so a full action queue also holds up the next flush (and the streams)
+            for action in held:
+                await self.actions.submit(action)
+            return True
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
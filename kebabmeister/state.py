@@ -1,16 +1,45 @@
+from __future__ import annotations
+
 from asyncio import AbstractEventLoop
+from typing import TYPE_CHECKING
 
-from asyncpraw import Reddit
-from asyncpraw.models.reddit.redditor import Redditor
-from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+if TYPE_CHECKING:
+    # Only needed for annotations; importing these at runtime would be circular (or slow)
+    from asyncpraw import Reddit
+    from asyncpraw.models.reddit.redditor import Redditor
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
 
-from kebabmeister.configuration import Configuration
+    from kebabmeister.configuration import Configuration
+    from kebabmeister.actions.cooldown import CooldownStore
+    from kebabmeister.actions.decision_log import DecisionLog
+    from kebabmeister.actions.pool import ActionPool
+    from kebabmeister.database.checkpoints import CheckpointStore
+    from kebabmeister.database.leases import LeaseAssignment
+    from kebabmeister.database.outbox import Outbox
+    from kebabmeister.database.seen import SeenRecorder
+    from kebabmeister.utils.metrics import MetricsServer
+    from kebabmeister.utils.sharding import StaticAssignment
+    from kebabmeister.utils.task_manager import TaskManager
+    from kebabmeister.utils.timing import StartupTimer
 
 loop: AbstractEventLoop
+startup: StartupTimer
+task_manager: TaskManager
+shards: StaticAssignment | LeaseAssignment
 
 db_engine: AsyncEngine
 db_session: async_sessionmaker[AsyncSession]
 
+seen_submissions: SeenRecorder
+seen_comments: SeenRecorder
+checkpoints: CheckpointStore
+
+actions: ActionPool
+outbox: Outbox | None
+cooldowns: CooldownStore
+decisions: DecisionLog
+metrics: MetricsServer
+
 config: Configuration
 reddit: Reddit
 
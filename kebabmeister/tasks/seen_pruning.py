@@ -0,0 +1,36 @@
+import asyncio
+import datetime
+
+from loguru import logger
+from sqlalchemy import delete
+
+from kebabmeister import state
+from kebabmeister.configuration import Configuration
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.tasks import BaseTask
+
+
+class SeenPruningTask(BaseTask):
+    def __init__(self, config: Configuration):
+        """
+        Periodically deletes seen IDs older than the configured retention period. Streams never replay items that
+        old, so keeping them only grows the database.
+
+        @param config: Configuration object
+        """
+        super().__init__(config, "seen_pruning")
+
+    async def run(self):
+        retention = datetime.timedelta(days=self.config.database.retention_days)
+        while True:
+            cutoff = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - retention
+            try:
+                async with state.db_session() as session:
+                    async with session.begin():
+                        for model in (SeenSubmission, SeenComment):
+                            result = await session.execute(delete(model).where(model.seen_date < cutoff))
+                            logger.debug(f"Pruned {result.rowcount} rows from {model.__tablename__}")
+            except Exception as e:
+                logger.error(f"Could not prune seen IDs: {e}")
+            await asyncio.sleep(self.config.database.prune_interval)
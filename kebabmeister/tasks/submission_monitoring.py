@@ -1,26 +1,37 @@
 import asyncio
+import functools
 import random
+import time
 from dataclasses import dataclass
 from enum import Enum
+from typing import AsyncIterator, Iterable
 
 import asyncprawcore.exceptions
 import yaml
-from asyncpraw.models import WikiPage
+from asyncpraw.models import ModAction, WikiPage
+from asyncpraw.models.util import BoundedSet
 from asyncpraw.models.reddit.comment import Comment
-from asyncpraw.models.reddit.submission import Submission
 from asyncpraw.models.reddit.redditor import Redditor
+from asyncpraw.models.reddit.submission import Submission
 from asyncpraw.models.reddit.subreddit import Subreddit
 from dacite import from_dict, Config, MissingValueError
 from loguru import logger
-from sqlalchemy.exc import IntegrityError
 
 from kebabmeister import state
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.actions.cooldown import CooldownStore
+from kebabmeister.actions.rate_limit import RateBudget
 from kebabmeister.configuration import Configuration
-from kebabmeister.database.schemas.comment import SeenComment
-from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.database.checkpoints import COMMENTS, SUBMISSIONS
+from kebabmeister.database.seen import SeenRecorder
 from kebabmeister.tasks import BaseTask
-from kebabmeister.utils import is_whitelisted
-from kebabmeister.utils.format_string import get_message
+from kebabmeister.utils.adaptive_poller import AdaptivePoller, PollBudget
+from kebabmeister.utils.errors import InvalidTemplate
+from kebabmeister.utils.flair_cache import FlairCache
+from kebabmeister.utils.format_string import MessageTemplate
+from kebabmeister.utils.metrics import ACTIONS, DUPLICATES, FLAIR_CACHE_SKIPS, ITEM_AGE, ITEMS
+from kebabmeister.utils.reddit_id import to_int
+from kebabmeister.utils.task_manager import StreamHealth
 
 
 class ActionUnflaired(str, Enum):
@@ -45,16 +56,95 @@ class SMPerSubredditConfig:
     unflaired_comment_message: list[str]
 
     whitelist: list[str]
+    dry_run: bool = False
+
+    def __post_init__(self):
+        # Compile the templates once, so invalid placeholders are reported when the configuration is loaded
+        self.reply_template = MessageTemplate(self.reply_message, extra_placeholders=["unflaired_message"])
+        self.unflaired_post_templates = [MessageTemplate(message) for message in self.unflaired_post_message]
+        self.unflaired_comment_templates = [MessageTemplate(message) for message in self.unflaired_comment_message]
+
+    @functools.cached_property
+    def rules(self) -> "SubredditRules":
+        # Compiled on first use, once the bot is logged in
+        return SubredditRules(self, state.me.name)
+
+
+class SubredditRules:
+    def __init__(self, config: SMPerSubredditConfig, bot_name: str):
+        """
+        Decides what to do with an item from the item alone, without any database or API access, so items that
+        need no action can be dropped before any dedup work.
+
+        @param config: Per-subreddit configuration
+        @param bot_name: Name of the bot's account, which is always exempt
+        """
+        self.exempt = frozenset(name.lower() for name in config.whitelist) | {bot_name.lower()}
+        self.unflaired_post_action = config.unflaired_post_action
+        self.unflaired_comment_action = config.unflaired_comment_action
+        self.reply_on_posts = config.reply_on_posts
+
+    def _is_unflaired(self, item: Comment | Submission) -> bool:
+        # Deleted authors cannot flair up or be notified
+        return (item.author_flair_text is None
+                and item.author is not None
+                and item.author.name.lower() not in self.exempt)
+
+    def comment_action(self, comment: Comment) -> ActionUnflaired:
+        """
+        @param comment: Comment
+        @return: Action to take on the comment (`IGNORE` if there is nothing to do)
+        """
+        if self.unflaired_comment_action == ActionUnflaired.IGNORE or not self._is_unflaired(comment):
+            return ActionUnflaired.IGNORE
+        return self.unflaired_comment_action
+
+    def submission_action(self, submission: Submission) -> ActionUnflaired:
+        """
+        @param submission: Submission
+        @return: Action to take on the submission because its author is unflaired (`IGNORE` if there is nothing to
+        do). Welcome replies (`reply_on_posts`) are posted regardless.
+        """
+        if self.unflaired_post_action == ActionUnflaired.IGNORE or not self._is_unflaired(submission):
+            return ActionUnflaired.IGNORE
+        return self.unflaired_post_action
+
+
+@functools.lru_cache(maxsize=128)
+def parse_config(config_raw: str) -> SMPerSubredditConfig:
+    """
+    Parses a per-subreddit configuration. Results are cached by content, so subreddits sharing the same
+    configuration only parse it once.
+
+    @param config_raw: YAML configuration
+    @return: Parsed configuration
+    """
+    return from_dict(data_class=SMPerSubredditConfig, data=yaml.safe_load(config_raw), config=Config(
+        type_hooks={
+            ActionUnflaired: lambda str_action: ActionUnflaired[str_action.upper()],
+        }
+    ))
 
 
 class SubmissionMonitoringTask(BaseTask):
     PER_SUBREDDIT_CONFIG: dict[str, SMPerSubredditConfig] = {}
     PER_SUBREDDIT_CONFIG_RAW: dict[str, str] = {}
+    PER_SUBREDDIT_CONFIG_REVISION: dict[str, str | None] = {}
     barriers: dict[str, asyncio.Event] = {}
+    subreddits: dict[str, Subreddit] = {}
     DEFAULT_CONFIG: SMPerSubredditConfig
 
     def __init__(self, config: Configuration):
         super().__init__(config, "submission_monitoring")
+        self.poll_budget = PollBudget(config.monitoring.poll_requests_per_minute)
+        self.flairs = FlairCache(config.monitoring.flair_cache_ttl, config.monitoring.flair_cache_size)
+        # Seen IDs and notification cooldowns of dry-run decisions, kept apart so they do not hold back real actions
+        # once dry-run mode is switched off
+        self.dry_run_seen = BoundedSet(config.database.index_size)
+        self.dry_run_cooldowns = CooldownStore(config.notifications)
+        # Lowercase names of the subreddits monitored by this worker, mapped to their IDs
+        self.owned: dict[str, str] = {}
+        self.combined_chunks = 0
         self.DEFAULT_CONFIG = SMPerSubredditConfig(
             reply_on_posts=False,
             reply_message="Welcome!\n\n{unflaired_message}",
@@ -69,204 +159,673 @@ class SubmissionMonitoringTask(BaseTask):
         )
 
     async def run(self):
-        subroutines = []
-        # Spawn tasks for all subreddits
-        for subreddit_name in self.config.monitored_subreddits:
-            subreddit: Subreddit = await state.reddit.subreddit(subreddit_name)
-            await subreddit.load()
-
-            self.barriers[subreddit.id] = asyncio.Event()
-            subroutines.append(asyncio.create_task(self._monitor_subreddit_submissions(subreddit),
-                                                   name=f"submissions-{subreddit.display_name}"))
-            subroutines.append(asyncio.create_task(self._monitor_subreddit_comments(subreddit),
-                                                   name=f"comments-{subreddit.display_name}"))
-            subroutines.append(asyncio.create_task(self._monitor_config_page(subreddit),
-                                                   name=f"config-{subreddit.display_name}"))
-            # Graceful startup
-            await asyncio.sleep(3)
-
+        manager = state.task_manager
+        owned = await state.shards.owned(self.config.monitored_subreddits)
+        logger.info(f"Monitoring {len(owned)} of {len(self.config.monitored_subreddits)} subreddits")
+        # Spawn supervised streams for all subreddits, so a failing stream is restarted without affecting the others
+        failed = await self._load_subreddits([subreddit_name for subreddit_name in self.config.monitored_subreddits
+                                              if subreddit_name.lower() in owned
+                                              and subreddit_name.lower() not in self.owned])
+
+        if self.config.monitoring.combined_streams:
+            await self._restart_combined_streams()
+        state.startup.mark(f"{len(self.owned)} subreddits")
+        state.startup.report()
+        await self._replay_outbox(self.owned.keys())
+
+        subroutines = [manager.supervise("config", lambda health: self._monitor_config_pages())]
+        if self.flairs.enabled and self.config.monitoring.flair_log_interval > 0:
+            subroutines.append(manager.supervise("flair-log", lambda health: self._monitor_flair_log(health)))
+        if state.shards.dynamic:
+            # Subreddits that failed to load are retried with every lease renewal
+            subroutines.append(manager.supervise("shards", lambda health: self._monitor_assignment()))
+        elif failed:
+            subroutines.append(manager.supervise("subreddit-retry", lambda health: self._retry_subreddits(failed)))
         await asyncio.gather(*subroutines)
 
-    async def _monitor_config_page(self, subreddit: Subreddit):
-        logger.info(f"Monitoring config page for subreddit {subreddit.display_name}")
+    async def _load_subreddits(self, subreddit_names: list[str]) -> list[str]:
+        """
+        Loads subreddits and their configuration concurrently, and starts monitoring them. Loading pauses while the
+        rate limit budget is low.
+
+        @param subreddit_names: Names of the subreddits, as configured
+        @return: Names of the subreddits that could not be loaded
+        """
+        budget = RateBudget(state.reddit)
+        semaphore = asyncio.Semaphore(self.config.monitoring.startup_concurrency)
+
+        async def load(subreddit_name: str) -> bool:
+            async with semaphore:
+                remaining = budget.remaining()
+                if remaining is not None and remaining < self.config.actions.shed_below:
+                    # Leave the rest of the window to the streams and actions of the subreddits loaded so far
+                    delay = budget.seconds_to_reset()
+                    logger.info(f"Rate limit budget is low ({remaining:.0f} requests left), loading the next "
+                                f"subreddits in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                try:
+                    await self._add_subreddit(subreddit_name)
+                    return True
+                except Exception as e:
+                    logger.error(f"Could not load subreddit {subreddit_name}: {e}")
+                    return False
+
+        loaded = await asyncio.gather(*(load(subreddit_name) for subreddit_name in subreddit_names))
+        return [subreddit_name for subreddit_name, ok in zip(subreddit_names, loaded) if not ok]
+
+    async def _retry_subreddits(self, subreddit_names: list[str]):
+        """
+        Retries loading the subreddits that failed to load at startup, with exponential backoff, while the others are
+        already being monitored.
+
+        @param subreddit_names: Names of the subreddits, as configured
+        """
+        delay = self.config.monitoring.restart_backoff
+        pending = [subreddit_name for subreddit_name in subreddit_names if subreddit_name.lower() not in self.owned]
+        while pending:
+            logger.warning(f"Retrying {len(pending)} subreddits in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.config.monitoring.restart_backoff_max)
+            failed = await self._load_subreddits(pending)
+            loaded = [subreddit_name.lower() for subreddit_name in pending if subreddit_name not in failed]
+            pending = failed
+            if loaded:
+                if self.config.monitoring.combined_streams:
+                    await self._restart_combined_streams()
+                await self._replay_outbox(loaded)
+        logger.info("All subreddits loaded")
+        # Returning would make the supervisor start this over
+        await asyncio.Event().wait()
+
+    async def _add_subreddit(self, subreddit_name: str, takeover: bool = False):
+        """
+        Starts monitoring a subreddit.
+
+        @param subreddit_name: Name of the subreddit, as configured
+        @param takeover: Whether the subreddit was taken over from another worker at runtime
+        """
+        subreddit: Subreddit = await state.reddit.subreddit(subreddit_name)
+        await subreddit.load()
+        # With leases, the previous owner may have kept going after this worker loaded its state at startup
+        if takeover or state.shards.dynamic:
+            # Resume from where the previous owner left off
+            await state.checkpoints.load(subreddit.id)
+            await state.cooldowns.load(subreddit.id)
+            state.seen_submissions.take_over(subreddit.id)
+            state.seen_comments.take_over(subreddit.id)
+
+        self.owned[subreddit_name.lower()] = subreddit.id
+        self.subreddits[subreddit.id] = subreddit
+        self.barriers.setdefault(subreddit.id, asyncio.Event())
+        await self._refresh_config(subreddit)
+        if not self.config.monitoring.combined_streams:
+            state.task_manager.supervise(
+                f"submissions-{subreddit.display_name}",
+                lambda health, subreddit=subreddit: self._monitor_subreddit_submissions(subreddit, health))
+            state.task_manager.supervise(
+                f"comments-{subreddit.display_name}",
+                lambda health, subreddit=subreddit: self._monitor_subreddit_comments(subreddit, health))
+
+    async def _remove_subreddit(self, subreddit_name: str):
+        """
+        Stops monitoring a subreddit.
+
+        @param subreddit_name: Lowercase name of the subreddit, as configured
+        """
+        subreddit = self.subreddits.pop(self.owned.pop(subreddit_name))
+        if not self.config.monitoring.combined_streams:
+            await state.task_manager.cancel(f"submissions-{subreddit.display_name}")
+            await state.task_manager.cancel(f"comments-{subreddit.display_name}")
+        self.barriers.pop(subreddit.id, None)
+        self.PER_SUBREDDIT_CONFIG.pop(subreddit.id, None)
+        self.PER_SUBREDDIT_CONFIG_RAW.pop(subreddit.id, None)
+        self.PER_SUBREDDIT_CONFIG_REVISION.pop(subreddit.id, None)
+
+    async def _restart_combined_streams(self):
+        """
+        (Re)starts the combined streams, so they cover exactly the monitored subreddits.
+        """
+        manager = state.task_manager
+        for i in range(self.combined_chunks):
+            await manager.cancel(f"submissions-combined-{i}")
+            await manager.cancel(f"comments-combined-{i}")
+
+        # Poll one combined listing (sub1+sub2+...) per chunk of subreddits instead of one per subreddit
+        subreddits = list(self.subreddits.values())
+        chunk_size = self.config.monitoring.combined_chunk_size
+        self.combined_chunks = 0
+        for i in range(0, len(subreddits), chunk_size):
+            combined: Subreddit = await state.reddit.subreddit(
+                "+".join(subreddit.display_name for subreddit in subreddits[i:i + chunk_size]))
+            manager.supervise(
+                f"submissions-combined-{i // chunk_size}",
+                lambda health, combined=combined: self._monitor_combined_submissions(combined, health))
+            manager.supervise(
+                f"comments-combined-{i // chunk_size}",
+                lambda health, combined=combined: self._monitor_combined_comments(combined, health))
+            self.combined_chunks += 1
+
+    async def _monitor_assignment(self):
+        """
+        Follows the subreddit assignment: stops monitoring the subreddits that moved to another worker and takes
+        over the ones that are assigned to this worker.
+        """
+        renewed = time.monotonic()
         while True:
+            await asyncio.sleep(self.config.sharding.renew_interval)
             try:
-                # Get configuration string
-                config_page: WikiPage = await subreddit.wiki.get_page("kebabmeister")
-                config_raw: str = config_page.content_md
-
-                # Check if the raw string has changed since the last check
-                if config_raw != self.PER_SUBREDDIT_CONFIG_RAW.get(subreddit.id, ""):
-                    self.PER_SUBREDDIT_CONFIG_RAW[subreddit.id] = config_raw
-                    # Parse the configuration
-                    config = from_dict(
-                        data_class=SMPerSubredditConfig, data=yaml.safe_load(config_page.content_md), config=Config(
-                            type_hooks={
-                                ActionUnflaired: lambda str_action: ActionUnflaired[str_action.upper()],
-                            }
-                        ))
-                    # Check if the parsed configuration has changed since the last successful parse
-                    if config != self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG):
-                        logger.debug(f"Config for subreddit {subreddit.display_name} changed")
-                        # Signal to all tasks that the configuration has been initialized
-                        self.PER_SUBREDDIT_CONFIG[subreddit.id] = config
-                        logger.trace(f"Config for subreddit {subreddit.display_name} is now {config}")
-
-                        self.barriers[subreddit.id].set()
-
-            except asyncprawcore.exceptions.Forbidden:
-                # If we cannot access the config page, log a warning and continue
-                logger.warning(f"Could not access config page for subreddit {subreddit.display_name} (403)")
-            except MissingValueError as e:
-                # If the configuration is invalid, log an error and send a message to the subreddit owner
-                logger.warning(f"Could not parse config for subreddit {subreddit.display_name} ({e})")
-                # await self.try_message(subreddit, "Invalid configuration", f"Your configuration is invalid: {e}")
+                owned = await state.shards.owned(self.config.monitored_subreddits)
+                renewed = time.monotonic()
             except Exception as e:
-                logger.exception(f"Could not parse config for subreddit {subreddit.display_name}", e)
-            # Sleep until the next check
+                logger.error(f"Could not renew subreddit leases: {e}")
+                if time.monotonic() - renewed < self.config.sharding.lease_ttl:
+                    continue
+                # Our leases have expired, so other workers may already be monitoring our subreddits
+                owned = set()
+
+            lost = self.owned.keys() - owned
+            gained = owned - self.owned.keys()
+            if not lost and not gained:
+                continue
+            logger.info(f"Subreddit assignment changed: {len(gained)} taken over, {len(lost)} handed over")
+
+            lost_ids = {self.owned[subreddit_name] for subreddit_name in lost}
+            for subreddit_name in lost:
+                await self._remove_subreddit(subreddit_name)
+            if lost:
+                # Let the next owner resume from where this worker stopped, including the actions it did not finish
+                # (the held ones are committed to the outbox first)
+                await state.seen_submissions.flush()
+                await state.seen_comments.flush()
+                await state.actions.release(lost_ids, self.config.actions.drain_timeout)
+                # Writes out the actions finished meanwhile
+                await state.seen_submissions.flush()
+                await state.seen_comments.flush()
+                await state.checkpoints.flush()
+                await state.cooldowns.flush()
+                await state.shards.release(lost)
+            for subreddit_name in gained:
+                try:
+                    await self._add_subreddit(subreddit_name, takeover=True)
+                except Exception as e:
+                    logger.error(f"Could not take over subreddit {subreddit_name}: {e}")
+            if self.config.monitoring.combined_streams:
+                await self._restart_combined_streams()
+            # Finish what the previous owner could not
+            await self._replay_outbox(gained & self.owned.keys())
+
+    async def _replay_outbox(self, subreddit_names: Iterable[str]):
+        """
+        Queues the actions that were planned in subreddits before the last shutdown (or by their previous owner),
+        but never finished.
+
+        @param subreddit_names: Lowercase names of the monitored subreddits
+        """
+        if state.outbox is None:
+            return
+        if self.config.dry_run.enabled:
+            logger.info("Dry run: not replaying unfinished actions from the outbox")
+            return
+        try:
+            entries = await state.outbox.unfinished(subreddit_names)
+        except Exception as e:
+            logger.error(f"Could not load unfinished actions from the outbox: {e}")
+            return
+        if entries:
+            logger.info(f"Replaying {len(entries)} unfinished actions from the outbox")
+        for entry in entries:
+            subreddit = self.subreddits[self.owned[entry.subreddit]]
+            action = await state.outbox.to_action(entry, state.reddit, subreddit)
+            ACTIONS.labels(action.kind.value, "replayed").inc()
+            await state.actions.submit(action)
+
+    async def _monitor_config_pages(self):
+        logger.info(f"Monitoring config pages for {len(self.subreddits)} subreddits")
+        while True:
+            # Sleep until the next check (the initial configuration is loaded at startup)
             await asyncio.sleep(self.config.subreddit_config.update_interval)
+            for subreddit in list(self.subreddits.values()):
+                await self._refresh_config(subreddit)
+
+    async def _monitor_flair_log(self, health: StreamHealth):
+        """
+        Polls the moderation log of the monitored subreddits for flair changes, and updates the flair cache with the
+        new flair of the affected users.
+        """
+        started = time.time()
+        seen = BoundedSet(1000)
+        chunk_size = self.config.monitoring.combined_chunk_size
+        while True:
+            subreddits = list(self.subreddits.values())
+            for i in range(0, len(subreddits), chunk_size):
+                combined: Subreddit = await state.reddit.subreddit(
+                    "+".join(subreddit.display_name for subreddit in subreddits[i:i + chunk_size]))
+                try:
+                    # Newest entries first
+                    entries = [entry async for entry in combined.mod.log(action="editflair", limit=100)]
+                except asyncprawcore.exceptions.Forbidden:
+                    logger.warning(f"Could not read the moderation log of subreddits {combined.display_name} (403)")
+                    continue
+                for entry in reversed(entries):  # type: ModAction
+                    if entry.id in seen or entry.created_utc < started:
+                        continue
+                    seen.add(entry.id)
+                    health.record(entry.created_utc)
+                    await self._refresh_flair(entry)
+            await asyncio.sleep(self.config.monitoring.flair_log_interval)
+
+    async def _refresh_flair(self, entry: ModAction):
+        """
+        Looks up the current flair of the user a flair change in the moderation log is about.
+
+        @param entry: Moderation log entry
+        """
+        subreddit = self.subreddits.get(entry.sr_id36)
+        if subreddit is None or not entry.target_author:
+            return
+        # Post flair edits are logged as well, but do not change the author's flair
+        if (getattr(entry, "target_fullname", None) or "").startswith("t3_"):
+            return
+        flair_text = None
+        try:
+            async for flair in subreddit.flair(redditor=entry.target_author):
+                flair_text = flair["flair_text"]
+        except Exception as e:
+            logger.warning(f"Could not get the flair of {entry.target_author} in subreddit "
+                           f"{subreddit.display_name}: {e}")
+            return
+        self.flairs.update(subreddit.id, entry.target_author, flair_text)
+        logger.debug(f"Flair of {entry.target_author} in subreddit {subreddit.display_name} is now {flair_text!r}")
+
+    def _check_flair(self, subreddit: Subreddit, item: Comment | Submission, action: ActionUnflaired,
+                     stream: str) -> ActionUnflaired:
+        """
+        Keeps the flair cache up to date with the flair shown on an item, and cancels the unflaired action if the
+        author is known to have flaired up after the item was made.
+
+        @param subreddit: Subreddit
+        @param item: Comment or submission
+        @param action: Action decided from the item alone
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @return: Action to take
+        """
+        if not self.flairs.enabled or item.author is None:
+            return action
+        if item.author_flair_text is None and action != ActionUnflaired.IGNORE:
+            if self.flairs.get(subreddit.id, item.author.name, since=item.created_utc) is not None:
+                FLAIR_CACHE_SKIPS.labels(stream).inc()
+                logger.debug(f"{item.author.name} has flaired up in subreddit {subreddit.display_name} since "
+                             f"{item.id}")
+                return ActionUnflaired.IGNORE
+        # A missing flair is recorded as well, so an older flair does not cancel actions on newer items
+        self.flairs.update(subreddit.id, item.author.name, item.author_flair_text, item.created_utc)
+        return action
+
+    async def _refresh_config(self, subreddit: Subreddit):
+        try:
+            config_page: WikiPage = await subreddit.wiki.get_page(self.config.subreddit_config.page_name,
+                                                                  fetch=False)
+            # Only download the page if a new revision has been made since the last check
+            revision_id = await self._get_latest_revision(config_page)
+            if revision_id is not None and revision_id == self.PER_SUBREDDIT_CONFIG_REVISION.get(subreddit.id):
+                return
+
+            # Get configuration string
+            await config_page.load()
+            config_raw: str = config_page.content_md
+            self.PER_SUBREDDIT_CONFIG_REVISION[subreddit.id] = getattr(config_page, "revision_id", None)
+
+            # Check if the raw string has changed since the last check
+            if config_raw != self.PER_SUBREDDIT_CONFIG_RAW.get(subreddit.id, ""):
+                self.PER_SUBREDDIT_CONFIG_RAW[subreddit.id] = config_raw
+                config = parse_config(config_raw)
+                # Check if the parsed configuration has changed since the last successful parse
+                if config != self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG):
+                    logger.debug(f"Config for subreddit {subreddit.display_name} changed")
+                    self.PER_SUBREDDIT_CONFIG[subreddit.id] = config
+                    logger.trace(f"Config for subreddit {subreddit.display_name} is now {config}")
+
+                # Signal to all tasks that the configuration has been initialized
+                self.barriers[subreddit.id].set()
+
+        except asyncprawcore.exceptions.Forbidden:
+            # If we cannot access the config page, log a warning and continue
+            logger.warning(f"Could not access config page for subreddit {subreddit.display_name} (403)")
+        except (MissingValueError, InvalidTemplate) as e:
+            # If the configuration is invalid, log an error and send a message to the subreddit owner
+            logger.warning(f"Could not parse config for subreddit {subreddit.display_name} ({e})")
+            # await self.try_message(subreddit, "Invalid configuration", f"Your configuration is invalid: {e}")
+        except Exception as e:
+            logger.exception(f"Could not parse config for subreddit {subreddit.display_name}", e)
+
+    @staticmethod
+    async def _get_latest_revision(page: WikiPage) -> str | None:
+        """
+        Gets the ID of the newest revision of a wiki page, without downloading its content.
+
+        @param page: Wiki page
+        @return: Revision ID, or None if the revision history cannot be read
+        """
+        try:
+            async for revision in page.revisions(limit=1):
+                return revision["id"]
+        except Exception as e:
+            logger.trace(f"Could not get revisions of wiki page {page.name}: {e}")
+        return None
 
-    async def _monitor_subreddit_comments(self, subreddit: Subreddit):
+    async def _monitor_subreddit_comments(self, subreddit: Subreddit, health: StreamHealth):
         # Wait until the configuration has been initialized
         await self.barriers[subreddit.id].wait()
 
+        await self._catch_up(subreddit, COMMENTS)
         logger.info(f"Monitoring comments in subreddit {subreddit.display_name}")
 
-        async for comment in subreddit.stream.comments():  # type: Comment
-            try:
-                await SubmissionMonitoringTask._add_seen_comment(comment.id)
-                logger.debug(f"New comment: {comment.id}")
-            except IntegrityError:
-                # If the comment is already in the database, ignore it
-                continue
-            except Exception as e:
-                logger.exception(f"Could not add comment {comment.id} to database", e)
-                continue
-
-            # Get the configuration for the current subreddit
-            subreddit_cfg = self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)
-            if is_whitelisted(comment.author, subreddit_cfg.whitelist):
-                continue
+        async for comment in self._stream(subreddit, COMMENTS):  # type: Comment
+            health.record(comment.created_utc)
+            await self._process_comment(subreddit, comment)
 
-            if comment.author_flair_text is None and subreddit_cfg.unflaired_comment_action != ActionUnflaired.IGNORE:
-                # Check if the submission needs to be deleted
-                if subreddit_cfg.unflaired_comment_action == ActionUnflaired.REMOVE:
-                    try:
-                        await comment.mod.remove(mod_note="Unflaired comment")
-                        logger.debug(f"Removed unflaired comment in subreddit {subreddit.display_name}")
-                    except Exception as e:
-                        logger.warning(f"Could not remove unflaired comment in subreddit {subreddit.display_name}: {e}")
-                    continue
-                # Check if we need to send a message to the author
-                elif subreddit_cfg.unflaired_comment_action == ActionUnflaired.MESSAGE:
-                    await self.try_message(comment.author, subreddit_cfg.unflaired_comment_subject,
-                                           get_message(random.choice(subreddit_cfg.unflaired_comment_message),
-                                                       comment=comment,
-                                                       author=comment.author,
-                                                       subreddit=subreddit))
-                # Check if we need to reply to the submission
-                elif subreddit_cfg.unflaired_post_action == ActionUnflaired.REPLY:
-                    await self.try_reply(comment, get_message(random.choice(subreddit_cfg.unflaired_comment_message),
-                                                              comment=comment,
-                                                              author=comment.author,
-                                                              subreddit=subreddit))
-                else:
-                    logger.warning(f"Unknown action {subreddit_cfg.unflaired_comment_action} for unflaired comments")
-
-    async def _monitor_subreddit_submissions(self, subreddit: Subreddit):
+    async def _monitor_subreddit_submissions(self, subreddit: Subreddit, health: StreamHealth):
         # Wait until the configuration has been initialized
         await self.barriers[subreddit.id].wait()
 
+        await self._catch_up(subreddit, SUBMISSIONS)
         logger.info(f"Monitoring submissions in subreddit {subreddit.display_name}")
 
-        async for submission in subreddit.stream.submissions():  # type: Submission
-            try:
-                await SubmissionMonitoringTask._add_seen_submission(submission.id)
-                logger.debug(f"New submission: {submission.title} ({submission.id})")
-            except IntegrityError:
-                # If the submission is already in the database, ignore it
-                continue
-            except Exception as e:
-                logger.exception(f"Could not add submission {submission.id} to database", e)
-                continue
-
-            # Get the configuration for the current subreddit
-            subreddit_cfg = self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)
-
-            unflaired_reply_text = ""  # This is a placeholder for the message that will be included in the reply
-            # Check if the submission is flaired
-            if (submission.author_flair_text is None
-                    and not is_whitelisted(submission.author, subreddit_cfg.whitelist)
-                    and subreddit_cfg.unflaired_post_action != ActionUnflaired.IGNORE):
-
-                # Check if the submission needs to be deleted
-                if subreddit_cfg.unflaired_post_action == ActionUnflaired.REMOVE:
-                    try:
-                        await submission.mod.remove(mod_note="Unflaired post")
-                        logger.debug(f"Removed unflaired post in subreddit {subreddit.display_name}")
-                    except Exception as e:
-                        logger.warning(f"Could not remove unflaired post in subreddit {subreddit.display_name}: {e}")
-                    continue
-                # Check if we need to send a message to the author
-                elif subreddit_cfg.unflaired_post_action == ActionUnflaired.MESSAGE:
-                    await self.try_message(submission.author, subreddit_cfg.unflaired_post_subject,
-                                           get_message(random.choice(subreddit_cfg.unflaired_post_message),
-                                                       submission=submission,
-                                                       author=submission.author,
-                                                       subreddit=subreddit))
-                # Check if we need to reply to the submission
-                elif subreddit_cfg.unflaired_post_action == ActionUnflaired.REPLY:
-                    # If general replies are enabled, the flair-up message will be included with that message
-                    unflaired_reply_text = get_message(random.choice(subreddit_cfg.unflaired_post_message),
-                                                       submission=submission,
-                                                       author=submission.author,
-                                                       subreddit=subreddit)
-                    if not subreddit_cfg.reply_on_posts:
-                        await self.try_reply(submission, unflaired_reply_text)
-                else:
-                    logger.warning(f"Unknown action {subreddit_cfg.unflaired_post_action} for unflaired posts")
-
-            # Check if we need to reply to the submission
-            if subreddit_cfg.reply_on_posts:
-                await self.try_reply(submission, get_message(subreddit_cfg.reply_message,
-                                                             submission=submission,
-                                                             author=submission.author,
-                                                             subreddit=subreddit,
-                                                             unflaired_message=unflaired_reply_text),
-                                     sticky=subreddit_cfg.reply_is_pinned)
-
-    @staticmethod
-    async def _add_seen_submission(submission_id: str):
-        async with state.db_session() as session:
-            async with session.begin():
-                session.add(SeenSubmission(reddit_id=submission_id))
-
-    @staticmethod
-    async def _add_seen_comment(comment_id: str):
-        async with state.db_session() as session:
-            async with session.begin():
-                session.add(SeenComment(reddit_id=comment_id))
+        async for submission in self._stream(subreddit, SUBMISSIONS):  # type: Submission
+            health.record(submission.created_utc)
+            await self._process_submission(subreddit, submission)
+
+    async def _monitor_combined_comments(self, combined: Subreddit, health: StreamHealth):
+        for subreddit in self._get_combined_subreddits(combined):
+            await self._catch_up(subreddit, COMMENTS)
+        logger.info(f"Monitoring comments in subreddits {combined.display_name}")
+
+        async for comment in self._stream(combined, COMMENTS):  # type: Comment
+            health.record(comment.created_utc)
+            subreddit = self._get_configured_subreddit(comment)
+            if subreddit is not None:
+                await self._process_comment(subreddit, comment)
+
+    async def _monitor_combined_submissions(self, combined: Subreddit, health: StreamHealth):
+        for subreddit in self._get_combined_subreddits(combined):
+            await self._catch_up(subreddit, SUBMISSIONS)
+        logger.info(f"Monitoring submissions in subreddits {combined.display_name}")
+
+        async for submission in self._stream(combined, SUBMISSIONS):  # type: Submission
+            health.record(submission.created_utc)
+            subreddit = self._get_configured_subreddit(submission)
+            if subreddit is not None:
+                await self._process_submission(subreddit, submission)
+
+    def _stream(self, subreddit: Subreddit, stream: str) -> AsyncIterator[Comment | Submission]:
+        """
+        Streams new items of a subreddit (or combined subreddit), oldest first.
+
+        @param subreddit: Subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        @return: Endless iterator of new items
+        """
+        if not self.config.monitoring.adaptive_polling:
+            return subreddit.stream.comments() if stream == COMMENTS else subreddit.stream.submissions()
+        return AdaptivePoller(f"{stream}-{subreddit.display_name}",
+                              subreddit.comments if stream == COMMENTS else subreddit.new,
+                              self.poll_budget,
+                              self.config.monitoring.poll_min_interval,
+                              self.config.monitoring.poll_max_interval).stream()
+
+    def _get_configured_subreddit(self, item: Comment | Submission) -> Subreddit | None:
+        """
+        Finds the monitored subreddit an item from a combined stream belongs to.
+
+        @param item: Comment or submission
+        @return: Subreddit, or None if it is not monitored or its configuration has not been initialized yet
+        """
+        subreddit_id = item.subreddit_id.removeprefix("t5_")
+        if subreddit_id not in self.barriers or not self.barriers[subreddit_id].is_set():
+            return None
+        return self.subreddits[subreddit_id]
+
+    def _get_combined_subreddits(self, combined: Subreddit) -> list[Subreddit]:
+        """
+        @param combined: Combined subreddit (sub1+sub2+...)
+        @return: Monitored subreddits with an initialized configuration that are part of the combined subreddit
+        """
+        names = {name.lower() for name in combined.display_name.split("+")}
+        return [subreddit for subreddit_id, subreddit in self.subreddits.items()
+                if subreddit.display_name.lower() in names and self.barriers[subreddit_id].is_set()]
+
+    async def _catch_up(self, subreddit: Subreddit, stream: str):
+        """
+        Processes the items made since the last checkpoint straight from the subreddit listing, before the stream
+        takes over.
+
+        @param subreddit: Subreddit
+        @param stream: Stream name (`COMMENTS` or `SUBMISSIONS`)
+        """
+        mark = state.checkpoints.resume_mark(subreddit.id, stream)
+        if not self.config.monitoring.catch_up or mark is None:
+            return
+
+        listing = subreddit.comments if stream == COMMENTS else subreddit.new
+        process = self._process_comment if stream == COMMENTS else self._process_submission
+        limit = self.config.monitoring.catch_up_limit
+
+        # Listings are sorted from newest to oldest
+        backlog = []
+        try:
+            async for item in listing(limit=limit):
+                if to_int(item.id) <= mark:
+                    break
+                backlog.append(item)
+            else:
+                if len(backlog) >= limit:
+                    logger.warning(f"More than {limit} {stream} in subreddit {subreddit.display_name} since the last "
+                                   f"checkpoint, older ones are not caught up on")
+        except Exception as e:
+            logger.warning(f"Could not catch up on {stream} in subreddit {subreddit.display_name}: {e}")
+
+        logger.info(f"Catching up on {len(backlog)} {stream} in subreddit {subreddit.display_name}")
+        for item in reversed(backlog):
+            await process(subreddit, item)
+        if backlog:
+            # The stream replays the newest items, which have just been handled
+            state.checkpoints.skip_through(subreddit.id, stream, backlog[0].id)
+
+    async def _process_comment(self, subreddit: Subreddit, comment: Comment):
+        ITEMS.labels(COMMENTS).inc()
+        # Skip the backlog that was already handled before the restart
+        if state.checkpoints.is_handled(subreddit.id, COMMENTS, comment.id):
+            return
+        await self._handle_comment(subreddit, comment)
+        # Items seen in a dry run are caught up on once it is switched off
+        if not self._is_dry_run(self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)):
+            state.checkpoints.advance(subreddit.id, COMMENTS, comment.id, comment.created_utc)
+
+    async def _process_submission(self, subreddit: Subreddit, submission: Submission):
+        ITEMS.labels(SUBMISSIONS).inc()
+        # Skip the backlog that was already handled before the restart
+        if state.checkpoints.is_handled(subreddit.id, SUBMISSIONS, submission.id):
+            return
+        await self._handle_submission(subreddit, submission)
+        # Items seen in a dry run are caught up on once it is switched off
+        if not self._is_dry_run(self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)):
+            state.checkpoints.advance(subreddit.id, SUBMISSIONS, submission.id, submission.created_utc)
+
+    async def _handle_comment(self, subreddit: Subreddit, comment: Comment):
+        # Get the configuration for the current subreddit
+        subreddit_cfg = self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)
+        ITEM_AGE.labels(COMMENTS).observe(time.time() - comment.created_utc)
+        # Decide before any dedup work, so comments that need no action never reach the database
+        action = self._check_flair(subreddit, comment, subreddit_cfg.rules.comment_action(comment), COMMENTS)
+        if action == ActionUnflaired.IGNORE:
+            return
 
-    @staticmethod
-    async def try_mod_message(subreddit: Subreddit, subject: str, message: str):
         try:
-            await subreddit.message(subject=subject, message=message)
+            if not await self._claim(subreddit, subreddit_cfg, comment, state.seen_comments):
+                # If the comment has already been seen, ignore it
+                DUPLICATES.labels(COMMENTS).inc()
+                return
+            logger.debug(f"New comment: {comment.id}")
         except Exception as e:
-            logger.error(f"Could not send message to subreddit owner: {e}")
+            logger.exception(f"Could not add comment {comment.id} to database", e)
+            return
+
+        if action == ActionUnflaired.REMOVE or self._may_notify(subreddit_cfg, subreddit, comment.author):
+            # Check if the submission needs to be deleted
+            if action == ActionUnflaired.REMOVE:
+                await self._submit(subreddit_cfg, comment, Action(kind=ActionKind.REMOVE, target=comment,
+                                                                  subreddit=subreddit, mod_note="Unflaired comment"))
+                return
+            # Check if we need to send a message to the author
+            elif action == ActionUnflaired.MESSAGE:
+                await self._submit(subreddit_cfg, comment, Action(kind=ActionKind.MESSAGE, target=comment.author,
+                                                                  subreddit=subreddit,
+                                                                  subject=subreddit_cfg.unflaired_comment_subject,
+                                                                  about=comment,
+                                                                  message=random.choice(
+                                                                      subreddit_cfg.unflaired_comment_templates).render(
+                                                                      comment=comment,
+                                                                      author=comment.author,
+                                                                      subreddit=subreddit)))
+            # Check if we need to reply to the submission
+            elif action == ActionUnflaired.REPLY:
+                await self._submit(subreddit_cfg, comment, Action(kind=ActionKind.REPLY, target=comment,
+                                                                  subreddit=subreddit,
+                                                                  message=random.choice(
+                                                                      subreddit_cfg.unflaired_comment_templates).render(
+                                                                      comment=comment,
+                                                                      author=comment.author,
+                                                                      subreddit=subreddit)))
+            else:
+                logger.warning(f"Unknown action {action} for unflaired comments")
+
+    async def _handle_submission(self, subreddit: Subreddit, submission: Submission):
+        # Get the configuration for the current subreddit
+        subreddit_cfg = self.PER_SUBREDDIT_CONFIG.get(subreddit.id, self.DEFAULT_CONFIG)
+        ITEM_AGE.labels(SUBMISSIONS).observe(time.time() - submission.created_utc)
+        # Decide before any dedup work, so submissions that need no action never reach the database
+        action = self._check_flair(subreddit, submission, subreddit_cfg.rules.submission_action(submission),
+                                   SUBMISSIONS)
+        if action == ActionUnflaired.IGNORE and not subreddit_cfg.reply_on_posts:
+            return
 
-    @staticmethod
-    async def try_message(redditor: Redditor, subject: str, message: str):
         try:
-            await redditor.message(subject=subject, message=message)
+            if not await self._claim(subreddit, subreddit_cfg, submission, state.seen_submissions):
+                # If the submission has already been seen, ignore it
+                DUPLICATES.labels(SUBMISSIONS).inc()
+                return
+            logger.debug(f"New submission: {submission.title} ({submission.id})")
         except Exception as e:
-            logger.error(f"Could not send message to user: {e}")
+            logger.exception(f"Could not add submission {submission.id} to database", e)
+            return
+
+        unflaired_reply_text = ""  # This is a placeholder for the message that will be included in the reply
+        # Check if the author needs to be told to flair up
+        if (action != ActionUnflaired.IGNORE
+                and (action == ActionUnflaired.REMOVE
+                     or self._may_notify(subreddit_cfg, subreddit, submission.author))):
+
+            # Check if the submission needs to be deleted
+            if action == ActionUnflaired.REMOVE:
+                await self._submit(subreddit_cfg, submission, Action(kind=ActionKind.REMOVE, target=submission,
+                                                                     subreddit=subreddit, mod_note="Unflaired post"))
+                return
+            # Check if we need to send a message to the author
+            elif action == ActionUnflaired.MESSAGE:
+                await self._submit(subreddit_cfg, submission, Action(kind=ActionKind.MESSAGE,
+                                                                     target=submission.author,
+                                                                     subreddit=subreddit,
+                                                                     subject=subreddit_cfg.unflaired_post_subject,
+                                                                     about=submission,
+                                                                     message=random.choice(
+                                                                         subreddit_cfg.unflaired_post_templates).render(
+                                                                         submission=submission,
+                                                                         author=submission.author,
+                                                                         subreddit=subreddit)))
+            # Check if we need to reply to the submission
+            elif action == ActionUnflaired.REPLY:
+                # If general replies are enabled, the flair-up message will be included with that message
+                unflaired_reply_text = random.choice(subreddit_cfg.unflaired_post_templates).render(
+                    submission=submission,
+                    author=submission.author,
+                    subreddit=subreddit)
+                if not subreddit_cfg.reply_on_posts:
+                    await self._submit(subreddit_cfg, submission, Action(kind=ActionKind.REPLY, target=submission,
+                                                                         subreddit=subreddit,
+                                                                         message=unflaired_reply_text))
+            else:
+                logger.warning(f"Unknown action {action} for unflaired posts")
+
+        # Check if we need to reply to the submission
+        if subreddit_cfg.reply_on_posts:
+            await self._submit(subreddit_cfg, submission, Action(kind=ActionKind.REPLY, target=submission,
+                                                                 subreddit=subreddit,
+                                                                 message=subreddit_cfg.reply_template.render(
+                                                                     submission=submission,
+                                                                     author=submission.author,
+                                                                     subreddit=subreddit,
+                                                                     unflaired_message=unflaired_reply_text),
+                                                                 sticky=subreddit_cfg.reply_is_pinned,
+                                                                 # The welcome reply is only essential if it
+                                                                 # carries the flair reminder
+                                                                 sheddable=not unflaired_reply_text))
+
+    async def _submit(self, subreddit_cfg: SMPerSubredditConfig, item: Comment | Submission, action: Action):
+        """
+        Queues an action once the item's seen ID is committed, or only logs it if the bot (or the subreddit) is in
+        dry-run mode.
+
+        @param subreddit_cfg: Configuration of the subreddit
+        @param item: Comment or submission the action was decided on
+        @param action: Action to take
+        """
+        if self._is_dry_run(subreddit_cfg):
+            state.decisions.record(action, item)
+            return
+        if state.outbox is not None:
+            state.outbox.record(item, action)
+        recorder = state.seen_comments if item.fullname.startswith("t1_") else state.seen_submissions
+        await recorder.hold(action)
+
+    def _is_dry_run(self, subreddit_cfg: SMPerSubredditConfig) -> bool:
+        return self.config.dry_run.enabled or subreddit_cfg.dry_run
+
+    async def _claim(self, subreddit: Subreddit, subreddit_cfg: SMPerSubredditConfig, item: Comment | Submission,
+                     recorder: SeenRecorder) -> bool:
+        """
+        Claims the ID of an item. In dry-run mode, the claim is only kept in memory.
+
+        @param subreddit: Subreddit of the item
+        @param subreddit_cfg: Configuration of the subreddit
+        @param item: Comment or submission
+        @param recorder: Seen recorder of the item type
+        @return: True if the item has not been seen before
+        """
+        if self._is_dry_run(subreddit_cfg):
+            if item.fullname in self.dry_run_seen:
+                return False
+            self.dry_run_seen.add(item.fullname)
+            return True
+        return await recorder.claim(item.id, item.created_utc, subreddit.id)
+
+    def _may_notify(self, subreddit_cfg: SMPerSubredditConfig, subreddit: Subreddit, author: Redditor | None) -> bool:
+        """
+        Checks the notification cooldown of a user. Starts a new cooldown window if the user may be notified.
+
+        @param subreddit_cfg: Configuration of the subreddit
+        @param subreddit: Subreddit the notification is about
+        @param author: User to notify
+        @return: True if the user may be notified
+        """
+        cooldowns = self.dry_run_cooldowns if self._is_dry_run(subreddit_cfg) else state.cooldowns
+        if author is None or cooldowns.try_acquire(subreddit.id, author.name):
+            return True
+        logger.debug(f"Not notifying {author.name} in subreddit {subreddit.display_name} again (cooldown)")
+        return False
 
     @staticmethod
-    async def try_reply(submission: Submission | Comment, message: str, distinguish: bool = True, sticky: bool = False):
+    async def try_mod_message(subreddit: Subreddit, subject: str, message: str):
         try:
-            comment: Comment = await submission.reply(message)
-            if distinguish or sticky:
-                await comment.mod.distinguish(how="yes" if distinguish else "no", sticky=sticky)
-            logger.debug(f"Replied to {type(submission).__name__} with specified message text")
+            await subreddit.message(subject=subject, message=message)
         except Exception as e:
-            logger.error(f"Could not reply to {type(submission).__name__} {submission.id}: {e}")
+            logger.error(f"Could not send message to subreddit owner: {e}")
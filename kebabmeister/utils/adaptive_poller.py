@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from asyncpraw.models.util import BoundedSet
+from loguru import logger
+
+# Number of items requested per poll (the maximum a listing returns in one request)
+PAGE_SIZE = 100
+# Share of a page that is expected to be new at each poll, which leaves headroom for bursts
+TARGET_FILL = 0.5
+
+
+class PollBudget:
+    def __init__(self, requests_per_minute: float):
+        """
+        Token bucket shared by all pollers, which keeps the combined polling rate within a global budget.
+
+        @param requests_per_minute: Maximum sustained number of polls per minute
+        """
+        self.rate = requests_per_minute / 60
+        self.capacity = max(self.rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits until a poll is allowed by the budget.
+        """
+        # Pollers are served one at a time, in the order they asked
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptivePoller:
+    # Weight of the newest observation in the arrival rate estimate
+    SMOOTHING = 0.3
+
+    def __init__(self,
+                 name: str,
+                 listing: Callable[..., AsyncIterator],
+                 budget: PollBudget,
+                 min_interval: float,
+                 max_interval: float):
+        """
+        Polls a listing (newest items first) and yields new items oldest first, like `subreddit.stream`, but with
+        a polling interval that follows the listing's arrival rate: one poll per half page of expected new items,
+        clamped between `min_interval` and `max_interval`.
+
+        @param name: Name used in log messages
+        @param listing: Listing function, such as `subreddit.comments` or `subreddit.new`
+        @param budget: Global polling budget
+        @param min_interval: Shortest time between two polls, in seconds
+        @param max_interval: Longest time between two polls, in seconds
+        """
+        self.name = name
+        self.listing = listing
+        self.budget = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # Estimated number of new items per second
+        self.rate: Optional[float] = None
+        self.interval = min_interval
+
+    def _update_rate(self, new_items: list, elapsed: Optional[float]):
+        if elapsed is None:
+            # First poll: estimate from how far back the returned page reaches
+            if len(new_items) < 2:
+                self.rate = 0.0
+                return
+            span = new_items[-1].created_utc - new_items[0].created_utc
+            self.rate = (len(new_items) - 1) / span if span > 0 else float(len(new_items))
+            return
+        observed = len(new_items) / elapsed if elapsed > 0 else 0.0
+        self.rate = self.SMOOTHING * observed + (1 - self.SMOOTHING) * self.rate
+
+    def _next_interval(self) -> float:
+        if not self.rate:
+            return self.max_interval
+        return min(max(PAGE_SIZE * TARGET_FILL / self.rate, self.min_interval), self.max_interval)
+
+    async def stream(self) -> AsyncIterator:
+        """
+        @return: Iterator of new items, oldest first. Runs forever.
+        """
+        seen = BoundedSet(PAGE_SIZE * 3)
+        last_poll: Optional[float] = None
+        while True:
+            await self.budget.acquire()
+            now = time.monotonic()
+            items = [item async for item in self.listing(limit=PAGE_SIZE)]
+            new_items = []
+            for item in reversed(items):
+                if item.fullname not in seen:
+                    seen.add(item.fullname)
+                    new_items.append(item)
+
+            self._update_rate(new_items, now - last_poll if last_poll is not None else None)
+            last_poll = now
+            self.interval = self._next_interval()
+            if len(new_items) == len(items) == PAGE_SIZE and len(seen) > PAGE_SIZE:
+                logger.warning(f"{self.name}: a whole page of new items, some may have been missed")
+            logger.trace(f"{self.name}: {len(new_items)} new items, {self.rate:.4f} items/s, "
+                         f"next poll in {self.interval:.1f}s")
+
+            for item in new_items:
+                yield item
+            await asyncio.sleep(self.interval)
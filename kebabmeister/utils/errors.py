@@ -4,3 +4,12 @@ class ConfigKeyNotFound(Exception):
 
     def __str__(self):
         return f"Config key not found: {self.key}"
+
+
+class InvalidTemplate(Exception):
+    def __init__(self, template, reason):
+        self.template = template
+        self.reason = reason
+
+    def __str__(self):
+        return f"Invalid message template ({self.reason}): {self.template}"
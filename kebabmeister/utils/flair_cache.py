@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class FlairCache:
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        Most recently known user flairs, per subreddit, with the time they were observed. The flair shown on a
+        streamed item can lag behind a user flairing up, so a flair observed after the item was made takes precedence
+        over a missing one.
+
+        Entries expire `ttl` seconds after they were observed, and the least recently updated ones are evicted once
+        the cache is full.
+
+        @param ttl: Seconds an entry is trusted for, or 0 to disable the cache
+        @param max_entries: Maximum number of entries
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._flairs: OrderedDict[tuple[str, str], tuple[Optional[str], float]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._flairs)
+
+    def update(self, subreddit_id: str, username: str, flair: Optional[str], observed: Optional[float] = None):
+        """
+        Records the flair of a user. Older observations than the known one are ignored.
+
+        @param subreddit_id: ID of the subreddit
+        @param username: Name of the user
+        @param flair: Flair text, or None (or empty) if the user has no flair
+        @param observed: Time the user was seen with this flair (UNIX timestamp, default: now)
+        """
+        if not self.enabled:
+            return
+        key = (subreddit_id, username.lower())
+        observed = time.time() if observed is None else observed
+        known = self._flairs.get(key)
+        if known is not None and known[1] > observed:
+            return
+        # Removed flairs are kept as well, so they win over older observations
+        self._flairs[key] = (flair or None, observed)
+        self._flairs.move_to_end(key)
+        if len(self._flairs) > self.max_entries:
+            self._flairs.popitem(last=False)
+
+    def get(self, subreddit_id: str, username: str, since: Optional[float] = None) -> Optional[str]:
+        """
+        @param subreddit_id: ID of the subreddit
+        @param username: Name of the user
+        @param since: Only return a flair observed after this time (UNIX timestamp)
+        @return: Flair text of the user, or None if no (recent enough) flair is known
+        """
+        key = (subreddit_id, username.lower())
+        entry = self._flairs.get(key)
+        if entry is None:
+            return None
+        flair, observed = entry
+        if time.time() - observed > self.ttl:
+            del self._flairs[key]
+            return None
+        if since is not None and observed <= since:
+            return None
+        return flair
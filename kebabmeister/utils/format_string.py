@@ -1,23 +1,81 @@
+import string
+from typing import Any, Callable, Iterable, Optional
+
 from asyncpraw.models.reddit.subreddit import Subreddit
 from asyncpraw.models.reddit.comment import Comment
 from asyncpraw.models.reddit.submission import Submission
 from asyncpraw.models.reddit.redditor import Redditor
 
+from kebabmeister.utils.errors import InvalidTemplate
+
+# Getters for all supported placeholders, called with (author, submission, subreddit, comment)
+PLACEHOLDERS: dict[str, Callable[[Optional[Redditor], Optional[Submission], Optional[Subreddit], Optional[Comment]],
+                                 Any]] = {
+    "author": lambda author, submission, subreddit, comment: author.name if author else None,
+    "author_flair": lambda author, submission, subreddit, comment:
+        submission.author_flair_text if submission else None,
+    "submission_id": lambda author, submission, subreddit, comment: submission.id if submission else None,
+    "submission_title": lambda author, submission, subreddit, comment: submission.title if submission else None,
+    "subreddit": lambda author, submission, subreddit, comment: subreddit.display_name if subreddit else None,
+    "subreddit_id": lambda author, submission, subreddit, comment: subreddit.id if subreddit else None,
+    "comment_id": lambda author, submission, subreddit, comment: comment.id if comment else None,
+    "comment_body": lambda author, submission, subreddit, comment: comment.body if comment else None,
+}
+
+
+class MessageTemplate:
+    def __init__(self, template: str, extra_placeholders: Iterable[str] = ()):
+        """
+        Message template, parsed once. Rendering only reads the attributes the template references.
+
+        @param template: Template string, using the `str.format` syntax
+        @param extra_placeholders: Names of additional placeholders that are passed to `render` as keyword arguments
+        @raise InvalidTemplate: If the template is malformed or references an unknown placeholder
+        """
+        self.template = template
+        allowed = PLACEHOLDERS.keys() | set(extra_placeholders)
+
+        # List of (literal text, placeholder, conversion, format spec) tuples
+        self._parts: list[tuple[str, Optional[str], Optional[str], str]] = []
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as e:
+            raise InvalidTemplate(template, str(e))
+        for literal, placeholder, format_spec, conversion in parsed:
+            if placeholder is not None:
+                if placeholder not in allowed:
+                    raise InvalidTemplate(template, f"unknown placeholder {{{placeholder}}}")
+                if "{" in (format_spec or ""):
+                    raise InvalidTemplate(template, f"nested placeholders are not supported in {{{placeholder}}}")
+            self._parts.append((literal, placeholder, conversion, format_spec or ""))
+
+        self.placeholders = frozenset(part[1] for part in self._parts if part[1] is not None)
+
+    def render(self,
+               author: Redditor = None,
+               submission: Submission = None,
+               subreddit: Subreddit = None,
+               comment: Comment = None,
+               **kwargs) -> str:
+        values = {name: PLACEHOLDERS[name](author, submission, subreddit, comment)
+                  for name in self.placeholders if name in PLACEHOLDERS}
+        values.update(kwargs)
+
+        rendered = []
+        for literal, placeholder, conversion, format_spec in self._parts:
+            rendered.append(literal)
+            if placeholder is None:
+                continue
+            value = values[placeholder]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            rendered.append(format(value, format_spec))
+        return "".join(rendered)
+
+    def __repr__(self) -> str:
+        return f"MessageTemplate({self.template!r})"
 
-def get_message(base_msg: str,
-                author: Redditor = None,
-                submission: Submission = None,
-                subreddit: Subreddit = None,
-                comment: Comment = None,
-                **kwargs) -> str:
-    custom_format = {
-        "author": author.name if author else None,
-        "author_flair": submission.author_flair_text if submission else None,
-        "submission_id": submission.id if submission else None,
-        "submission_title": submission.title if submission else None,
-        "subreddit": subreddit.display_name if subreddit else None,
-        "subreddit_id": subreddit.id if subreddit else None,
-        "comment_id": comment.id if comment else None,
-        "comment_body": comment.body if comment else None,
-    }
-    return base_msg.format(**custom_format, **kwargs)
@@ -0,0 +1,266 @@
+import asyncio
+import bisect
+from typing import Callable, Iterable, Optional
+
+from loguru import logger
+
+from kebabmeister import state
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AGE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        """
+        Collection of metrics that are exposed together.
+        """
+        self.metrics: list[_Metric] = []
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: "_Metric"):
+        self.metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """
+        Adds a function that updates metrics right before they are rendered (for example gauges that mirror
+        the state of the program).
+
+        @param collector: Function without arguments
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        @return: All metrics in the Prometheus text exposition format
+        """
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.debug(f"Metrics collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), registry: Registry = REGISTRY):
+        """
+        @param name: Metric name
+        @param documentation: Help text
+        @param labels: Label names
+        @param registry: Registry the metric is exposed with
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children: dict[tuple[str, ...], object] = {}
+        registry.register(self)
+
+    def _new_value(self):
+        raise NotImplementedError("_new_value() not implemented")
+
+    def labels(self, *values: str):
+        """
+        @param values: Label values, in the order of the label names
+        @return: Value of the metric for these labels
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            child = self._children[values] = self._new_value()
+        return child
+
+    def clear(self):
+        """
+        Forgets the values of all label combinations.
+        """
+        self._children.clear()
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.label_names, values)} {child.value}"
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    TYPE = "gauge"
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        """
+        @param name: Metric name
+        @param documentation: Help text
+        @param labels: Label names
+        @param buckets: Upper bounds of the buckets, in increasing order
+        @param registry: Registry the metric is exposed with
+        """
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labels, registry)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), child.counts):
+                cumulative += count
+                labels = _format_labels((*self.label_names, "le"), (*values, bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, values)
+            yield f"{self.name}_sum{labels} {child.sum}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class MetricsServer:
+    def __init__(self, host: str, port: int, registry: Registry = REGISTRY):
+        """
+        Minimal HTTP server exposing the metrics at `/metrics` for Prometheus to scrape.
+
+        @param host: Address to listen on
+        @param port: Port to listen on
+        @param registry: Metrics to expose
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            # Skip the headers
+            while (await reader.readline()).strip():
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Could not serve metrics: {e}")
+        finally:
+            writer.close()
+
+
+# Metrics of the bot
+ITEMS = Counter("kebabmeister_items_total", "Items received from the streams", ["stream"])
+DUPLICATES = Counter("kebabmeister_duplicate_items_total", "Items that had already been seen", ["stream"])
+ITEM_AGE = Histogram("kebabmeister_item_age_seconds", "Age of new items when the bot decides on them", ["stream"],
+                     buckets=AGE_BUCKETS)
+FLAIR_CACHE_SKIPS = Counter("kebabmeister_flair_cache_skips_total",
+                            "Unflaired items skipped because their author has flaired up since", ["stream"])
+SEEN_LOOKUP = Histogram("kebabmeister_seen_lookup_seconds", "Database lookups of items outside the seen index",
+                        ["table"])
+SEEN_FLUSH = Histogram("kebabmeister_seen_flush_seconds", "Batched inserts of seen IDs", ["table"])
+ACTIONS = Counter("kebabmeister_actions_total", "Moderation actions by kind and outcome", ["kind", "outcome"])
+ACTION_LATENCY = Histogram("kebabmeister_action_seconds", "Duration of successful Reddit API calls of actions",
+                           ["kind"])
+ACTION_QUEUE = Gauge("kebabmeister_action_queue_depth", "Actions waiting for a worker")
+STREAM_LAG = Gauge("kebabmeister_stream_lag_seconds",
+                   "Time between the creation of the last item of a stream and it being received", ["name"])
+STREAM_RESTARTS = Gauge("kebabmeister_stream_restarts", "Restarts of a supervised stream", ["name"])
+
+
+def _collect_state():
+    if hasattr(state, "actions"):
+        ACTION_QUEUE.set(state.actions.depth)
+    if hasattr(state, "task_manager"):
+        # Streams come and go, so only report the current ones
+        STREAM_LAG.clear()
+        STREAM_RESTARTS.clear()
+        for health in list(state.task_manager.health.values()):
+            if health.lag is not None:
+                STREAM_LAG.labels(health.name).set(health.lag)
+            STREAM_RESTARTS.labels(health.name).set(health.restarts)
+
+
+REGISTRY.add_collector(_collect_state)
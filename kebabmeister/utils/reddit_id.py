@@ -0,0 +1,28 @@
+import string
+
+BASE36_DIGITS = string.digits + string.ascii_lowercase
+
+
+def to_int(reddit_id: str) -> int:
+    """
+    Converts a base36 Reddit ID (or fullname, such as `t1_abc123`) to an integer.
+
+    @param reddit_id: Reddit ID or fullname
+    @return: Integer value of the ID
+    """
+    return int(reddit_id.rpartition("_")[2], 36)
+
+
+def to_base36(value: int) -> str:
+    """
+    Converts an integer back to a base36 Reddit ID.
+
+    @param value: Integer value of the ID
+    @return: Reddit ID
+    """
+    digits = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        digits = BASE36_DIGITS[remainder] + digits
+        if value == 0:
+            return digits
@@ -0,0 +1,127 @@
+import hashlib
+import signal
+import subprocess
+import sys
+import time
+import zlib
+from typing import Iterable
+
+from loguru import logger
+
+
+def shard_of(subreddit: str, workers: int) -> int:
+    """
+    @param subreddit: Subreddit name
+    @param workers: Number of workers
+    @return: Index of the worker that statically owns the subreddit
+    """
+    return zlib.crc32(subreddit.lower().encode()) % workers
+
+
+def rendezvous_owner(subreddit: str, workers: Iterable[str]) -> str | None:
+    """
+    Picks the owner of a subreddit among the live workers (highest random weight hashing). When a worker joins or
+    leaves, only the subreddits it gains or loses change owner.
+
+    @param subreddit: Subreddit name
+    @param workers: IDs of the live workers
+    @return: ID of the owning worker, or None if there are no workers
+    """
+    def weight(worker_id: str) -> bytes:
+        return hashlib.blake2b(f"{worker_id}/{subreddit.lower()}".encode(), digest_size=8).digest()
+
+    return max(workers, key=weight, default=None)
+
+
+class StaticAssignment:
+    # The set of owned subreddits never changes at runtime
+    dynamic = False
+
+    def __init__(self, workers: int = 1, worker_index: int = 0):
+        """
+        Deterministic partition of the monitored subreddits across a fixed number of workers.
+
+        @param workers: Number of workers
+        @param worker_index: Index of this worker (0 to `workers` - 1)
+        """
+        if not 0 <= worker_index < workers:
+            raise ValueError(f"Worker index {worker_index} is out of range for {workers} workers")
+        self.workers = workers
+        self.worker_index = worker_index
+
+    async def owned(self, subreddits: list[str]) -> set[str]:
+        """
+        @param subreddits: Names of all monitored subreddits
+        @return: Lowercase names of the subreddits this worker owns
+        """
+        return {name.lower() for name in subreddits if shard_of(name, self.workers) == self.worker_index}
+
+    async def release(self, subreddits: Iterable[str]):
+        pass
+
+    async def close(self):
+        pass
+
+
+def run_workers(workers: int, drain_timeout: float, restart_delay: float = 5.0, exit_margin: float = 5.0) -> int:
+    """
+    Runs the program in `workers` child processes (one per worker index), restarting any that exits with an error.
+
+    SIGINT and SIGTERM are forwarded to the workers, which then drain their queued actions. Workers that are still
+    running `exit_margin` seconds after their drain deadline are terminated.
+
+    @param workers: Number of worker processes
+    @param drain_timeout: Seconds the workers take at most to drain their queued actions
+    @param restart_delay: Delay before restarting a failed worker, in seconds
+    @param exit_margin: Seconds the workers get on top of `drain_timeout` to flush their state and exit
+    @return: Exit code
+    """
+    stopping = False
+
+    def spawn(index: int) -> subprocess.Popen:
+        logger.info(f"Starting worker {index}")
+        # In their own session, so a Ctrl-C in the terminal only reaches the workers once (forwarded from here)
+        return subprocess.Popen([sys.executable, "-m", "kebabmeister", *sys.argv[1:], "--worker-index", str(index)],
+                                start_new_session=True)
+
+    def forward(signum: int, _):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.poll() is None:
+                process.send_signal(signum)
+
+    processes = {index: spawn(index) for index in range(workers)}
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, forward)
+    try:
+        while processes and not stopping:
+            time.sleep(1)
+            for index, process in list(processes.items()):
+                code = process.poll()
+                if code is None:
+                    continue
+                if code == 0:
+                    logger.info(f"Worker {index} exited")
+                    del processes[index]
+                elif not stopping:
+                    logger.error(f"Worker {index} exited with code {code}, restarting in {restart_delay:.0f}s")
+                    time.sleep(restart_delay)
+                    if not stopping:
+                        processes[index] = spawn(index)
+    finally:
+        if not stopping:
+            forward(signal.SIGTERM, None)
+        deadline = time.monotonic() + drain_timeout + exit_margin
+        for index, process in processes.items():
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Worker {index} did not exit in time, terminating it")
+                process.terminate()
+                try:
+                    process.wait(exit_margin)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+    return 0
@@ -1,18 +1,159 @@
 import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
 
 from loguru import logger
 
 from kebabmeister.tasks import BaseTask
 
 
+@dataclass
+class StreamHealth:
+    name: str
+    started: float = field(default_factory=time.time)
+    # When the last item was received, and when it was created on Reddit (UNIX timestamps)
+    last_item: Optional[float] = None
+    last_item_created: Optional[float] = None
+    items: int = 0
+    restarts: int = 0
+    last_error: Optional[str] = None
+
+    def record(self, created_utc: Optional[float] = None):
+        """
+        Records that the stream has received an item.
+
+        @param created_utc: Creation time of the item (UNIX timestamp)
+        """
+        self.last_item = time.time()
+        self.items += 1
+        if created_utc is not None:
+            self.last_item_created = created_utc
+
+    @property
+    def lag(self) -> Optional[float]:
+        """
+        Seconds between the creation of the last item and it being received.
+        """
+        if self.last_item is None or self.last_item_created is None:
+            return None
+        return max(self.last_item - self.last_item_created, 0)
+
+    @property
+    def idle(self) -> float:
+        """
+        Seconds since the last item was received (or since the stream was started).
+        """
+        return time.time() - (self.last_item or self.started)
+
+
 class TaskManager:
-    def __init__(self):
+    def __init__(self, backoff: float = 1.0, backoff_max: float = 300.0, health_interval: float = 300.0):
+        """
+        Runs tasks and supervises their coroutines. A supervised coroutine that fails (or exits) is restarted
+        with jittered exponential backoff, without affecting any other coroutine.
+
+        @param backoff: Delay before the first restart, in seconds
+        @param backoff_max: Maximum delay between restarts, in seconds
+        @param health_interval: Interval at which the health of all coroutines is logged, in seconds
+        """
         self.tasks: list[BaseTask] = []
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.health_interval = health_interval
+        self.health: dict[str, StreamHealth] = {}
+        self._supervised: dict[str, asyncio.Task] = {}
+        self._reporter: Optional[asyncio.Task] = None
+        self._reported_restarts: dict[str, int] = {}
 
     def schedule(self, task: BaseTask):
         logger.debug(f"Scheduling task {task.name}")
         self.tasks.append(task)
 
+    def supervise(self, name: str, factory: Callable[[StreamHealth], Awaitable]) -> asyncio.Task:
+        """
+        Starts a supervised coroutine. A running coroutine with the same name is replaced.
+
+        @param name: Unique name of the coroutine
+        @param factory: Function that creates the coroutine, given its health record
+        @return: Supervisor task, which only finishes when cancelled
+        """
+        previous = self._supervised.get(name)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        task = asyncio.create_task(self._supervise(name, factory), name=name)
+        self._supervised[name] = task
+        return task
+
+    async def cancel(self, name: str):
+        """
+        Stops a supervised coroutine.
+
+        @param name: Name of the coroutine
+        """
+        task = self._supervised.pop(name, None)
+        self.health.pop(name, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def stop(self):
+        """
+        Stops all supervised coroutines, including the ones started while stopping.
+        """
+        if self._reporter is not None:
+            self._reporter.cancel()
+        while self._supervised:
+            tasks = list(self._supervised.values())
+            self._supervised.clear()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.health.clear()
+
+    async def _supervise(self, name: str, factory: Callable[[StreamHealth], Awaitable]):
+        health = self.health[name] = StreamHealth(name)
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                await factory(health)
+                logger.warning(f"{name} exited unexpectedly")
+            except Exception as e:
+                health.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"{name} failed: {health.last_error}")
+
+            # A coroutine that ran fine for a while starts over with the shortest delay
+            if time.monotonic() - started > self.backoff_max:
+                failures = 0
+            failures += 1
+            health.restarts += 1
+            delay = min(self.backoff * 2 ** (failures - 1), self.backoff_max) * random.uniform(0.5, 1)
+            logger.info(f"Restarting {name} in {delay:.1f}s (restart #{health.restarts})")
+            await asyncio.sleep(delay)
+
+    def report(self):
+        """
+        Logs the health of all supervised coroutines.
+        """
+        for health in self.health.values():
+            lag = f"{health.lag:.0f}s" if health.lag is not None else "n/a"
+            message = (f"{health.name}: {health.items} items, last {health.idle:.0f}s ago, lag {lag}, "
+                       f"{health.restarts} restarts")
+            if health.restarts > self._reported_restarts.get(health.name, 0):
+                logger.warning(f"{message} (last error: {health.last_error})")
+            else:
+                logger.debug(message)
+            self._reported_restarts[health.name] = health.restarts
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            self.report()
+
     async def run(self):
         logger.info("Running tasks")
-        await asyncio.gather(*[task.run() for task in self.tasks])
+        supervisors = [self.supervise(task.name, lambda health, task=task: task.run()) for task in self.tasks]
+        self._reporter = asyncio.create_task(self._report_periodically(), name="health-report")
+        await asyncio.gather(self._reporter, *supervisors)
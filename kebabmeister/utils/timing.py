@@ -0,0 +1,54 @@
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    def __init__(self, started: Optional[float] = None):
+        """
+        Breakdown of the time spent in each startup phase. Phases that run concurrently can overlap.
+
+        @param started: `time.perf_counter()` value at which startup began (default: now)
+        """
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: list[tuple[str, float]] = []
+        self._last = self.started
+        self.reported = False
+
+    def mark(self, phase: str):
+        """
+        Ends a phase, which started when the previous one ended.
+
+        @param phase: Name of the phase
+        """
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    async def measure(self, phase: str, awaitable: Awaitable[T]) -> T:
+        """
+        Times a phase that runs concurrently with others. The next sequential phase starts when it ends.
+
+        @param phase: Name of the phase
+        @param awaitable: Work of the phase
+        @return: Result of the work
+        """
+        started = time.perf_counter()
+        result = await awaitable
+        now = time.perf_counter()
+        self.phases.append((phase, now - started))
+        self._last = max(self._last, now)
+        return result
+
+    def report(self):
+        """
+        Logs the breakdown (only once).
+        """
+        if self.reported:
+            return
+        self.reported = True
+        breakdown = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        logger.info(f"Started in {time.perf_counter() - self.started:.2f}s ({breakdown})")
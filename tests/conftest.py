@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from kebabmeister.configuration import (
+    Configuration,
+    DatabaseConfiguration,
+    MonitoringConfiguration,
+    RedditConfiguration,
+    SubredditConfigConfiguration,
+)
+from kebabmeister.database.schemas import Base
+
+
+@pytest.fixture
+def session(tmp_path) -> async_sessionmaker[AsyncSession]:
+    """
+    Session factory for a fresh SQLite database with the current schema.
+
+    Every test drives its coroutines with `asyncio.run`, so connections are not pooled across event loops.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_schema())
+    yield async_sessionmaker(engine, expire_on_commit=True)
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def make_task():
+    """
+    Factory of submission monitoring tasks, taking monitoring options as keyword arguments.
+    """
+    from kebabmeister.tasks.submission_monitoring import SubmissionMonitoringTask
+
+    def make(**monitoring) -> SubmissionMonitoringTask:
+        return SubmissionMonitoringTask(Configuration(
+            reddit=RedditConfiguration(client_id="", client_secret="", user_agent="", username="bot", password=""),
+            database=DatabaseConfiguration(url="sqlite+aiosqlite://"),
+            monitored_subreddits=[],
+            subreddit_config=SubredditConfigConfiguration(page_name="kebabmeister", update_interval=3600),
+            monitoring=MonitoringConfiguration(**monitoring),
+        ))
+
+    return make
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import asyncprawcore.exceptions
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.actions.pool import ActionPool
+from kebabmeister.configuration import ActionsConfiguration
+
+SUBREDDIT = SimpleNamespace(id="t5_a", display_name="A")
+OTHER_SUBREDDIT = SimpleNamespace(id="t5_b", display_name="B")
+
+
+def _pool(remaining=None, reset_in: float = 60, **options) -> ActionPool:
+    config = ActionsConfiguration(**{"workers": 1, "retry_delay": 0.01, **options})
+    limiter = SimpleNamespace(remaining=remaining, reset_timestamp=time.time() + reset_in)
+    return ActionPool(config, SimpleNamespace(_core=SimpleNamespace(_rate_limiter=limiter)))
+
+
+def _network_error() -> Exception:
+    return asyncprawcore.exceptions.RequestException(OSError("connection reset"), (), {})
+
+
+def _item(side_effect=None) -> MagicMock:
+    item = MagicMock()
+    item.reply = AsyncMock(side_effect=side_effect, return_value=None)
+    item.mod.remove = AsyncMock(side_effect=side_effect)
+    return item
+
+
+async def _run(pool: ActionPool, *actions: Action):
+    pool.start()
+    for action in actions:
+        await pool.submit(action)
+    await pool.join()
+    await pool.close()
+
+
+def test_actions_run_on_workers():
+    items = [_item() for _ in range(10)]
+    asyncio.run(_run(_pool(workers=3), *(Action(kind=ActionKind.REMOVE, target=item, subreddit=SUBREDDIT)
+                                         for item in items)))
+    assert all(item.mod.remove.await_count == 1 for item in items)
+
+
+def _redditor(name: str) -> MagicMock:
+    redditor = MagicMock()
+    redditor.name = name
+    redditor.message = AsyncMock()
+    return redditor
+
+
+def test_removals_run_before_replies():
+    order = []
+    item = _item()
+    item.reply.side_effect = lambda message: order.append("reply")
+    item.mod.remove.side_effect = lambda mod_note: order.append("remove")
+
+    async def scenario():
+        pool = _pool()
+        # Queued before the workers start, so the queue decides the order
+        await pool.submit(Action(kind=ActionKind.REPLY, target=item, subreddit=SUBREDDIT))
+        await pool.submit(Action(kind=ActionKind.REMOVE, target=item, subreddit=SUBREDDIT))
+        await _run(pool)
+
+    asyncio.run(scenario())
+    assert order == ["remove", "reply"]
+
+
+def test_sheddable_actions_are_dropped_on_low_budget():
+    welcome, removed = _item(), _item()
+    asyncio.run(_run(_pool(remaining=50, shed_below=100),
+                     Action(kind=ActionKind.REPLY, target=welcome, subreddit=SUBREDDIT, sheddable=True),
+                     Action(kind=ActionKind.REMOVE, target=removed, subreddit=SUBREDDIT)))
+    assert welcome.reply.await_count == 0
+    assert removed.mod.remove.await_count == 1
+
+
+def test_replies_wait_for_rate_limit_reset():
+    item = _item()
+
+    async def scenario():
+        started = time.monotonic()
+        await _run(_pool(remaining=10, reset_in=0.2, defer_below=20),
+                   Action(kind=ActionKind.REPLY, target=item, subreddit=SUBREDDIT))
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.15
+    assert item.reply.await_count == 1
+
+
+def test_removal_is_retried_after_network_error():
+    item = _item([_network_error(), None])
+    asyncio.run(_run(_pool(), Action(kind=ActionKind.REMOVE, target=item, subreddit=SUBREDDIT)))
+    assert item.mod.remove.await_count == 2
+
+
+def test_retries_give_up():
+    item = _item(_network_error())
+    asyncio.run(_run(_pool(retries=2), Action(kind=ActionKind.REMOVE, target=item, subreddit=SUBREDDIT)))
+    assert item.mod.remove.await_count == 3
+
+
+def test_reply_is_not_retried_after_network_error():
+    item = _item(_network_error())
+    asyncio.run(_run(_pool(), Action(kind=ActionKind.REPLY, target=item, subreddit=SUBREDDIT, message="Hi")))
+    # The reply may have been posted before the connection dropped
+    assert item.reply.await_count == 1
+
+
+def test_submit_after_close_is_dropped():
+    async def scenario():
+        pool = _pool(queue_size=1)
+        await pool.close()
+        item = _item()
+        # Would block forever on a full queue without workers
+        for _ in range(3):
+            await pool.submit(Action(kind=ActionKind.REMOVE, target=item, subreddit=SUBREDDIT))
+        return item.mod.remove.await_count
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 1)) == 0
+
+
+def test_messages_are_coalesced():
+    redditor = _redditor("Someone")
+    asyncio.run(_run(_pool(coalesce_window=0.05),
+                     *(Action(kind=ActionKind.MESSAGE, target=redditor, subreddit=subreddit, subject="Flair",
+                              message=f"Please flair up in {subreddit.display_name}")
+                       for subreddit in (SUBREDDIT, OTHER_SUBREDDIT))))
+
+    call, = redditor.message.await_args_list
+    assert "Please flair up in A" in call.kwargs["message"]
+    assert "Please flair up in B" in call.kwargs["message"]
+
+
+def test_held_messages_count_against_queue_size():
+    redditors = [_redditor(f"user{index}") for index in range(10)]
+
+    async def scenario():
+        pool = _pool(coalesce_window=60, queue_size=3)
+        pool.start()
+        for redditor in redditors:
+            await pool.submit(Action(kind=ActionKind.MESSAGE, target=redditor, subreddit=SUBREDDIT))
+            assert pool._held <= 3
+        # Let the worker send the digests that were sent early
+        await asyncio.sleep(0.05)
+        await pool.close()
+
+    asyncio.run(scenario())
+    # The oldest messages were sent early, the newest are still held
+    assert [redditor.message.await_count for redditor in redditors] == [1] * 7 + [0] * 3
+
+
+def test_release_drops_actions_of_handed_over_subreddits():
+    released, kept = _item(), _item()
+
+    async def scenario():
+        pool = _pool()
+        await pool.submit(Action(kind=ActionKind.REMOVE, target=released, subreddit=SUBREDDIT,
+                                 outbox_keys=(("t3_a", "remove"),)))
+        await pool.submit(Action(kind=ActionKind.REMOVE, target=kept, subreddit=OTHER_SUBREDDIT,
+                                 outbox_keys=(("t3_b", "remove"),)))
+        await pool.release({SUBREDDIT.id}, timeout=1)
+        await _run(pool)
+
+    asyncio.run(scenario())
+    assert (released.mod.remove.await_count, kept.mod.remove.await_count) == (0, 1)
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from kebabmeister.utils.adaptive_poller import PAGE_SIZE, TARGET_FILL, AdaptivePoller, PollBudget
+
+
+def _poller(listing=None, min_interval: float = 5, max_interval: float = 600) -> AdaptivePoller:
+    return AdaptivePoller("test", listing, PollBudget(6000), min_interval, max_interval)
+
+
+def _items(*created: float) -> list[SimpleNamespace]:
+    return [SimpleNamespace(fullname=f"t3_{index}", created_utc=timestamp) for index, timestamp in enumerate(created)]
+
+
+def test_interval_targets_share_of_page():
+    poller = _poller()
+    poller.rate = 1.0
+    # Half a page of new items is expected at each poll
+    assert poller._next_interval() == PAGE_SIZE * TARGET_FILL
+    poller.rate = 1000.0
+    assert poller._next_interval() == 5
+    poller.rate = 0.001
+    assert poller._next_interval() == 600
+    poller.rate = 0.0
+    assert poller._next_interval() == 600
+
+
+def test_first_poll_estimates_rate_from_page_span():
+    poller = _poller()
+    poller._update_rate(_items(1000, 1010, 1020), None)
+    assert poller.rate == 0.1
+
+    poller._update_rate(_items(), 10)
+    # Smoothed towards no new items at all
+    assert poller.rate == (1 - AdaptivePoller.SMOOTHING) * 0.1
+
+
+def test_stream_yields_new_items_oldest_first():
+    first = _items(3, 2, 1)
+    # Newest first, like Reddit's listings
+    pages = [first, [SimpleNamespace(fullname="t3_new", created_utc=4), *first]]
+
+    async def listing(limit: int):
+        for item in pages.pop(0) if len(pages) > 1 else pages[0]:
+            yield item
+
+    async def scenario():
+        stream = _poller(listing, min_interval=0, max_interval=0).stream()
+        return [(await anext(stream)).fullname for _ in range(4)]
+
+    assert asyncio.run(scenario()) == ["t3_2", "t3_1", "t3_0", "t3_new"]
+
+
+def test_budget_limits_poll_rate():
+    async def scenario():
+        # Ten polls per second, with a burst of ten
+        budget = PollBudget(600)
+        started = time.monotonic()
+        for _ in range(13):
+            await budget.acquire()
+        return time.monotonic() - started
+
+    assert 0.25 <= asyncio.run(scenario()) < 1
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from sqlalchemy import select
+
+from kebabmeister import state
+from kebabmeister.database.checkpoints import COMMENTS, SUBMISSIONS, CheckpointStore
+from kebabmeister.database.schemas.checkpoint import StreamCheckpoint
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.database.seen import SeenRecorder
+from kebabmeister.utils.reddit_id import to_int
+
+
+async def _stored_marks(session) -> dict[tuple[str, str], int]:
+    async with session() as s:
+        rows = (await s.execute(select(StreamCheckpoint))).scalars().all()
+    return {(row.subreddit_id, row.stream): row.last_id for row in rows}
+
+
+def test_resume_from_stored_marks(session):
+    async def scenario():
+        store = CheckpointStore(session, "sqlite", 60)
+        store.advance("t5_a", COMMENTS, "b", time.time())
+        # Older items never move the mark back
+        store.advance("t5_a", COMMENTS, "a", time.time())
+        await store.close()
+
+        restarted = CheckpointStore(session, "sqlite", 60)
+        await restarted.load()
+        return restarted
+
+    store = asyncio.run(scenario())
+    assert store.resume_mark("t5_a", COMMENTS) == to_int("b")
+    assert store.is_handled("t5_a", COMMENTS, "a")
+    assert store.is_handled("t5_a", COMMENTS, "b")
+    assert not store.is_handled("t5_a", COMMENTS, "c")
+    assert not store.is_handled("t5_a", SUBMISSIONS, "a")
+
+    store.skip_through("t5_a", COMMENTS, "d")
+    assert store.is_handled("t5_a", COMMENTS, "c")
+
+
+def test_marks_wait_for_seen_ids(session):
+    async def scenario():
+        recorder = SeenRecorder(session, SeenSubmission, "sqlite", 100, 60, 100)
+        store = CheckpointStore(session, "sqlite", 60, [recorder])
+        await recorder.claim("abc", time.time() + 120)
+        store.advance("t5_a", SUBMISSIONS, "abc", time.time())
+
+        working = recorder.session
+
+        def broken():
+            raise RuntimeError("database is down")
+
+        recorder.session = broken
+        await store.flush()
+        while_down = await _stored_marks(session)
+        recorder.session = working
+        await store.flush()
+        return while_down, await _stored_marks(session)
+
+    while_down, stored = asyncio.run(scenario())
+    # Persisting the mark first would skip the item after a crash, without a seen ID or outbox entry
+    assert while_down == {}
+    assert stored == {("t5_a", SUBMISSIONS): to_int("abc")}
+
+
+def test_catch_up_processes_backlog_oldest_first(session, make_task, monkeypatch):
+    task = make_task(catch_up=True, catch_up_limit=10)
+    processed = []
+    task._process_comment = AsyncMock(side_effect=lambda subreddit, comment: processed.append(comment.id))
+
+    async def comments(limit: int):
+        # Newest first, down to an item handled before the restart
+        for reddit_id in ("e", "d", "c", "b"):
+            yield SimpleNamespace(id=reddit_id)
+
+    subreddit = SimpleNamespace(id="t5_a", display_name="a", comments=comments)
+    monkeypatch.setattr(state, "checkpoints", CheckpointStore(session, "sqlite", 60), raising=False)
+    state.checkpoints.skip_through("t5_a", COMMENTS, "c")
+
+    asyncio.run(task._catch_up(subreddit, COMMENTS))
+    assert processed == ["d", "e"]
+    # The stream replays these, but they have just been handled
+    assert state.checkpoints.is_handled("t5_a", COMMENTS, "e")
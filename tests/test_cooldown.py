@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from kebabmeister.actions.cooldown import CooldownStore
+from kebabmeister.configuration import NotificationsConfiguration
+from kebabmeister.database.dialects import upsert
+from kebabmeister.database.schemas.notification import NotificationCooldown
+
+
+def test_cooldown_window():
+    store = CooldownStore(NotificationsConfiguration(cooldown=3600))
+    assert store.try_acquire("t5_a", "Someone")
+    assert not store.try_acquire("t5_a", "someone")
+    assert store.try_acquire("t5_b", "someone")
+
+
+def test_disabled_store_always_allows():
+    store = CooldownStore(NotificationsConfiguration(cooldown=0))
+    assert store.try_acquire("t5_a", "someone")
+    assert store.try_acquire("t5_a", "someone")
+
+
+def test_flush_drops_expired_entries():
+    async def scenario():
+        store = CooldownStore(NotificationsConfiguration(cooldown=60))
+        store.try_acquire("t5_a", "someone")
+        store._notified[("t5_a", "someone")] = time.time() - 120
+        await store.flush()
+        return len(store._notified)
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_cooldowns_survive_restart(session):
+    async def scenario():
+        config = NotificationsConfiguration(cooldown=3600)
+        store = CooldownStore(config, session, "sqlite")
+        store.try_acquire("t5_a", "someone")
+        await store.close()
+
+        restarted = CooldownStore(config, session, "sqlite")
+        await restarted.load("t5_a")
+        return restarted.try_acquire("t5_a", "someone"), restarted.try_acquire("t5_a", "other")
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_upsert_dialects():
+    statement = upsert("mysql", NotificationCooldown,
+                       [NotificationCooldown.subreddit_id, NotificationCooldown.username], ["notified_date"])
+    compiled = str(statement.values(subreddit_id="t5_a", username="someone", notified_date=None)
+                   .compile(dialect=mysql.dialect()))
+    assert "ON DUPLICATE KEY UPDATE notified_date" in compiled
+
+    with pytest.raises(ValueError):
+        upsert("oracle", NotificationCooldown, [NotificationCooldown.subreddit_id], ["notified_date"])
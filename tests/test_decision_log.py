@@ -0,0 +1,72 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.actions.decision_log import DecisionLog, summarize
+
+
+def _entry(time: float, subreddit: str, action: str, calls: int = 1) -> str:
+    return json.dumps({"time": time, "subreddit": subreddit, "item": "abc", "type": "submission",
+                       "author": "someone", "action": action, "calls": calls})
+
+
+def test_summarize_volumes_per_subreddit_and_action():
+    lines = [
+        _entry(0, "A", "reply", 2),
+        _entry(1800, "A", "reply", 2),
+        _entry(3600, "A", "message"),
+        "",
+        _entry(3600, "B", "remove"),
+    ]
+    assert summarize(lines) == [
+        {"subreddit": "A", "action": "message", "decisions": 1, "calls": 1,
+         "decisions_per_hour": 1.0, "calls_per_hour": 1.0},
+        {"subreddit": "A", "action": "reply", "decisions": 2, "calls": 4,
+         "decisions_per_hour": 2.0, "calls_per_hour": 4.0},
+        {"subreddit": "B", "action": "remove", "decisions": 1, "calls": 1,
+         "decisions_per_hour": 1.0, "calls_per_hour": 1.0},
+    ]
+
+
+def test_summarize_short_logs_as_one_minute():
+    rows = summarize([_entry(0, "A", "remove"), _entry(1, "A", "remove")])
+    assert rows[0]["decisions_per_hour"] == 120
+    assert summarize([]) == []
+
+
+def test_recorded_decisions_can_be_summarized(tmp_path):
+    path = tmp_path / "logs" / "decisions.jsonl"
+    log = DecisionLog(str(path))
+    item = SimpleNamespace(id="abc", fullname="t3_abc", author=SimpleNamespace(name="someone"))
+    subreddit = SimpleNamespace(display_name="A")
+    log.record(Action(kind=ActionKind.REPLY, target=item, subreddit=subreddit, message="Welcome!", sticky=True), item)
+    log.record(Action(kind=ActionKind.MESSAGE, target=item.author, subreddit=subreddit, subject="Flair up"), item)
+    asyncio.run(log.close())
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert json.loads(lines[0])["message"] == "Welcome!"
+    # The reply is also distinguished and pinned
+    assert [(row["action"], row["calls"]) for row in summarize(lines)] == [("message", 1), ("reply", 2)]
+
+
+def test_dry_run_keeps_claims_and_cooldowns_apart(make_task, monkeypatch):
+    from kebabmeister import state
+
+    task = make_task()
+    task.config.dry_run.enabled = True
+    task.config.notifications.cooldown = 3600
+    recorder = SimpleNamespace(claim=None)
+    monkeypatch.setattr(state, "cooldowns", SimpleNamespace(try_acquire=None), raising=False)
+    subreddit = SimpleNamespace(id="t5_a", display_name="A")
+    item = SimpleNamespace(id="abc", fullname="t3_abc", created_utc=0)
+    author = SimpleNamespace(name="someone")
+
+    async def scenario():
+        return (await task._claim(subreddit, task.DEFAULT_CONFIG, item, recorder),
+                await task._claim(subreddit, task.DEFAULT_CONFIG, item, recorder))
+
+    # Neither the seen recorder nor the live cooldowns are touched (calling them would fail)
+    assert asyncio.run(scenario()) == (True, False)
+    assert task._may_notify(task.DEFAULT_CONFIG, subreddit, author)
+    assert not task._may_notify(task.DEFAULT_CONFIG, subreddit, author)
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.actions.digest import MAX_LINKS, MAX_MESSAGE_LENGTH, merge_messages
+
+RECIPIENT = SimpleNamespace(name="someone")
+
+
+def _message(subreddit: str, message: str, permalink: str | None = None, subject: str = "Flair up",
+             sheddable: bool = False) -> Action:
+    return Action(kind=ActionKind.MESSAGE, target=RECIPIENT, subreddit=SimpleNamespace(display_name=subreddit),
+                  subject=subject, message=message, sheddable=sheddable,
+                  about=SimpleNamespace(permalink=permalink) if permalink else None,
+                  outbox_keys=((f"t1_{permalink}", "message"),))
+
+
+def test_one_section_per_subreddit():
+    digest = merge_messages([_message("A", "Flair up in A", "/r/A/1"),
+                             _message("B", "Flair up in B", "/r/B/1"),
+                             _message("A", "Flair up in A", "/r/A/2")], "Please flair up")
+
+    assert digest.message == ("**r/A**\n\nFlair up in A\n\n"
+                              "- https://www.reddit.com/r/A/1\n- https://www.reddit.com/r/A/2\n\n---\n\n"
+                              "**r/B**\n\nFlair up in B\n\n- https://www.reddit.com/r/B/1")
+    assert digest.target is RECIPIENT
+    # All messages share a subject
+    assert digest.subject == "Flair up"
+    assert digest.outbox_keys == (("t1_/r/A/1", "message"), ("t1_/r/B/1", "message"), ("t1_/r/A/2", "message"))
+
+
+def test_mixed_subjects_and_sheddable():
+    digest = merge_messages([_message("A", "x", subject="One", sheddable=True),
+                             _message("B", "y", subject="Two", sheddable=False)], "Please flair up")
+    assert digest.subject == "Please flair up"
+    assert not digest.sheddable
+
+
+def test_links_are_capped():
+    digest = merge_messages([_message("A", "Flair up", f"/r/A/{index}") for index in range(MAX_LINKS + 5)], "Digest")
+    assert digest.message.count("https://www.reddit.com") == MAX_LINKS
+    assert digest.message.endswith("- ...and 5 more")
+
+
+def test_message_length_is_capped():
+    actions = [_message(f"Sub{index}", "x" * 2000) for index in range(10)]
+    digest = merge_messages(actions, "Digest")
+    assert len(digest.message) <= MAX_MESSAGE_LENGTH
+    assert digest.message.endswith("more subreddits")
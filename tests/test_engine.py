@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from kebabmeister.configuration import DatabaseConfiguration
+from kebabmeister.database.engine import create_engine
+
+
+def test_tuned_sqlite_profile(tmp_path):
+    config = DatabaseConfiguration(url=f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}", sqlite_busy_timeout=1234)
+
+    async def pragmas():
+        engine = create_engine(config)
+        async with engine.connect() as conn:
+            values = [(await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+                      for name in ("journal_mode", "synchronous", "busy_timeout")]
+        size = engine.pool.size()
+        await engine.dispose()
+        return values, size
+
+    (journal_mode, synchronous, busy_timeout), pool_size = asyncio.run(pragmas())
+    assert journal_mode == "wal"
+    # NORMAL
+    assert synchronous == 1
+    assert busy_timeout == 1234
+    # All access from the process goes through one connection
+    assert pool_size == 1
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        create_engine(DatabaseConfiguration(url="sqlite+aiosqlite://", profile="fast"))
@@ -0,0 +1,42 @@
+import time
+
+from kebabmeister.utils.flair_cache import FlairCache
+
+
+def test_newer_observation_wins():
+    cache = FlairCache(ttl=60, max_entries=10)
+    now = time.time()
+    cache.update("t5_a", "Someone", "Kebab", observed=now)
+    cache.update("t5_a", "someone", None, observed=now - 10)
+
+    assert cache.get("t5_a", "SOMEONE") == "Kebab"
+    assert cache.get("t5_b", "someone") is None
+
+
+def test_only_observations_after_item_count():
+    cache = FlairCache(ttl=60, max_entries=10)
+    now = time.time()
+    cache.update("t5_a", "someone", "Kebab", observed=now - 30)
+
+    assert cache.get("t5_a", "someone", since=now - 60) == "Kebab"
+    # Flaired before the item was made, so the item's own (missing) flair is newer
+    assert cache.get("t5_a", "someone", since=now - 10) is None
+
+
+def test_entries_expire_and_are_evicted():
+    cache = FlairCache(ttl=60, max_entries=2)
+    now = time.time()
+    cache.update("t5_a", "old", "Kebab", observed=now - 120)
+    assert cache.get("t5_a", "old") is None
+    assert len(cache) == 0
+
+    for name in ("a", "b", "c"):
+        cache.update("t5_a", name, "Kebab")
+    assert len(cache) == 2
+    assert cache.get("t5_a", "a") is None
+
+
+def test_disabled_cache_stays_empty():
+    cache = FlairCache(ttl=0, max_entries=10)
+    cache.update("t5_a", "someone", "Kebab")
+    assert len(cache) == 0
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+from kebabmeister.utils.errors import InvalidTemplate
+from kebabmeister.utils.format_string import MessageTemplate
+
+
+class _Submission:
+    id = "abc"
+    title = "Ćevapi or kebab?"
+    author_flair_text = None
+
+    @property
+    def selftext(self):
+        raise AssertionError("attributes the template does not use are never read")
+
+
+def test_renders_placeholders():
+    template = MessageTemplate("Hi {author}, flair up in r/{subreddit} ({submission_title!r:.8})")
+    rendered = template.render(author=SimpleNamespace(name="someone"), submission=_Submission(),
+                               subreddit=SimpleNamespace(display_name="kebab"))
+    assert rendered == "Hi someone, flair up in r/kebab ('Ćevapi )"
+    assert template.placeholders == {"author", "subreddit", "submission_title"}
+
+
+def test_missing_items_render_as_none():
+    assert MessageTemplate("{comment_body}").render() == "None"
+
+
+def test_extra_placeholders():
+    template = MessageTemplate("Welcome!\n\n{unflaired_message}", extra_placeholders=["unflaired_message"])
+    assert template.render(unflaired_message="Please flair up") == "Welcome!\n\nPlease flair up"
+
+
+@pytest.mark.parametrize("text", ["{unknown}", "{unflaired_message}", "{author", "{author:{subreddit}}"])
+def test_invalid_templates_are_rejected(text):
+    with pytest.raises(InvalidTemplate):
+        MessageTemplate(text)
+
+
+def test_escaped_braces():
+    assert MessageTemplate("{{author}}").render() == "{author}"
@@ -0,0 +1,63 @@
+import asyncio
+
+from sqlalchemy import update
+
+from kebabmeister.database.leases import LeaseAssignment, _to_datetime
+from kebabmeister.database.schemas.lease import SubredditLease
+from kebabmeister.utils.sharding import rendezvous_owner
+
+SUBREDDITS = [f"Sub{index}" for index in range(20)]
+NAMES = {name.lower() for name in SUBREDDITS}
+
+
+def test_single_worker_owns_everything(session):
+    worker = LeaseAssignment(session, "sqlite", "a", lease_ttl=30)
+    assert asyncio.run(worker.owned(SUBREDDITS)) == NAMES
+
+
+def test_subreddits_move_to_joining_worker_after_release(session):
+    async def scenario():
+        a = LeaseAssignment(session, "sqlite", "a", lease_ttl=30)
+        b = LeaseAssignment(session, "sqlite", "b", lease_ttl=30)
+        before = await a.owned(SUBREDDITS)
+        # B's share is still leased by A
+        b_blocked = await b.owned(SUBREDDITS)
+        a_after = await a.owned(SUBREDDITS)
+        await a.release(before - a_after)
+        return before, b_blocked, a_after, await b.owned(SUBREDDITS)
+
+    before, b_blocked, a_after, b_after = asyncio.run(scenario())
+    assert before == NAMES
+    assert b_blocked == set()
+    assert a_after == {name for name in NAMES if rendezvous_owner(name, ["a", "b"]) == "a"}
+    assert not a_after & b_after
+    assert a_after | b_after == NAMES
+
+
+def test_expired_leases_are_taken_over(session):
+    async def scenario():
+        a = LeaseAssignment(session, "sqlite", "a", lease_ttl=30)
+        b = LeaseAssignment(session, "sqlite", "b", lease_ttl=30)
+        await a.owned(SUBREDDITS)
+        await b.owned(SUBREDDITS)
+        # A stopped heartbeating a while ago
+        async with session() as s:
+            async with s.begin():
+                await s.execute(update(SubredditLease).values(expires=_to_datetime(0)))
+        return await b.owned(SUBREDDITS)
+
+    b_owned = asyncio.run(scenario())
+    # A's heartbeat is still recent, so B only takes over its own share right away
+    assert b_owned == {name for name in NAMES if rendezvous_owner(name, ["a", "b"]) == "b"}
+
+
+def test_close_hands_everything_over(session):
+    async def scenario():
+        a = LeaseAssignment(session, "sqlite", "a", lease_ttl=30)
+        b = LeaseAssignment(session, "sqlite", "b", lease_ttl=30)
+        await a.owned(SUBREDDITS)
+        await b.owned(SUBREDDITS)
+        await a.close()
+        return await b.owned(SUBREDDITS)
+
+    assert asyncio.run(scenario()) == NAMES
@@ -0,0 +1,65 @@
+import asyncio
+
+from kebabmeister.utils.metrics import Counter, Gauge, Histogram, MetricsServer, Registry
+
+
+def test_render_exposition_format():
+    registry = Registry()
+    actions = Counter("actions_total", "Actions", ["kind", "outcome"], registry=registry)
+    queue = Gauge("queue_depth", "Queue depth", registry=registry)
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+    actions.labels("remove", "done").inc()
+    actions.labels("remove", "done").inc(2)
+    actions.labels("message", 'say "hi"\n').inc()
+    registry.add_collector(lambda: queue.set(7))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    assert registry.render() == "\n".join([
+        "# HELP actions_total Actions",
+        "# TYPE actions_total counter",
+        'actions_total{kind="remove",outcome="done"} 3.0',
+        'actions_total{kind="message",outcome="say \\"hi\\"\\n"} 1.0',
+        "# HELP queue_depth Queue depth",
+        "# TYPE queue_depth gauge",
+        "queue_depth 7",
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1.0"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 5.55",
+        "latency_seconds_count 3",
+    ]) + "\n"
+
+
+def test_failing_collector_does_not_break_rendering():
+    registry = Registry()
+    Counter("items_total", "Items", registry=registry).inc()
+
+    def broken():
+        raise RuntimeError("no state yet")
+
+    registry.add_collector(broken)
+    assert "items_total 1.0" in registry.render()
+
+
+def test_server_exposes_metrics():
+    registry = Registry()
+    Counter("items_total", "Items", registry=registry).inc()
+
+    async def get(path: str) -> str:
+        server = MetricsServer("127.0.0.1", 0, registry)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = (await reader.read()).decode()
+        writer.close()
+        await server.close()
+        return response
+
+    metrics = asyncio.run(get("/metrics"))
+    assert metrics.startswith("HTTP/1.1 200 OK")
+    assert metrics.endswith("items_total 1.0\n")
+    assert asyncio.run(get("/other")).startswith("HTTP/1.1 404")
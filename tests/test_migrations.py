@@ -0,0 +1,92 @@
+import asyncio
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from kebabmeister.configuration import DatabaseConfiguration
+from kebabmeister.database import prepare_db
+from kebabmeister.database.migrations import migrate
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.utils.reddit_id import to_int
+
+
+def _create_legacy_table(conn, name: str, reddit_ids: list[str]):
+    # As created by earlier versions
+    conn.execute(text(f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, "
+                      f"seen_date DATETIME DEFAULT CURRENT_TIMESTAMP, reddit_id VARCHAR UNIQUE)"))
+    for reddit_id in reddit_ids:
+        conn.execute(text(f"INSERT INTO {name} (reddit_id) VALUES (:reddit_id)"), {"reddit_id": reddit_id})
+
+
+def test_migrates_text_ids_to_integers():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        _create_legacy_table(conn, SeenSubmission.__tablename__, ["abc123", "zz9"])
+        _create_legacy_table(conn, SeenComment.__tablename__, ["t1_k0"])
+        migrate(conn)
+
+        submissions = conn.execute(select(SeenSubmission.id)).scalars().all()
+        comments = conn.execute(select(SeenComment.id)).scalars().all()
+        tables = inspect(conn).get_table_names()
+
+    assert sorted(submissions) == sorted([to_int("abc123"), to_int("zz9")])
+    assert comments == [to_int("k0")]
+    assert not any(name.endswith("_legacy") for name in tables)
+
+
+def test_legacy_indexes_do_not_block_new_table():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        _create_legacy_table(conn, SeenSubmission.__tablename__, ["a"])
+        # Named like an index of the current definition
+        conn.execute(text(f"CREATE INDEX ix_seen_submissions_seen_date ON {SeenSubmission.__tablename__} (seen_date)"))
+        migrate(conn)
+
+        indexes = {index["name"] for index in inspect(conn).get_indexes(SeenSubmission.__tablename__)}
+        submissions = conn.execute(select(SeenSubmission.id)).scalars().all()
+
+    assert "ix_seen_submissions_seen_date" in indexes
+    assert submissions == [to_int("a")]
+
+
+def test_resumes_interrupted_migration():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        # Renamed and partially copied before the previous run stopped
+        _create_legacy_table(conn, f"{SeenSubmission.__tablename__}_legacy", ["a", "b"])
+        SeenSubmission.__table__.create(conn)
+        conn.execute(SeenSubmission.__table__.insert().values(id=to_int("a")))
+        migrate(conn)
+
+        submissions = conn.execute(select(SeenSubmission.id)).scalars().all()
+        tables = inspect(conn).get_table_names()
+
+    assert sorted(submissions) == [to_int("a"), to_int("b")]
+    assert f"{SeenSubmission.__tablename__}_legacy" not in tables
+
+
+def test_leaves_current_schema_alone():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        SeenSubmission.__table__.create(conn)
+        conn.execute(SeenSubmission.__table__.insert().values(id=42))
+        migrate(conn)
+
+        submissions = conn.execute(select(SeenSubmission.id)).scalars().all()
+        # Tables that do not exist yet are left to `create_all`
+        assert not inspect(conn).has_table(SeenComment.__tablename__)
+
+    assert submissions == [42]
+
+
+def test_prepare_db_migrates_once_up_front(tmp_path):
+    path = tmp_path / "legacy.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        _create_legacy_table(conn, SeenComment.__tablename__, ["k0"])
+
+    asyncio.run(prepare_db(DatabaseConfiguration(url=f"sqlite+aiosqlite:///{path}")))
+
+    with engine.connect() as conn:
+        assert conn.execute(select(SeenComment.id)).scalars().all() == [to_int("k0")]
+        assert inspect(conn).has_table(SeenSubmission.__tablename__)
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.database.outbox import Outbox
+from kebabmeister.database.schemas.comment import SeenComment
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.database.seen import SeenRecorder
+
+SUBREDDIT = SimpleNamespace(display_name="Kebab")
+
+
+def _item(fullname: str) -> SimpleNamespace:
+    return SimpleNamespace(fullname=fullname, author=SimpleNamespace(name="someone"))
+
+
+def _recorders(session, outbox: Outbox) -> tuple[SeenRecorder, SeenRecorder]:
+    return (SeenRecorder(session, SeenSubmission, "sqlite", 100, 60, 100, outbox),
+            SeenRecorder(session, SeenComment, "sqlite", 100, 60, 100, outbox))
+
+
+async def _plan(recorder: SeenRecorder, outbox: Outbox, item, kind: ActionKind = ActionKind.REMOVE) -> Action:
+    assert await recorder.claim(item.fullname, time.time() + 120)
+    target = item.author if kind == ActionKind.MESSAGE else item
+    action = Action(kind=kind, target=target, subreddit=SUBREDDIT, message="Please flair up")
+    outbox.record(item, action)
+    return action
+
+
+async def _unfinished(outbox: Outbox) -> list[tuple[str, str]]:
+    return [(entry.item, entry.kind) for entry in await outbox.unfinished(["kebab"])]
+
+
+def test_planned_actions_are_written_with_their_items(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        submissions, comments = _recorders(session, outbox)
+        await _plan(submissions, outbox, _item("t3_a"))
+        await _plan(comments, outbox, _item("t1_b"), ActionKind.MESSAGE)
+
+        await submissions.flush()
+        # Only the actions on the flushed table's items are written
+        after_submissions = await _unfinished(outbox)
+        await comments.flush()
+        return after_submissions, await _unfinished(outbox)
+
+    after_submissions, after_comments = asyncio.run(scenario())
+    assert after_submissions == [("t3_a", "remove")]
+    assert sorted(after_comments) == [("t1_b", "message"), ("t3_a", "remove")]
+
+
+def test_actions_finished_before_flush_are_never_written(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        submissions, _ = _recorders(session, outbox)
+        action = await _plan(submissions, outbox, _item("t3_a"))
+        for key in action.outbox_keys:
+            outbox.complete(key)
+        await submissions.flush()
+        return await _unfinished(outbox)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_finished_actions_are_deleted_by_next_flush(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        submissions, comments = _recorders(session, outbox)
+        action = await _plan(submissions, outbox, _item("t3_a"))
+        await submissions.flush()
+        for key in action.outbox_keys:
+            outbox.complete(key)
+        # Deletions are not tied to a table
+        await comments.flush()
+        return await _unfinished(outbox)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_restore_after_failed_write(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        submissions, _ = _recorders(session, outbox)
+        kept = await _plan(submissions, outbox, _item("t3_a"))
+        finished = await _plan(submissions, outbox, _item("t3_b"))
+        rows, done = outbox.take(SeenSubmission.__tablename__)
+        # Finished while it was being written
+        outbox.complete(finished.outbox_keys[0])
+        outbox.restore(rows, done)
+
+        rows, done = outbox.take(SeenSubmission.__tablename__)
+        return set(rows), done, kept.outbox_keys
+
+    rows, done, kept = asyncio.run(scenario())
+    assert rows == set(kept)
+    assert done == set()
+
+
+def test_unfinished_filters_by_subreddit(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        submissions, _ = _recorders(session, outbox)
+        await _plan(submissions, outbox, _item("t3_a"))
+        await submissions.flush()
+        return await outbox.unfinished(["other"]), await outbox.unfinished([])
+
+    assert asyncio.run(scenario()) == ([], [])
+
+
+def test_to_action_rebuilds_message(session):
+    async def scenario():
+        outbox = Outbox(session, "sqlite")
+        _, comments = _recorders(session, outbox)
+        await _plan(comments, outbox, _item("t1_b"), ActionKind.MESSAGE)
+        await comments.flush()
+        entry, = await outbox.unfinished(["kebab"])
+
+        reddit = SimpleNamespace(comment=AsyncMock(return_value=_item("t1_b")), submission=AsyncMock(),
+                                 redditor=AsyncMock(return_value=SimpleNamespace(name="someone")))
+        return await Outbox.to_action(entry, reddit, SUBREDDIT), reddit
+
+    action, reddit = asyncio.run(scenario())
+    reddit.comment.assert_awaited_once_with("b", fetch=False)
+    reddit.redditor.assert_awaited_once_with("someone")
+    assert action.kind == ActionKind.MESSAGE
+    assert action.target.name == "someone"
+    assert action.about.fullname == "t1_b"
+    assert action.message == "Please flair up"
+    assert action.outbox_keys == (("t1_b", "message"),)
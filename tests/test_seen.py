@@ -0,0 +1,202 @@
+import asyncio
+import datetime
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from sqlalchemy import insert, select
+
+from kebabmeister.actions import Action, ActionKind
+from kebabmeister.database.schemas.submission import SeenSubmission
+from kebabmeister.database.seen import SeenIndex, SeenRecorder
+from kebabmeister.utils.reddit_id import to_int
+
+
+def _recorder(session, flush_size: int = 100, index_size: int = 100, actions=None) -> SeenRecorder:
+    return SeenRecorder(session, SeenSubmission, "sqlite", flush_size=flush_size, flush_interval=60,
+                        index_size=index_size, actions=actions)
+
+
+def _action() -> Action:
+    return Action(kind=ActionKind.REMOVE, target=SimpleNamespace(), subreddit=SimpleNamespace(display_name="A"))
+
+
+async def _stored_ids(session) -> list[int]:
+    async with session() as s:
+        return sorted((await s.execute(select(SeenSubmission.id))).scalars().all())
+
+
+def _break(recorder: SeenRecorder):
+    def broken():
+        raise RuntimeError("database is down")
+
+    recorder.session = broken
+
+
+def test_claim_succeeds_once(session):
+    async def scenario():
+        recorder = _recorder(session)
+        now = time.time()
+        first = await asyncio.gather(*(recorder.claim("abc", now + 120) for _ in range(5)))
+        await recorder.flush()
+        return first, await recorder.claim("abc", now + 120), await _stored_ids(session)
+
+    first, again, stored = asyncio.run(scenario())
+    assert sorted(first) == [False] * 4 + [True]
+    assert not again
+    assert stored == [to_int("abc")]
+
+
+def test_flush_size_triggers_flush(session):
+    async def scenario():
+        recorder = _recorder(session, flush_size=2)
+        created = time.time() + 120
+        await recorder.claim("a", created)
+        await recorder.claim("b", created)
+        await recorder.close()
+        return await _stored_ids(session)
+
+    assert asyncio.run(scenario()) == [to_int("a"), to_int("b")]
+
+
+def test_failed_flush_keeps_ids_pending(session):
+    async def scenario():
+        recorder = _recorder(session)
+        await recorder.claim("abc", time.time() + 120)
+        working = recorder.session
+        _break(recorder)
+        assert not await recorder.flush()
+        stored_while_down = await _stored_ids(session)
+        recorder.session = working
+        assert await recorder.flush()
+        return stored_while_down, await _stored_ids(session)
+
+    assert asyncio.run(scenario()) == ([], [to_int("abc")])
+
+
+def test_actions_wait_for_commit(session):
+    async def scenario():
+        pool = SimpleNamespace(submit=AsyncMock())
+        recorder = _recorder(session, actions=pool)
+        await recorder.claim("abc", time.time() + 120)
+        action = _action()
+        await recorder.hold(action)
+        held = pool.submit.await_count
+
+        working = recorder.session
+        _break(recorder)
+        await recorder.flush()
+        after_failure = pool.submit.await_count
+        recorder.session = working
+        await recorder.flush()
+        return held, after_failure, pool.submit.await_args_list, action
+
+    held, after_failure, calls, action = asyncio.run(scenario())
+    assert held == 0
+    assert after_failure == 0
+    assert [call.args for call in calls] == [(action,)]
+
+
+def test_crash_before_flush_takes_no_action(session):
+    async def scenario():
+        pool = SimpleNamespace(submit=AsyncMock())
+        created = time.time() + 120
+        recorder = _recorder(session, actions=pool)
+        await recorder.claim("abc", created)
+        await recorder.hold(_action())
+        # The process dies here, so the claim is lost, but so is the action
+
+        restarted = _recorder(session, actions=pool)
+        await restarted.load()
+        return await restarted.claim("abc", created), pool.submit.await_count
+
+    assert asyncio.run(scenario()) == (True, 0)
+
+
+def test_held_actions_are_not_taken_after_close(session):
+    async def scenario():
+        pool = SimpleNamespace(submit=AsyncMock())
+        recorder = _recorder(session, actions=pool)
+        await recorder.claim("abc", time.time() + 120)
+        await recorder.hold(_action())
+        await recorder.close()
+        return pool.submit.await_count, await _stored_ids(session)
+
+    assert asyncio.run(scenario()) == (0, [to_int("abc")])
+
+
+def test_index_eviction_moves_horizon():
+    index = SeenIndex(max_size=2)
+    index.horizon = 0
+    index.add(1, seen_at=100)
+    index.add(2, seen_at=200)
+    index.add(3, seen_at=300)
+
+    assert 1 not in index and 2 in index and 3 in index
+    assert index.horizon == 100
+    assert not index.covers(100 + SeenIndex.CLOCK_SKEW)
+    assert index.covers(101 + SeenIndex.CLOCK_SKEW)
+    assert not index.covers(None)
+
+
+def test_old_items_are_looked_up_in_database(session):
+    async def scenario():
+        async with session() as s:
+            async with s.begin():
+                await s.execute(insert(SeenSubmission).values(id=to_int("old")))
+        recorder = _recorder(session)
+        # Created before the horizon of a cold index, so the miss in memory is not trusted
+        return await recorder.claim("old", created_utc=0), await recorder.claim("new", created_utc=0)
+
+    assert asyncio.run(scenario()) == (False, True)
+
+
+def test_index_is_warm_loaded(session):
+    async def scenario():
+        recorder = _recorder(session)
+        await recorder.claim("abc", time.time() + 120)
+        await recorder.close()
+
+        restarted = _recorder(session)
+        await restarted.load()
+        # The whole table fits into the index, which is therefore authoritative
+        return restarted.index.horizon, to_int("abc") in restarted.index, await restarted.claim("abc", 1)
+
+    horizon, indexed, claimed = asyncio.run(scenario())
+    assert horizon == 0
+    assert indexed
+    assert not claimed
+
+
+def test_index_load_keeps_newest_ids(session):
+    async def scenario():
+        async with session() as s:
+            async with s.begin():
+                await s.execute(insert(SeenSubmission).values([
+                    {"id": to_int(reddit_id), "seen_date": datetime.datetime(2024, 1, day)}
+                    for day, reddit_id in enumerate(("a", "b", "c"), start=1)]))
+        recorder = _recorder(session, index_size=2)
+        await recorder.load()
+        return recorder.index
+
+    index = asyncio.run(scenario())
+    assert to_int("a") not in index
+    assert to_int("b") in index and to_int("c") in index
+    # Items older than the oldest indexed ID are looked up in the database
+    assert index.horizon == datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def test_take_over_ignores_index_for_older_items(session):
+    async def scenario():
+        recorder = _recorder(session)
+        recorder.index.horizon = 0
+        # Claimed by the worker that monitored the subreddit before
+        async with session() as s:
+            async with s.begin():
+                await s.execute(insert(SeenSubmission).values(id=to_int("theirs")))
+        created = time.time() - 3600
+        recorder.take_over("t5_sub")
+        return (await recorder.claim("theirs", created, "t5_sub"),
+                await recorder.claim("other", created, "t5_other"))
+
+    assert asyncio.run(scenario()) == (False, True)
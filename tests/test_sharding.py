@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from kebabmeister.utils.sharding import StaticAssignment, rendezvous_owner
+
+SUBREDDITS = [f"Sub{index}" for index in range(50)]
+
+
+def test_static_assignment_partitions_subreddits():
+    async def owned_by_all():
+        return [await StaticAssignment(3, index).owned(SUBREDDITS) for index in range(3)]
+
+    shards = asyncio.run(owned_by_all())
+    assert set().union(*shards) == {name.lower() for name in SUBREDDITS}
+    assert sum(map(len, shards)) == len(SUBREDDITS)
+    assert all(shards)
+
+
+def test_static_assignment_rejects_bad_index():
+    with pytest.raises(ValueError):
+        StaticAssignment(2, 2)
+
+
+def test_rendezvous_only_moves_subreddits_of_joining_worker():
+    before = {name: rendezvous_owner(name, ["a", "b"]) for name in SUBREDDITS}
+    after = {name: rendezvous_owner(name, ["a", "b", "c"]) for name in SUBREDDITS}
+    moved = {name for name in SUBREDDITS if before[name] != after[name]}
+
+    assert moved
+    assert all(after[name] == "c" for name in moved)
+    assert rendezvous_owner("Sub0", []) is None
+    # Case-insensitive, like subreddit names
+    assert rendezvous_owner("SUB0", ["a", "b"]) == before["Sub0"]
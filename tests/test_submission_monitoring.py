@@ -0,0 +1,114 @@
+import asyncio
+import dataclasses
+import itertools
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+from kebabmeister.tasks.submission_monitoring import ActionUnflaired, SubredditRules, parse_config
+
+CONFIG_PAGE = """
+reply_on_posts: false
+reply_message: "Welcome!"
+reply_is_pinned: false
+unflaired_post_action: message
+unflaired_post_subject: "Flair up"
+unflaired_post_message: ["Please flair up, {author}"]
+unflaired_comment_action: ignore
+unflaired_comment_subject: "Flair up"
+unflaired_comment_message: ["Please flair up"]
+whitelist: []
+"""
+
+# The per-subreddit state is shared by all task instances, so every test uses its own subreddit
+_subreddit_ids = (f"t5_test{index}" for index in itertools.count())
+
+
+def _wiki_page(revisions: list[str], content: str = CONFIG_PAGE) -> MagicMock:
+    page = MagicMock()
+    page.name = "kebabmeister"
+
+    async def latest_revision(limit: int):
+        yield {"id": revisions[0]}
+
+    async def load():
+        page.content_md = content
+        page.revision_id = revisions[0]
+
+    page.revisions = latest_revision
+    page.load = AsyncMock(side_effect=load)
+    return page
+
+
+def _subreddit(page: MagicMock) -> MagicMock:
+    subreddit = MagicMock()
+    subreddit.id = next(_subreddit_ids)
+    subreddit.display_name = subreddit.id
+    subreddit.wiki.get_page = AsyncMock(return_value=page)
+    return subreddit
+
+
+def test_config_is_only_fetched_for_new_revisions(make_task):
+    task = make_task()
+    revisions = ["r1"]
+    page = _wiki_page(revisions)
+    subreddit = _subreddit(page)
+    task.barriers[subreddit.id] = asyncio.Event()
+
+    async def scenario():
+        await task._refresh_config(subreddit)
+        await task._refresh_config(subreddit)
+        unchanged = page.load.await_count
+        revisions[0] = "r2"
+        await task._refresh_config(subreddit)
+        return unchanged, page.load.await_count
+
+    assert asyncio.run(scenario()) == (1, 2)
+    assert task.barriers[subreddit.id].is_set()
+    assert task.PER_SUBREDDIT_CONFIG[subreddit.id].unflaired_post_action == ActionUnflaired.MESSAGE
+
+
+def test_config_is_fetched_without_revision_history(make_task):
+    task = make_task()
+    page = _wiki_page(["r1"])
+
+    async def no_history(limit: int):
+        raise PermissionError("revisions are private")
+        yield
+
+    page.revisions = no_history
+    subreddit = _subreddit(page)
+    task.barriers[subreddit.id] = asyncio.Event()
+
+    async def scenario():
+        await task._refresh_config(subreddit)
+        await task._refresh_config(subreddit)
+
+    asyncio.run(scenario())
+    # Without a revision to compare, the page is downloaded every time
+    assert page.load.await_count == 2
+    assert task.barriers[subreddit.id].is_set()
+
+
+def _post(author: str | None, flair: str | None = None) -> SimpleNamespace:
+    return SimpleNamespace(author=SimpleNamespace(name=author) if author else None, author_flair_text=flair)
+
+
+def test_rules_only_act_on_unflaired_authors():
+    config = dataclasses.replace(parse_config(CONFIG_PAGE), whitelist=["SomeMod"])
+    rules = SubredditRules(config, "KebabBot")
+
+    assert rules.submission_action(_post("someone")) == ActionUnflaired.MESSAGE
+    assert rules.submission_action(_post("someone", "Kebab")) == ActionUnflaired.IGNORE
+    # The whitelist and the bot's own name match regardless of case
+    assert rules.submission_action(_post("somemod")) == ActionUnflaired.IGNORE
+    assert rules.submission_action(_post("kebabbot")) == ActionUnflaired.IGNORE
+    # Deleted authors cannot flair up
+    assert rules.submission_action(_post(None)) == ActionUnflaired.IGNORE
+    # Unflaired comments are ignored in this configuration
+    assert rules.comment_action(_post("someone")) == ActionUnflaired.IGNORE
+
+
+def test_welcome_replies_are_not_an_unflaired_action():
+    config = dataclasses.replace(parse_config(CONFIG_PAGE), reply_on_posts=True,
+                                 unflaired_post_action=ActionUnflaired.IGNORE)
+    assert SubredditRules(config, "KebabBot").submission_action(_post("someone")) == ActionUnflaired.IGNORE
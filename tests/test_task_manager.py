@@ -0,0 +1,85 @@
+import asyncio
+import random
+
+from kebabmeister.utils.task_manager import StreamHealth, TaskManager
+
+
+def test_failing_coroutine_is_restarted_with_backoff(monkeypatch):
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay):
+        delays.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    # No jitter
+    monkeypatch.setattr(random, "uniform", lambda low, high: high)
+    manager = TaskManager(backoff=1, backoff_max=4)
+    calls = 0
+
+    async def scenario():
+        running = asyncio.Event()
+
+        async def flaky(health: StreamHealth):
+            nonlocal calls
+            calls += 1
+            if calls <= 4:
+                raise RuntimeError(f"failure {calls}")
+            running.set()
+            await asyncio.Event().wait()
+
+        manager.supervise("flaky", flaky)
+        await running.wait()
+        health = manager.health["flaky"]
+        await manager.stop()
+        return health
+
+    health = asyncio.run(scenario())
+    assert delays == [1, 2, 4, 4]
+    assert health.restarts == 4
+    assert health.last_error == "RuntimeError: failure 4"
+
+
+def test_failure_does_not_affect_other_coroutines():
+    manager = TaskManager(backoff=0.01, backoff_max=0.05)
+
+    async def scenario():
+        items = []
+
+        async def steady(health: StreamHealth):
+            while True:
+                health.record()
+                items.append(health.items)
+                await asyncio.sleep(0.01)
+
+        async def broken(health: StreamHealth):
+            raise RuntimeError("broken")
+
+        manager.supervise("steady", steady)
+        manager.supervise("broken", broken)
+        await asyncio.sleep(0.2)
+        restarts = manager.health["steady"].restarts, manager.health["broken"].restarts
+        await manager.cancel("broken")
+        assert "broken" not in manager.health
+        await manager.stop()
+        return items, restarts
+
+    items, (steady_restarts, broken_restarts) = asyncio.run(scenario())
+    assert len(items) > 5
+    assert steady_restarts == 0
+    assert broken_restarts > 1
+
+
+def test_supervise_replaces_coroutine_with_same_name():
+    manager = TaskManager()
+
+    async def scenario():
+        first = manager.supervise("stream", lambda health: asyncio.Event().wait())
+        second = manager.supervise("stream", lambda health: asyncio.Event().wait())
+        await asyncio.gather(first, return_exceptions=True)
+        running = not second.done()
+        await manager.stop()
+        return first.cancelled(), running
+
+    assert asyncio.run(scenario()) == (True, True)